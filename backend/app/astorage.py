@@ -0,0 +1,63 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app import config, storage
+
+# Async access to app.storage for the route handlers. Storage calls block on
+# file or SQLite I/O and on the storage lock, so they run off the event loop:
+# reads in a few reader threads, transactions in a few writer threads, and
+# plain writes one at a time in a single thread, in the order they were
+# submitted. A handler awaiting any of them holds no Starlette threadpool
+# slot, so a slow client costs a coroutine, not a thread. With group commit
+# a writer thread only runs the transaction and queues its changes; the
+# handler then awaits the commit as a future, so any number of transactions
+# can wait on one group while the writer threads move on.
+
+_readers = ThreadPoolExecutor(max(1, config.STORAGE_READ_WORKERS), thread_name_prefix="storage-read")
+_writers = ThreadPoolExecutor(max(1, config.STORAGE_WRITE_WORKERS), thread_name_prefix="storage-txn")
+_writer = ThreadPoolExecutor(1, thread_name_prefix="storage-write")
+
+
+async def read(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a storage read such as storage.get_mission in a reader thread."""
+    return await asyncio.get_running_loop().run_in_executor(_readers, partial(fn, *args, **kwargs))
+
+
+async def transact(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run storage.transaction(fn, ...) and return fn's result once committed."""
+    loop = asyncio.get_running_loop()
+    committed = loop.create_future()
+
+    def done(result: Any, error: Optional[BaseException]) -> None:
+        loop.call_soon_threadsafe(_settle, committed, result, error)
+
+    await loop.run_in_executor(_writers, partial(storage.transaction_nowait, done, fn, *args, **kwargs))
+    return await committed
+
+
+def _settle(committed: "asyncio.Future[Any]", result: Any, error: Optional[BaseException]) -> None:
+    if committed.done():
+        # The awaiting handler was cancelled; the write stands regardless.
+        return
+    if error is not None:
+        committed.set_exception(error)
+    else:
+        committed.set_result(result)
+
+
+async def write(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run fn in the writer thread and return its result once it has committed.
+
+    fn runs under the store's write lock, so no other write, from this
+    process or another, can land between a load and save inside it. Prefer
+    transact for read-modify-write, which only locks to commit.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_writer, partial(_locked, fn, *args, **kwargs))
+
+
+def _locked(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    with storage.write_lock():
+        return fn(*args, **kwargs)
+
@@ -0,0 +1,337 @@
+import codecs, hashlib, json, re, zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.changes import TRACKED
+
+# Backup files. Both formats carry the same records and the same checksum:
+#
+# json    the version 1 document {"version","created_at","payload":{...}},
+#         written collection by collection, with a trailing "checksum" key.
+# ndjson  a {"version","created_at","format"} header line, one
+#         {"collection","record"} line per record, then a {"checksum","counts"}
+#         trailer line.
+#
+# The checksum is the sha256 of every record's canonical JSON (sorted keys, no
+# whitespace) prefixed with its collection name, one per line, in file order,
+# so it does not depend on the format or on how the file was pretty-printed.
+#
+# The header's "seq" is the store's change sequence number (see app.changes)
+# at the time of the backup. An incremental backup also has "since" and only
+# carries the users, missions and assignments changed after that sequence,
+# followed by the keys deleted since then: a top-level "deleted":
+# {collection: [keys]} in json, {"collection","deleted"} lines in ndjson. The
+# checksum covers deletions as "<collection>:deleted" entries.
+
+COLLECTIONS = ["users", "tokens", "missions", "assignments"]
+_CHUNK = 1 << 16
+
+
+def canonical(rec: Any) -> str:
+    return json.dumps(rec, sort_keys=True, separators=(",", ":"), ensure_ascii=True)
+
+
+class Checksum:
+    def __init__(self) -> None:
+        self._h = hashlib.sha256()
+
+    def update(self, name: str, rec: Any) -> None:
+        self._h.update(f"{name}\n{canonical(rec)}\n".encode("ascii"))
+
+    def trailer(self) -> Dict[str, str]:
+        return {"algorithm": "sha256", "value": self._h.hexdigest()}
+
+
+def _buffered(parts: Iterable[str]) -> Iterator[bytes]:
+    buf, size = [], 0
+    for p in parts:
+        buf.append(p)
+        size += len(p)
+        if size >= _CHUNK:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+class _Selection:
+    """The collections, records and deletions one backup contains."""
+
+    def __init__(self, db: Dict[str, Any], changed: Optional[Dict[str, Set[Any]]]) -> None:
+        self.db = db
+        self.changed = changed
+        self.names = COLLECTIONS if changed is None else [n for n in COLLECTIONS if n in TRACKED]
+        self.deleted: Dict[str, List[Any]] = {}
+        if changed is not None:
+            for name in self.names:
+                live = {rec.get("id") for rec in db.get(name, [])}
+                gone = (k for k in changed.get(name, ()) if k not in live)
+                self.deleted[name] = sorted(gone, key=lambda k: (isinstance(k, str), k))
+
+    def records(self, name: str) -> Iterator[Dict[str, Any]]:
+        keys = None if self.changed is None else self.changed.get(name, set())
+        for rec in self.db.get(name, []):
+            if keys is None or rec.get("id") in keys:
+                yield rec
+
+
+def _header(created_at: str, seq: Optional[int], since: Optional[int]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"version": 1, "created_at": created_at}
+    if seq is not None:
+        out["seq"] = seq
+    if since is not None:
+        out["since"] = since
+    return out
+
+
+def _json_parts(sel: _Selection, header: Dict[str, Any]) -> Iterator[str]:
+    checksum = Checksum()
+    yield json.dumps(header)[:-1] + ', "payload": {'
+    for i, name in enumerate(sel.names):
+        yield (", " if i else "") + json.dumps(name) + ": ["
+        for j, rec in enumerate(sel.records(name)):
+            checksum.update(name, rec)
+            yield ("," if j else "") + "\n" + json.dumps(rec)
+        yield "]"
+    yield "}"
+    if sel.changed is not None:
+        for name, keys in sel.deleted.items():
+            for key in keys:
+                checksum.update(name + ":deleted", key)
+        yield ', "deleted": ' + json.dumps(sel.deleted)
+    yield ', "checksum": ' + json.dumps(checksum.trailer()) + "}\n"
+
+
+def _ndjson_parts(sel: _Selection, header: Dict[str, Any]) -> Iterator[str]:
+    checksum = Checksum()
+    yield json.dumps(dict(header, format="ndjson")) + "\n"
+    counts = {}
+    for name in sel.names:
+        counts[name] = 0
+        for rec in sel.records(name):
+            checksum.update(name, rec)
+            counts[name] += 1
+            yield json.dumps({"collection": name, "record": rec}) + "\n"
+    trailer: Dict[str, Any] = {"checksum": None, "counts": counts}
+    if sel.changed is not None:
+        for name, keys in sel.deleted.items():
+            for key in keys:
+                checksum.update(name + ":deleted", key)
+                yield json.dumps({"collection": name, "deleted": key}) + "\n"
+        trailer["deleted"] = {name: len(keys) for name, keys in sel.deleted.items()}
+    trailer["checksum"] = checksum.trailer()
+    yield json.dumps(trailer) + "\n"
+
+
+def iter_backup(
+    db: Dict[str, Any],
+    created_at: str,
+    format: str = "json",
+    seq: Optional[int] = None,
+    since: Optional[int] = None,
+    changed: Optional[Dict[str, Set[Any]]] = None,
+) -> Iterator[bytes]:
+    """Serialize db one record at a time, in chunks of about 64 KiB.
+
+    With since, only the tracked records whose keys are in changed are written,
+    and the changed keys missing from db are written as deletions.
+    """
+    sel = _Selection(db, None if since is None else changed or {})
+    header = _header(created_at, seq, since)
+    parts = _ndjson_parts(sel, header) if format == "ndjson" else _json_parts(sel, header)
+    return _buffered(parts)
+
+
+class BackupError(ValueError):
+    pass
+
+
+_WS = re.compile(r"[ \t\r\n]*")
+_MAX_VALUE = 16 << 20
+
+
+class BackupReader:
+    """Incremental parser for both backup formats, plain or gzipped.
+
+    records() yields (collection, record) pairs as the bytes arrive; only the
+    record being parsed and one chunk of input are held at a time. Once it is
+    exhausted, meta holds the header fields, checksum the file's checksum
+    trailer (if any), computed the checksum of what was read and, for
+    incremental backups, deleted the keys to remove per collection.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], max_inflated: int = 0) -> None:
+        self._chunks = iter(chunks)
+        self._inflate: Optional[Any] = None
+        # Gzipped input is inflated at most one chunk at a time; max_inflated
+        # (0 = no limit) caps the decompressed size of the whole upload.
+        self._max_inflated = max_inflated
+        self._inflated = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._first = True
+        self._decode = json.JSONDecoder().raw_decode
+        self.meta: Dict[str, Any] = {}
+        self.checksum: Optional[Dict[str, Any]] = None
+        self.counts: Optional[Dict[str, Any]] = None
+        self.computed = Checksum()
+        self.seen: Dict[str, int] = {}
+        self.deleted: Dict[str, List[Any]] = {}
+
+    def _inflated_bytes(self, out: bytes) -> bytes:
+        self._inflated += len(out)
+        if self._max_inflated and self._inflated > self._max_inflated:
+            raise BackupError(f"backup larger than {self._max_inflated} bytes once decompressed")
+        return out
+
+    def _fill(self) -> bool:
+        while not self._eof:
+            if self._inflate is not None and self._inflate.unconsumed_tail:
+                raw = self._inflate.decompress(self._inflate.unconsumed_tail, _CHUNK)
+                text = self._decoder.decode(self._inflated_bytes(raw))
+            else:
+                raw = next(self._chunks, None)
+                if raw is None:
+                    self._eof = True
+                    tail = self._inflate.flush() if self._inflate is not None else b""
+                    text = self._decoder.decode(self._inflated_bytes(tail), final=True)
+                else:
+                    if self._first and raw:
+                        self._first = False
+                        if raw[:1] == b"\x1f":
+                            self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    if self._inflate is not None:
+                        raw = self._inflated_bytes(self._inflate.decompress(raw, _CHUNK))
+                    text = self._decoder.decode(raw)
+            if text:
+                if self._pos > len(self._buf) // 2:
+                    self._buf, self._pos = self._buf[self._pos:], 0
+                self._buf += text
+                return True
+        return False
+
+    def _peek(self) -> str:
+        while True:
+            self._pos = _WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf) or not self._fill():
+                return self._buf[self._pos:self._pos + 1]
+
+    def _expect(self, ch: str) -> None:
+        if self._peek() != ch:
+            raise BackupError(f"expected {ch!r} at offset {self._pos}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if len(self._buf) - self._pos > _MAX_VALUE:
+                    raise BackupError("record too large")
+                if not self._fill():
+                    raise BackupError("truncated or malformed backup")
+                continue
+            # A number or literal at the end of the buffer may continue in the next chunk.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _record(self, name: Any, rec: Any) -> Tuple[str, Dict[str, Any]]:
+        if name not in COLLECTIONS or not isinstance(rec, dict):
+            raise BackupError("invalid backup")
+        self.computed.update(name, rec)
+        self.seen[name] = self.seen.get(name, 0) + 1
+        return name, rec
+
+    def _deleted(self, name: Any, key: Any) -> None:
+        if name not in TRACKED or not isinstance(key, (int, str)) or isinstance(key, bool):
+            raise BackupError("invalid backup")
+        self.computed.update(name + ":deleted", key)
+        self.deleted.setdefault(name, []).append(key)
+
+    def _next(self, close: str) -> None:
+        """Consume the separator after a member or element; stops before the closing bracket."""
+        ch = self._peek()
+        if ch == ",":
+            self._pos += 1
+        elif ch != close:
+            raise BackupError(f"expected ',' or {close!r} at offset {self._pos}")
+
+    def _payload(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self._expect("{")
+        while self._peek() != "}":
+            name = self._value()
+            self._expect(":")
+            if name not in COLLECTIONS:
+                self._value()
+            else:
+                self._expect("[")
+                self.seen.setdefault(name, 0)
+                while self._peek() != "]":
+                    yield self._record(name, self._value())
+                    self._next("]")
+                self._pos += 1
+            self._next("}")
+        self._pos += 1
+
+    def records(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        self._expect("{")
+        while self._peek() != "}":
+            key = self._value()
+            self._expect(":")
+            if key == "payload":
+                yield from self._payload()
+            elif key == "checksum":
+                self.checksum = self._value()
+            elif key == "deleted":
+                deleted = self._value()
+                if not isinstance(deleted, dict) or not all(isinstance(v, list) for v in deleted.values()):
+                    raise BackupError("invalid backup")
+                for name, keys in deleted.items():
+                    for k in keys:
+                        self._deleted(name, k)
+            else:
+                self.meta[key] = self._value()
+            self._next("}")
+        self._pos += 1
+        if self.meta.get("version") != 1:
+            raise BackupError("invalid backup")
+        if self.meta.get("format") == "ndjson":
+            while self._peek():
+                line = self._value()
+                if not isinstance(line, dict):
+                    raise BackupError("invalid backup")
+                if "collection" in line and "deleted" in line:
+                    self._deleted(line["collection"], line["deleted"])
+                elif "collection" in line:
+                    yield self._record(line["collection"], line.get("record"))
+                elif "checksum" in line:
+                    self.checksum, self.counts = line["checksum"], line.get("counts")
+                    if self.counts is not None and self.counts != {n: self.seen.get(n, 0) for n in self.counts}:
+                        raise BackupError("record counts do not match")
+                    deleted = line.get("deleted")
+                    if deleted is not None and deleted != {n: len(self.deleted.get(n, [])) for n in deleted}:
+                        raise BackupError("record counts do not match")
+                else:
+                    raise BackupError("invalid backup")
+            if self.checksum is None:
+                raise BackupError("truncated backup: no trailer")
+        elif any(name not in self.seen for name in (TRACKED if "since" in self.meta else COLLECTIONS)):
+            raise BackupError("invalid backup")
+        elif self._peek():
+            raise BackupError("trailing data after backup")
+
+    def verified(self) -> bool:
+        return self.checksum == self.computed.trailer()
+
+
+def gzipped(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
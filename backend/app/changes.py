@@ -0,0 +1,160 @@
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app import config
+from app.journal import KEYS, Op
+
+# Change sequence numbers. Every save_db that touches a tracked collection
+# gets the next sequence number, and the hidden "_changes" collection keeps,
+# per record key, the last sequence that changed or deleted it:
+#
+#   {"id": "missions:12", "seq": 41}   "collection:json(key)"
+#   {"id": "_floor", "seq": 7}         changes at or before 7 are not all known
+#   {"id": "_restored", "seq": 30}     last backup seq restored into this store
+#
+# "_changes" is stored like any other collection (so the journal and SQLite
+# only write the entries that changed) but load_db hides it from callers.
+
+CHANGES = "_changes"
+TRACKED = ("users", "missions", "assignments")
+
+
+class ChangesTooOld(ValueError):
+    pass
+
+
+def _eid(name: str, key: Any) -> str:
+    return name + ":" + json.dumps(key)
+
+
+def _parse_eid(eid: str) -> Tuple[str, Any]:
+    name, _, key = eid.partition(":")
+    return name, json.loads(key)
+
+
+class ChangeLog:
+    """Index over db["_changes"]; save_db calls record() to extend it."""
+
+    def __init__(self, db: Dict[str, Any]) -> None:
+        self.seqs: Dict[str, int] = {}
+        self.positions: Dict[str, int] = {}
+        # Last sequence per tracked collection, deletions included.
+        self.latest: Dict[str, int] = {}
+        self.seq = 0
+        for i, e in enumerate(db.get(CHANGES, [])):
+            if isinstance(e, dict) and isinstance(e.get("seq"), int):
+                self.seqs[e["id"]] = e["seq"]
+                self.positions[e["id"]] = i
+                name, colon, _ = e["id"].partition(":")
+                if colon:
+                    self.seq = max(self.seq, e["seq"])
+                    self.latest[name] = max(self.latest.get(name, 0), e["seq"])
+        # Records from before change tracking started have no entries; only a
+        # full backup covers them.
+        self._new_floor = CHANGES not in db and any(db.get(name) for name in TRACKED)
+        if self._new_floor:
+            self.seqs["_floor"] = 1
+        self.seq = max(self.seq, self.seqs.get("_floor", 0))
+
+    @property
+    def floor(self) -> int:
+        return self.seqs.get("_floor", 0)
+
+    @property
+    def restored(self) -> Optional[int]:
+        return self.seqs.get("_restored")
+
+    def record(self, ops: List[Op], db: Dict[str, Any], restored: Optional[int] = None) -> List[Op]:
+        """Stamp the tracked changes in ops with the next sequence number.
+
+        Replaces db["_changes"] with an updated copy and returns the ops that
+        write it. A whole-collection replace has no per-record changes, so it
+        marks every current record changed and moves the floor up to it.
+        """
+        touched: Dict[str, int] = {}
+        seq = self.seq + 1
+        for kind, name, key, value in ops:
+            if name not in TRACKED:
+                continue
+            if kind in ("put", "del"):
+                touched[_eid(name, key)] = seq
+                continue
+            field = KEYS.get(name, "id")
+            for rec in value if isinstance(value, list) else []:
+                if isinstance(rec, dict):
+                    touched[_eid(name, rec.get(field))] = seq
+            touched["_floor"] = seq
+        if restored is not None:
+            touched["_restored"] = restored
+        if self._new_floor:
+            touched.setdefault("_floor", self.floor)
+            self._new_floor = False
+        if not touched:
+            return []
+        if any(":" in eid for eid in touched):
+            self.seq = seq
+        log = list(db.get(CHANGES, []))
+        out: List[Op] = []
+        for eid, s in touched.items():
+            entry = {"id": eid, "seq": s}
+            i = self.positions.get(eid)
+            if i is None:
+                self.positions[eid] = len(log)
+                log.append(entry)
+            else:
+                log[i] = entry
+            self.seqs[eid] = s
+            name, colon, _ = eid.partition(":")
+            if colon:
+                self.latest[name] = s
+            out.append(("put", CHANGES, eid, entry))
+        out += self._prune(log, db)
+        db[CHANGES] = log
+        return out
+
+    def _prune(self, log: List[Dict[str, Any]], db: Dict[str, Any]) -> List[Op]:
+        # Entries of deleted records are only needed by incremental backups;
+        # past the cap the oldest go and the floor rises past them.
+        live = sum(len(db.get(name) or []) for name in TRACKED)
+        tracked = len(self.seqs) - ("_floor" in self.seqs) - ("_restored" in self.seqs)
+        if tracked <= live + config.CHANGE_LOG_MAX_DELETED:
+            return []
+        keys = {_eid(name, rec.get(KEYS.get(name, "id"))) for name in TRACKED for rec in db.get(name) or [] if isinstance(rec, dict)}
+        dead = sorted((s, eid) for eid, s in self.seqs.items() if ":" in eid and eid not in keys)
+        drop = dead[: len(dead) - config.CHANGE_LOG_MAX_DELETED]
+        if not drop:
+            return []
+        gone = {eid for _, eid in drop}
+        floor = max(self.floor, drop[-1][0])
+        for eid in gone:
+            del self.seqs[eid]
+        self.seqs["_floor"] = floor
+        entry = {"id": "_floor", "seq": floor}
+        log[:] = [e for e in log if e["id"] not in gone and e["id"] != "_floor"] + [entry]
+        self.positions = {e["id"]: i for i, e in enumerate(log)}
+        return [("del", CHANGES, eid, None) for eid in gone] + [("put", CHANGES, "_floor", entry)]
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        # record() already updated the index for save_db's own ops.
+        return not any(name == CHANGES and kind in ("set", "drop") for kind, name, _, _ in ops)
+
+    def version(self, name: str, key: Any = None) -> int:
+        """Sequence of the last change to one record, or to any record of name.
+
+        Records not changed since tracking started are at the floor.
+        """
+        if key is None:
+            return max(self.latest.get(name, 0), self.floor)
+        return self.seqs.get(_eid(name, key), self.floor)
+
+    def since(self, seq: int) -> Dict[str, Set[Any]]:
+        """Keys per tracked collection changed or deleted after seq."""
+        if seq < self.floor:
+            raise ChangesTooOld(f"changes before {self.floor} are no longer tracked")
+        out: Dict[str, Set[Any]] = {name: set() for name in TRACKED}
+        for eid, s in self.seqs.items():
+            if s > seq and ":" in eid:
+                name, key = _parse_eid(eid)
+                if name in out:
+                    out[name].add(key)
+        return out
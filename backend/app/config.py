@@ -2,3 +2,61 @@ import os
 
 CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "*")
 TOKEN_TTL = int(os.environ.get("TOKEN_TTL", "1440"))
+# "json" rewrites data.json on every save; "journal" appends changes to data.journal;
+# "split" keeps one file per collection in collections/ and rewrites only the changed ones;
+# "sqlite" answers lookups and searches from indexed tables, but like the others still
+# keeps the whole database in memory, read in full at startup and again after another
+# process writes, so memory and multi-process reload cost grow with the data
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+JOURNAL_COMPACT_EVERY = int(os.environ.get("JOURNAL_COMPACT_EVERY", "1000"))
+JOURNAL_FSYNC = os.environ.get("JOURNAL_FSYNC", "1") == "1"
+# Seconds a resolved bearer token stays cached in-process (0 disables)
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", "10000"))
+# Expired-token sweeper: seconds between runs (0 disables) and tokens removed per write
+TOKEN_SWEEP_INTERVAL = float(os.environ.get("TOKEN_SWEEP_INTERVAL", "300"))
+TOKEN_SWEEP_BATCH = int(os.environ.get("TOKEN_SWEEP_BATCH", "500"))
+# Password hashing: bcrypt cost factor, worker processes (0 = one per CPU) and
+# extra calls allowed to wait for a worker before answering 503
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", "0"))
+HASH_QUEUE_MAX = int(os.environ.get("HASH_QUEUE_MAX", "64"))
+# Mission import: rows validated before each storage write, and row errors listed in the response
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", "100"))
+# Change log: deleted records remembered for incremental backups (older ones need a full backup)
+CHANGE_LOG_MAX_DELETED = int(os.environ.get("CHANGE_LOG_MAX_DELETED", "100000"))
+# /admin/restore: largest accepted backup once a gzipped upload is decompressed (0 = no limit)
+RESTORE_MAX_INFLATED = int(os.environ.get("RESTORE_MAX_INFLATED", str(1 << 30)))
+# GET /missions result pages cached per process: max entries (0 disables) and total bytes
+MISSION_PAGE_CACHE_SIZE = int(os.environ.get("MISSION_PAGE_CACHE_SIZE", "256"))
+MISSION_PAGE_CACHE_BYTES = int(os.environ.get("MISSION_PAGE_CACHE_BYTES", str(8 << 20)))
+# Threads serving storage reads and transactions for the async handlers
+STORAGE_READ_WORKERS = int(os.environ.get("STORAGE_READ_WORKERS", "4"))
+STORAGE_WRITE_WORKERS = int(os.environ.get("STORAGE_WRITE_WORKERS", "4"))
+# Transactions that conflict with another write: retries before running under
+# the write lock, then the first and largest backoff in milliseconds (doubling, jittered)
+TXN_RETRIES = int(os.environ.get("TXN_RETRIES", "3"))
+TXN_BACKOFF_MS = float(os.environ.get("TXN_BACKOFF_MS", "1"))
+TXN_BACKOFF_MAX_MS = float(os.environ.get("TXN_BACKOFF_MAX_MS", "50"))
+# Group commit: milliseconds a flusher waits to gather concurrent writes into one (0 writes each at once)
+GROUP_COMMIT_MS = float(os.environ.get("GROUP_COMMIT_MS", "0"))
+# Notifications: dispatcher workers per channel, messages per batch, send rate per
+# channel (messages/second, 0 = unlimited), retries with backoff (seconds,
+# doubling), timeout of one send and jobs kept for GET /admin/notifications/jobs
+NOTIFY_WORKERS = int(os.environ.get("NOTIFY_WORKERS", "4"))
+NOTIFY_BATCH_SIZE = int(os.environ.get("NOTIFY_BATCH_SIZE", "50"))
+NOTIFY_RATE_EMAIL = float(os.environ.get("NOTIFY_RATE_EMAIL", "10"))
+NOTIFY_RATE_TELEGRAM = float(os.environ.get("NOTIFY_RATE_TELEGRAM", "25"))
+NOTIFY_RETRIES = int(os.environ.get("NOTIFY_RETRIES", "3"))
+NOTIFY_RETRY_BACKOFF = float(os.environ.get("NOTIFY_RETRY_BACKOFF", "2"))
+NOTIFY_TIMEOUT = float(os.environ.get("NOTIFY_TIMEOUT", "10"))
+NOTIFY_JOBS_KEPT = int(os.environ.get("NOTIFY_JOBS_KEPT", "1000"))
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "25"))
+SMTP_FROM = os.environ.get("SMTP_FROM", "noreply@localhost")
+SMTP_USER = os.environ.get("SMTP_USER", "")
+SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "0") == "1"
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
@@ -0,0 +1,25 @@
+from typing import Any, Optional
+
+from fastapi import Response
+
+# Strong ETags built from change sequence numbers (see app.changes): a read
+# is answered 304 from the version alone, before any query or serialization.
+
+
+def etag(*parts: Any) -> str:
+    return '"' + "-".join(str(p) for p in parts) + '"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """If-None-Match uses the weak comparison, so W/ prefixes are ignored."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == tag:
+            return True
+    return False
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag})
@@ -0,0 +1,73 @@
+import asyncio, multiprocessing, os, threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+import bcrypt
+from fastapi import HTTPException
+from app import config
+
+
+def hash_password(pw: str, rounds: int) -> str:
+    return bcrypt.hashpw(pw.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def verify_password(pw: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(pw.encode("utf-8"), hashed.encode("utf-8"))
+    except Exception:
+        return False
+
+
+# bcrypt is slow on purpose, so it runs in worker processes instead of on the
+# request threadpool. At most HASH_WORKERS + HASH_QUEUE_MAX calls are in
+# flight; beyond that callers get a 503 straight away instead of queueing
+# behind a login spike.
+_executor: Optional[Executor] = None
+_inflight = 0
+_lock = threading.Lock()
+
+
+def _workers() -> int:
+    return config.HASH_WORKERS if config.HASH_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def _get_executor() -> Executor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: forking a process that already runs threads is not safe.
+            _executor = ProcessPoolExecutor(_workers(), mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+async def _run(fn: Callable[..., Any], *args: Any) -> Any:
+    global _inflight
+    with _lock:
+        if _inflight >= _workers() + config.HASH_QUEUE_MAX:
+            raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+        _inflight += 1
+    try:
+        return await asyncio.wrap_future(_get_executor().submit(fn, *args))
+    finally:
+        with _lock:
+            _inflight -= 1
+
+
+async def hash_password_async(pw: str) -> str:
+    return await _run(hash_password, pw, config.BCRYPT_ROUNDS)
+
+
+async def verify_password_async(pw: str, hashed: str) -> bool:
+    return await _run(verify_password, pw, hashed)
+
+
+def shutdown() -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def stats() -> dict:
+    with _lock:
+        return {"workers": _workers(), "queue_max": config.HASH_QUEUE_MAX, "inflight": _inflight}
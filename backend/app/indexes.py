@@ -0,0 +1,433 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from app.journal import KEYS, Op
+
+_INF = float("inf")
+
+# In-memory views over the cached database used by the JSON backends. A view
+# is built once from the parsed database and then kept current by apply(),
+# which save_db calls with the ops of every write.
+
+
+class KeyIndex:
+    """Primary key -> record for one collection."""
+
+    def __init__(self, db: Dict[str, Any], name: str) -> None:
+        self.name = name
+        field = KEYS.get(name, "id")
+        self.records: Dict[Any, Dict[str, Any]] = {}
+        # Highest integer key present, for allocating new ids; deleting it
+        # makes apply() ask for a rebuild, as in AssignmentIndex.
+        self.max_id = 0
+        for rec in db.get(name, []):
+            # First record wins, like the next(...) scans this replaces.
+            key = rec.get(field)
+            self.records.setdefault(key, rec)
+            if isinstance(key, int):
+                self.max_id = max(self.max_id, key)
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        return self.records.get(key)
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        """Update from ops; returns False when the view must be rebuilt from db instead."""
+        for kind, name, key, value in ops:
+            if name != self.name:
+                continue
+            if kind == "put":
+                self.records[key] = value
+                if isinstance(key, int):
+                    self.max_id = max(self.max_id, key)
+            elif kind == "del" and key != self.max_id:
+                self.records.pop(key, None)
+            else:
+                return False
+        return True
+
+
+def _lower(username: Any) -> str:
+    return username.lower() if isinstance(username, str) else ""
+
+
+class UsernameIndex:
+    """Live (not soft-deleted) users by id and by lowercased username.
+
+    `names` is a sorted list of (lowercased username, id), so exact lookups
+    and prefix searches are a bisect plus the matches. `taken` counts every
+    user's exact username, soft-deleted users included, for registration.
+    """
+
+    def __init__(self, db: Dict[str, Any]) -> None:
+        self.users: Dict[Any, Dict[str, Any]] = {}
+        self.ids: List[Any] = []
+        self.names: List[Tuple[str, Any]] = []
+        self.taken: Dict[Any, int] = {}
+        self.name_of: Dict[Any, Any] = {}
+        # Highest id ever used, soft-deleted users included, for allocating new ids.
+        self.max_id = 0
+        for u in db.get("users", []):
+            uid = u.get("id")
+            if isinstance(uid, int):
+                self.max_id = max(self.max_id, uid)
+            if uid not in self.name_of:
+                self._take(uid, u)
+            if uid is not None and uid not in self.users and not u.get("deleted_at"):
+                self.users[uid] = u
+                self.ids.append(uid)
+                self.names.append((_lower(u.get("username")), uid))
+        self.ids.sort()
+        self.names.sort()
+
+    def _take(self, uid: Any, u: Dict[str, Any]) -> None:
+        name = u.get("username")
+        self.name_of[uid] = name
+        self.taken[name] = self.taken.get(name, 0) + 1
+
+    def _untake(self, uid: Any) -> None:
+        if uid not in self.name_of:
+            return
+        name = self.name_of.pop(uid)
+        self.taken[name] -= 1
+        if not self.taken[name]:
+            del self.taken[name]
+
+    def _remove(self, uid: Any) -> None:
+        u = self.users.pop(uid, None)
+        if u is not None:
+            del self.ids[bisect_left(self.ids, uid)]
+            del self.names[bisect_left(self.names, (_lower(u.get("username")), uid))]
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        for kind, name, key, value in ops:
+            if name != "users":
+                continue
+            if kind == "put":
+                self._remove(key)
+                self._untake(key)
+                self._take(key, value)
+                if isinstance(key, int):
+                    self.max_id = max(self.max_id, key)
+                if not value.get("deleted_at"):
+                    self.users[key] = value
+                    insort(self.ids, key)
+                    insort(self.names, (_lower(value.get("username")), key))
+            elif kind == "del" and key != self.max_id:
+                self._remove(key)
+                self._untake(key)
+            else:
+                return False
+        return True
+
+    def _matches(self, prefix: str) -> Iterator[Any]:
+        for name, uid in self.names[bisect_left(self.names, (prefix,)):]:
+            if not name.startswith(prefix):
+                break
+            yield uid
+
+    def find(self, username: str) -> Optional[Dict[str, Any]]:
+        """The live user named exactly username, the first by id if several are."""
+        ql = _lower(username)
+        for uid in self._matches(ql):
+            u = self.users[uid]
+            if _lower(u.get("username")) != ql:
+                break
+            if u.get("username") == username:
+                return u
+        return None
+
+    def is_taken(self, username: str) -> bool:
+        return username in self.taken
+
+    def prefix(self, q: str) -> List[Any]:
+        """Ids of live users whose username starts with q, in any case, sorted."""
+        return sorted(self._matches(_lower(q)))
+
+
+class AssignmentIndex:
+    """Assignments grouped by mission, with a live count per (mission, role_label)."""
+
+    def __init__(self, db: Dict[str, Any]) -> None:
+        self.by_mission: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        self.counts: Dict[Tuple[Any, Any], int] = {}
+        self.mission_of: Dict[Any, Any] = {}
+        # Highest id present, for allocating new ids. Deleting it makes apply()
+        # ask for a rebuild, so the value matches a fresh view (and SQLite's MAX(id)).
+        self.max_id = 0
+        for a in db.get("assignments", []):
+            if a.get("id") not in self.mission_of:
+                self._add(a.get("id"), a)
+
+    def _add(self, aid: Any, a: Dict[str, Any]) -> None:
+        mid = a.get("mission_id")
+        self.by_mission.setdefault(mid, {})[aid] = a
+        self.mission_of[aid] = mid
+        key = (mid, a.get("role_label"))
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if isinstance(aid, int):
+            self.max_id = max(self.max_id, aid)
+
+    def _remove(self, aid: Any) -> None:
+        if aid not in self.mission_of:
+            return
+        mid = self.mission_of.pop(aid)
+        bucket = self.by_mission[mid]
+        a = bucket.pop(aid)
+        if not bucket:
+            del self.by_mission[mid]
+        key = (mid, a.get("role_label"))
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        for kind, name, key, value in ops:
+            if name != "assignments":
+                continue
+            if kind == "put":
+                self._remove(key)
+                self._add(key, value)
+            elif kind == "del" and key != self.max_id:
+                self._remove(key)
+            else:
+                return False
+        return True
+
+    def for_mission(self, mid: Any) -> List[Dict[str, Any]]:
+        bucket = self.by_mission.get(mid, {})
+        return [bucket[aid] for aid in sorted(bucket)]
+
+    def count(self, mid: Any, role_label: Any) -> int:
+        return self.counts.get((mid, role_label), 0)
+
+
+class TokenIndex:
+    """Tokens grouped by user_id."""
+
+    def __init__(self, db: Dict[str, Any]) -> None:
+        self.by_user: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        self.user_of: Dict[Any, Any] = {}
+        for t in db.get("tokens", []):
+            if t.get("token") not in self.user_of:
+                self._add(t.get("token"), t)
+
+    def _add(self, token: Any, t: Dict[str, Any]) -> None:
+        uid = t.get("user_id")
+        self.by_user.setdefault(uid, {})[token] = t
+        self.user_of[token] = uid
+
+    def _remove(self, token: Any) -> None:
+        if token not in self.user_of:
+            return
+        uid = self.user_of.pop(token)
+        bucket = self.by_user[uid]
+        del bucket[token]
+        if not bucket:
+            del self.by_user[uid]
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        for kind, name, key, value in ops:
+            if name != "tokens":
+                continue
+            if kind == "put":
+                self._remove(key)
+                self._add(key, value)
+            elif kind == "del":
+                self._remove(key)
+            else:
+                return False
+        return True
+
+    def for_user(self, uid: Any) -> List[Dict[str, Any]]:
+        return list(self.by_user.get(uid, {}).values())
+
+
+def _parse(value: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _order_key(start: Optional[datetime], mid: Any) -> Tuple[int, float, Any]:
+    # Unparsable starts sort first, like NULL start_ts in the SQLite backend;
+    # naive datetimes are placed as if they were UTC.
+    if start is None:
+        return (0, 0.0, mid)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    return (1, start.timestamp(), mid)
+
+
+def mission_order_key(m: Dict[str, Any]) -> Tuple[int, float, Any]:
+    """Position of a mission in (start, id) order, as used by cursors."""
+    return _order_key(_parse(m.get("start")), m.get("id"))
+
+
+class MissionTimeIndex:
+    """Missions ordered by (start, id), with start/end parsed once per write."""
+
+    def __init__(self, db: Dict[str, Any]) -> None:
+        self.keys: List[Tuple[int, float, Any]] = []
+        # id -> (order key, start, end, record)
+        self.entries: Dict[Any, Tuple[Tuple[int, float, Any], Optional[datetime], Optional[datetime], Dict[str, Any]]] = {}
+        for m in db.get("missions", []):
+            if m.get("id") not in self.entries:
+                self._add(m, sort=False)
+        self.keys.sort()
+
+    def _add(self, m: Dict[str, Any], sort: bool = True) -> None:
+        start, end = _parse(m.get("start")), _parse(m.get("end"))
+        key = _order_key(start, m.get("id"))
+        self.entries[m.get("id")] = (key, start, end, m)
+        if sort:
+            insort(self.keys, key)
+        else:
+            self.keys.append(key)
+
+    def _remove(self, mid: Any) -> None:
+        entry = self.entries.pop(mid, None)
+        if entry is not None:
+            i = bisect_left(self.keys, entry[0])
+            del self.keys[i]
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        for kind, name, key, value in ops:
+            if name != "missions":
+                continue
+            if kind == "put":
+                self._remove(key)
+                self._add(value)
+            elif kind == "del":
+                self._remove(key)
+            else:
+                return False
+        return True
+
+    def bounds(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        after: Optional[Tuple[int, float, Any]] = None,
+    ) -> Tuple[int, int]:
+        """Slice of self.keys whose start can qualify; a mission ending by date_to also starts by then."""
+        lo, hi = 0, len(self.keys)
+        if date_from is not None:
+            lo = bisect_left(self.keys, (1, _order_key(date_from, None)[1]))
+        if after is not None:
+            lo = max(lo, bisect_right(self.keys, after))
+        if date_to is not None:
+            hi = bisect_right(self.keys, (1, _order_key(date_to, None)[1], _INF))
+        return lo, hi
+
+    def match(self, mid: Any, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """The mission if it has start >= date_from and end <= date_to, else None."""
+        entry = self.entries.get(mid)
+        if entry is None:
+            return None
+        _, start, end, m = entry
+        try:
+            if date_from is not None and not (start is not None and start >= date_from):
+                return None
+            if date_to is not None and not (end is not None and end <= date_to):
+                return None
+        except TypeError:
+            # Aware and naive datetimes do not compare; such missions never matched.
+            return None
+        return m
+
+    def range(
+        self,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        after: Optional[Tuple[int, float, Any]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Missions with start >= date_from and end <= date_to, in start order, past the key after."""
+        lo, hi = self.bounds(date_from, date_to, after)
+        if date_from is None and date_to is None:
+            for key in self.keys[lo:hi]:
+                entry = self.entries.get(key[2])
+                if entry is not None:
+                    yield entry[3]
+            return
+        for key in self.keys[lo:hi]:
+            m = self.match(key[2], date_from, date_to)
+            if m is not None:
+                yield m
+
+    def ordered(self, ids: Iterable[Any], after: Optional[Tuple[int, float, Any]] = None) -> List[Any]:
+        """ids sorted into index order, past the key after; unknown ids are dropped."""
+        keys = (self.entries[i][0] for i in ids if i in self.entries)
+        if after is not None:
+            keys = (k for k in keys if k > after)
+        return [key[2] for key in sorted(keys)]
+
+    def key(self, mid: Any) -> Optional[Tuple[int, float, Any]]:
+        entry = self.entries.get(mid)
+        return entry[0] if entry is not None else None
+
+
+def mission_text(m: Dict[str, Any]) -> str:
+    return ((m.get("title") or "") + " " + (m.get("location") or "")).lower()
+
+
+class MissionTextIndex:
+    """Trigram index over lowercased "title location" for substring search.
+
+    A query of three or more characters intersects the id sets of its
+    trigrams and confirms the candidates against the text, so results are
+    exactly those of `q in text`, prefixes included. Shorter queries are
+    checked against the stored texts.
+    """
+
+    def __init__(self, db: Dict[str, Any]) -> None:
+        self.texts: Dict[Any, str] = {}
+        self.grams: Dict[str, Set[Any]] = {}
+        for m in db.get("missions", []):
+            if m.get("id") not in self.texts:
+                self._add(m)
+
+    @staticmethod
+    def _grams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _add(self, m: Dict[str, Any]) -> None:
+        mid = m.get("id")
+        text = self.texts[mid] = mission_text(m)
+        for g in self._grams(text):
+            self.grams.setdefault(g, set()).add(mid)
+
+    def _remove(self, mid: Any) -> None:
+        text = self.texts.pop(mid, None)
+        if text is None:
+            return
+        for g in self._grams(text):
+            ids = self.grams.get(g)
+            if ids is not None:
+                ids.discard(mid)
+                if not ids:
+                    del self.grams[g]
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        for kind, name, key, value in ops:
+            if name != "missions":
+                continue
+            if kind == "put":
+                self._remove(key)
+                self._add(value)
+            elif kind == "del":
+                self._remove(key)
+            else:
+                return False
+        return True
+
+    def search(self, q: str) -> Set[Any]:
+        q = q.lower()
+        if len(q) >= 3:
+            sets = sorted((self.grams.get(g, set()) for g in self._grams(q)), key=len)
+            candidates = set(sets[0]).intersection(*sets[1:])
+            return {mid for mid in candidates if q in self.texts.get(mid, "")}
+        # One or two characters match most of the table; checking the stored
+        # lowercased texts directly beats merging that many trigram sets.
+        return {mid for mid, text in list(self.texts.items()) if q in text}
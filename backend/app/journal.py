@@ -0,0 +1,242 @@
+import json, os, stat, tempfile, time
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+from app import config
+
+# A journal op is (kind, collection, key, value):
+#   ("put", name, key, record)  upsert one record by primary key
+#   ("del", name, key, None)    remove one record by primary key
+#   ("set", name, None, value)  replace a whole top-level value
+#   ("drop", name, None, None)  remove a top-level key
+Op = Tuple[str, str, Any, Any]
+
+# Primary key per collection; everything else is keyed by "id".
+KEYS = {"tokens": "token"}
+
+_MISSING = object()
+
+
+def _key_field(name: str) -> str:
+    return KEYS.get(name, "id")
+
+
+def _keyed(name: str, items: Any) -> Optional[Dict[Any, Dict[str, Any]]]:
+    """Index a list of records by primary key, or None if it is not a keyed collection."""
+    if not isinstance(items, list):
+        return None
+    field = _key_field(name)
+    out: Dict[Any, Dict[str, Any]] = {}
+    for rec in items:
+        if not isinstance(rec, dict):
+            return None
+        k = rec.get(field)
+        if k is None or k in out:
+            return None
+        out[k] = rec
+    return out
+
+
+def diff_db(old: Dict[str, Any], new: Dict[str, Any]) -> List[Op]:
+    ops: List[Op] = []
+    for name in old:
+        if name not in new:
+            ops.append(("drop", name, None, None))
+    for name, items in new.items():
+        prev = old.get(name, _MISSING)
+        if prev is items:
+            # Snapshots are never mutated, so a shared list is unchanged.
+            continue
+        if prev is _MISSING:
+            ops.append(("set", name, None, items))
+            continue
+        before = _keyed(name, prev)
+        after = _keyed(name, items)
+        if before is None or after is None:
+            if prev != items:
+                ops.append(("set", name, None, items))
+            continue
+        for k, rec in after.items():
+            if before.get(k, _MISSING) != rec:
+                ops.append(("put", name, k, rec))
+        for k in before:
+            if k not in after:
+                ops.append(("del", name, k, None))
+    return ops
+
+
+def apply_ops(db: Dict[str, Any], ops: List[Op]) -> None:
+    """Apply ops to db in place; record order is preserved and new keys are appended."""
+    keyed: Dict[str, Dict[Any, Dict[str, Any]]] = {}
+    for kind, name, k, value in ops:
+        if kind == "set":
+            keyed.pop(name, None)
+            db[name] = value
+        elif kind == "drop":
+            keyed.pop(name, None)
+            db.pop(name, None)
+        else:
+            if name not in keyed:
+                field = _key_field(name)
+                keyed[name] = {r.get(field): r for r in db.get(name, [])}
+            if kind == "put":
+                keyed[name][k] = value
+            else:
+                keyed[name].pop(k, None)
+    for name, records in keyed.items():
+        db[name] = list(records.values())
+
+
+def file_signature(path: str) -> Tuple[int, int, int]:
+    """Cheap change detector for a file: (inode, size, mtime_ns), zeros if missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0, 0)
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+# Filesystem timestamps can be as coarse as a scheduler tick, so a file read
+# within this window of its mtime could be rewritten without changing its signature.
+_RACY_NS = 50_000_000
+
+
+def is_racy(sig: Tuple[int, ...]) -> bool:
+    """Whether a signature of file_signature triples is too recent to trust."""
+    now = time.time_ns()
+    return any(now - mtime < _RACY_NS for mtime in sig[2::3])
+
+
+def stamp_mtime(path: str) -> None:
+    """Give a file we just wrote a nanosecond-precise mtime, which a concurrent
+    external write (stamped at timer-tick granularity) will not reproduce."""
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def write_atomic(path: str, dump: Callable[[IO[str]], None]) -> None:
+    """Write path through a temporary sibling that is fsynced and renamed over it,
+    so a reader in any process sees the old or the new file, never a torn one."""
+    d = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            dump(f)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    if os.name == "posix":
+        # Make the rename itself durable.
+        dfd = os.open(d, os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+
+
+class Journal:
+    """Snapshot file plus an append-only log of ops written by save_db.
+
+    Every save_db call becomes one log line, so a torn write at the tail
+    only loses that call. Replay is idempotent: compaction writes the new
+    snapshot before truncating the log, and re-applying puts and deletes
+    that are already in the snapshot yields the same state.
+
+    Other processes may read the files at any time without locking: read()
+    starts over if a compaction replaced the snapshot while it was reading.
+    Only write(), which runs under the store's write lock, repairs a torn tail.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.log_path = os.path.splitext(path)[0] + ".journal"
+        self.db: Dict[str, Any] = {}
+        self.entries = 0
+        self.good: Optional[int] = None
+
+    def signature(self) -> Tuple[int, ...]:
+        return file_signature(self.path) + file_signature(self.log_path)
+
+    def read(self) -> Dict[str, Any]:
+        while True:
+            db = self._read()
+            if db is not None:
+                return db
+
+    def _read(self) -> Optional[Dict[str, Any]]:
+        """Snapshot plus log, or None if a compaction replaced the snapshot meanwhile.
+
+        compact() replaces the snapshot before it truncates the log, so if the
+        snapshot is still the one that was read once the log has been read,
+        the log held exactly the ops that came after it.
+        """
+        with open(self.path, "r", encoding="utf-8") as f:
+            db = json.load(f)
+            st = os.fstat(f.fileno())
+        entries = 0
+        good = 0
+        self.good = None
+        # All lines are applied in one apply_ops call, which keys each
+        # collection once instead of once per line.
+        replay: List[Op] = []
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        ops = json.loads(line)["ops"]
+                    except (ValueError, KeyError, TypeError):
+                        break
+                    replay.extend(tuple(op) for op in ops)
+                    entries += 1
+                    good += len(line)
+            if good != os.path.getsize(self.log_path):
+                # A torn or corrupt tail, from a crash or from an append still
+                # in progress in another process; write() drops it if it is still there.
+                self.good = good
+        if file_signature(self.path) != (st.st_ino, st.st_size, st.st_mtime_ns):
+            return None
+        apply_ops(db, replay)
+        self.db = db
+        self.entries = entries
+        return db
+
+    def write(self, db: Dict[str, Any], ops: List[Op]) -> None:
+        """Record ops that turned self.db into db, compacting every JOURNAL_COMPACT_EVERY commits."""
+        self.db = db
+        if not ops:
+            return
+        line = json.dumps({"ops": [list(op) for op in ops]}, ensure_ascii=True, separators=(",", ":"))
+        if self.good is not None:
+            # save_db re-read the files under the write lock, so this tail is from a crash:
+            # drop it so new appends stay parseable.
+            with open(self.log_path, "r+b") as f:
+                f.truncate(self.good)
+            self.good = None
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            if config.JOURNAL_FSYNC:
+                os.fsync(f.fileno())
+        stamp_mtime(self.log_path)
+        self.entries += 1
+        if self.entries >= config.JOURNAL_COMPACT_EVERY:
+            self.compact()
+
+    def compact(self) -> None:
+        write_atomic(self.path, lambda f: json.dump(self.db, f, ensure_ascii=True))
+        with open(self.log_path, "w", encoding="utf-8"):
+            pass
+        stamp_mtime(self.path)
+        stamp_mtime(self.log_path)
+        self.entries = 0
@@ -1,9 +1,26 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app import config
-from app.routers import auth, missions, assignments, admin, admin_backup
+from app import config, hashing, notify, sweeper
+from app.routers import auth, missions, assignments, admin, admin_backup, admin_import
 
-app = FastAPI(title="app_v1")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if config.TOKEN_SWEEP_INTERVAL > 0:
+        tasks.append(asyncio.create_task(sweeper.run_sweeper(config.TOKEN_SWEEP_INTERVAL)))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    hashing.shutdown()
+    notify.shutdown()
+
+
+app = FastAPI(title="app_v1", lifespan=lifespan)
 
 if config.CORS_ORIGINS == "*":
     origins = ["*"]
@@ -23,6 +40,7 @@ app.include_router(missions.router)
 app.include_router(assignments.router)
 app.include_router(admin.router)
 app.include_router(admin_backup.router)
+app.include_router(admin_import.router)
 
 @app.get("/healthz")
 def healthz():
@@ -0,0 +1,325 @@
+import asyncio, logging, random, smtplib, threading, time, uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from app import config
+
+log = logging.getLogger(__name__)
+
+# Notifications are sent by a dispatcher running its own event loop in a
+# background thread, so a request only queues messages and returns a job id.
+# Every channel has its own queue and NOTIFY_WORKERS workers; a worker takes
+# up to the channel's batch_size messages, waits for the channel's rate
+# limit and hands the batch to the channel adapter. Failed messages are
+# queued again with exponential backoff, up to NOTIFY_RETRIES times.
+#
+# An adapter is any object with batch_size, rate (messages per second, 0 for
+# unlimited) and an async send(messages) returning, per message, None if it
+# was sent or the error it failed with; raising fails the whole batch.
+# Errors are retried unless they are a SendError with retry=False; a
+# SendError's retry_after replaces the backoff. register_channel adds or
+# replaces one.
+
+
+TEST_SUBJECT = "Test notification"
+TEST_BODY = "This is a test notification from app_v1."
+
+
+class Message(NamedTuple):
+    channel: str
+    to: str
+    subject: str
+    body: str
+
+
+class SendError(Exception):
+    """A failed send; its message is shown in job errors, so it must not contain secrets."""
+
+    def __init__(self, message: str, retry: bool = True, retry_after: Optional[float] = None) -> None:
+        super().__init__(message)
+        self.retry = retry
+        self.retry_after = retry_after
+
+
+class SmtpChannel:
+    """Sends a batch over one SMTP connection."""
+
+    def __init__(self) -> None:
+        self.batch_size = config.NOTIFY_BATCH_SIZE
+        self.rate = config.NOTIFY_RATE_EMAIL
+
+    async def send(self, messages: List[Message]) -> List[Optional[Exception]]:
+        return await asyncio.to_thread(self._send, messages)
+
+    def _send(self, messages: List[Message]) -> List[Optional[Exception]]:
+        out: List[Optional[Exception]] = []
+        with smtplib.SMTP(config.SMTP_HOST, config.SMTP_PORT, timeout=config.NOTIFY_TIMEOUT) as smtp:
+            if config.SMTP_STARTTLS:
+                smtp.starttls()
+            if config.SMTP_USER:
+                smtp.login(config.SMTP_USER, config.SMTP_PASSWORD)
+            for m in messages:
+                msg = EmailMessage()
+                msg["From"] = config.SMTP_FROM
+                msg["To"] = m.to
+                msg["Subject"] = m.subject
+                msg.set_content(m.body)
+                try:
+                    smtp.send_message(msg)
+                    out.append(None)
+                except smtplib.SMTPRecipientsRefused as e:
+                    out.append(e)
+                except smtplib.SMTPResponseException as e:
+                    # The message was refused; the connection is still usable.
+                    smtp.rset()
+                    out.append(e)
+        return out
+
+
+class TelegramChannel:
+    """Sends a batch as concurrent Bot API calls over one connection pool."""
+
+    def __init__(self) -> None:
+        self.batch_size = config.NOTIFY_BATCH_SIZE
+        self.rate = config.NOTIFY_RATE_TELEGRAM
+
+    async def send(self, messages: List[Message]) -> List[Optional[Exception]]:
+        # The URL holds the bot token, so no httpx error text is passed on.
+        url = f"{config.TELEGRAM_API_URL}/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
+        async with httpx.AsyncClient(timeout=config.NOTIFY_TIMEOUT) as client:
+            async def one(m: Message) -> Optional[Exception]:
+                try:
+                    r = await client.post(url, json={"chat_id": m.to, "text": f"{m.subject}\n\n{m.body}"})
+                except httpx.InvalidURL:
+                    return SendError("invalid TELEGRAM_API_URL", retry=False)
+                except httpx.HTTPError as e:
+                    return SendError(type(e).__name__)
+                return None if r.is_success else _telegram_error(r)
+            return list(await asyncio.gather(*(one(m) for m in messages)))
+
+
+def _telegram_error(r: httpx.Response) -> SendError:
+    """Server errors and 429 are retried, after Telegram's retry_after if it gave one; other 4xx are not."""
+    try:
+        data = r.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+    message = f"HTTP {r.status_code}"
+    if isinstance(data.get("description"), str):
+        message += f": {data['description']}"
+    params = data.get("parameters")
+    retry_after = params.get("retry_after") if isinstance(params, dict) else None
+    if not isinstance(retry_after, (int, float)) or isinstance(retry_after, bool):
+        retry_after = None
+    return SendError(message, retry=r.status_code >= 500 or r.status_code == 429, retry_after=retry_after)
+
+
+class DryRunChannel:
+    """Logs what would be sent (NOTIFY_DRY_RUN=1)."""
+
+    batch_size = 1000
+    rate = 0.0
+
+    async def send(self, messages: List[Message]) -> List[Optional[Exception]]:
+        for m in messages:
+            log.info("DRY RUN: would send %s to %s", m.channel, m.to)
+        return [None] * len(messages)
+
+
+DRY_RUN = "dry_run"
+
+_channels: Dict[str, Callable[[], Any]] = {
+    "email": SmtpChannel,
+    "telegram": TelegramChannel,
+    DRY_RUN: DryRunChannel,
+}
+
+
+def register_channel(name: str, factory: Callable[[], Any]) -> None:
+    """Send messages of channel name through factory(); applies to channels not used since the last shutdown()."""
+    _channels[name] = factory
+
+
+def user_messages(user: Dict[str, Any], subject: str, body: str) -> List[Message]:
+    """One message per channel the user's prefs enable."""
+    prefs = user.get("prefs") or {}
+    out = []
+    if prefs.get("email"):
+        out.append(Message("email", prefs["email"], subject, body))
+    if prefs.get("telegram") and prefs.get("telegram_chat_id"):
+        out.append(Message("telegram", str(prefs["telegram_chat_id"]), subject, body))
+    return out
+
+
+class _Job:
+    def __init__(self, total: int) -> None:
+        self.id = uuid.uuid4().hex
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        done = self.sent + self.failed
+        return {
+            "id": self.id,
+            "status": "done" if done >= self.total else "running" if done or self.retries else "queued",
+            "created_at": self.created_at,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+            "errors": list(self.errors),
+        }
+
+
+class _RateLimit:
+    """Token bucket; take(n) waits until n messages may go out."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.at = time.monotonic()
+
+    async def take(self, n: int) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.at) * self.rate)
+            self.at = now
+            if self.tokens >= min(n, self.burst):
+                # A batch larger than the burst goes out once the bucket is
+                # full and leaves it in debt.
+                self.tokens -= n
+                return
+            await asyncio.sleep((min(n, self.burst) - self.tokens) / self.rate)
+
+
+class Dispatcher:
+    def __init__(self) -> None:
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.jobs: "OrderedDict[str, _Job]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _start(self) -> None:
+        # Call with self.lock held.
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+            loop.close()
+
+        self.thread = threading.Thread(target=run, name="notify", daemon=True)
+        self.thread.start()
+        ready.wait()
+        self.loop = loop
+
+    def submit(self, messages: List[Message], dry_run: bool = False) -> Dict[str, Any]:
+        """Queue messages as one job and return its snapshot right away."""
+        job = _Job(len(messages))
+        with self.lock:
+            if self.loop is None:
+                self._start()
+            self.jobs[job.id] = job
+            while len(self.jobs) > config.NOTIFY_JOBS_KEPT:
+                self.jobs.popitem(last=False)
+            snapshot = job.snapshot()
+            self.loop.call_soon_threadsafe(self._enqueue, job, messages, dry_run)
+        return snapshot
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return job.snapshot() if job is not None else None
+
+    def shutdown(self) -> None:
+        with self.lock:
+            loop, thread = self.loop, self.thread
+            self.loop = self.thread = None
+            self.queues = {}
+        if loop is not None:
+            loop.call_soon_threadsafe(self._stop, loop)
+            thread.join(5)
+
+    @staticmethod
+    def _stop(loop: asyncio.AbstractEventLoop) -> None:
+        for task in asyncio.all_tasks(loop):
+            task.cancel()
+        loop.call_soon(loop.stop)
+
+    # The rest runs on the dispatcher's loop.
+
+    def _enqueue(self, job: _Job, messages: List[Message], dry_run: bool) -> None:
+        for m in messages:
+            self._queue(DRY_RUN if dry_run else m.channel).put_nowait((job, m, 0))
+
+    def _queue(self, name: str) -> asyncio.Queue:
+        q = self.queues.get(name)
+        if q is None:
+            q = self.queues[name] = asyncio.Queue()
+            factory = _channels.get(name)
+            adapter = factory() if factory is not None else None
+            limit = _RateLimit(getattr(adapter, "rate", 0), getattr(adapter, "batch_size", 1))
+            for _ in range(max(1, config.NOTIFY_WORKERS)):
+                asyncio.get_running_loop().create_task(self._worker(name, adapter, q, limit))
+        return q
+
+    async def _worker(self, name: str, adapter: Any, q: asyncio.Queue, limit: _RateLimit) -> None:
+        while True:
+            batch = [await q.get()]
+            size = max(1, getattr(adapter, "batch_size", 1))
+            while len(batch) < size and not q.empty():
+                batch.append(q.get_nowait())
+            messages = [m for _, m, _ in batch]
+            if adapter is None:
+                results: List[Optional[Exception]] = [LookupError(f"no channel {name!r}")] * len(batch)
+            else:
+                await limit.take(len(batch))
+                try:
+                    results = list(await adapter.send(messages))
+                except Exception as e:
+                    results = [e] * len(batch)
+            with self.lock:
+                for (job, m, attempt), error in zip(batch, results):
+                    if error is None:
+                        job.sent += 1
+                    elif attempt < config.NOTIFY_RETRIES and adapter is not None and getattr(error, "retry", True):
+                        job.retries += 1
+                        delay = getattr(error, "retry_after", None)
+                        if delay is None:
+                            delay = config.NOTIFY_RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                        asyncio.get_running_loop().call_later(delay, q.put_nowait, (job, m, attempt + 1))
+                    else:
+                        job.failed += 1
+                        if len(job.errors) < 20:
+                            job.errors.append({"channel": m.channel, "to": m.to, "error": str(error) or type(error).__name__})
+
+
+_dispatcher = Dispatcher()
+
+
+def submit(messages: List[Message], dry_run: bool = False) -> Dict[str, Any]:
+    return _dispatcher.submit(messages, dry_run)
+
+
+def job(job_id: str) -> Optional[Dict[str, Any]]:
+    return _dispatcher.job(job_id)
+
+
+def shutdown() -> None:
+    _dispatcher.shutdown()
@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from app import config
+from app.journal import Op
+
+# Encoded GET /missions pages, keyed by normalized query parameters. The
+# cache is a storage view (see app.indexes), so save_db drops it as soon as a
+# write touches missions, and a reload after another process wrote drops it
+# too. Counters survive the drops and are shared by all stores.
+
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+class PageCache:
+    """LRU of response bodies bounded by MISSION_PAGE_CACHE_SIZE entries and _BYTES bytes."""
+
+    def __init__(self, db: Dict[str, Any], name: str = "missions") -> None:
+        self.name = name
+        self.pages: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            body = self.pages.get(key)
+            if body is not None:
+                self.pages.move_to_end(key)
+        with _stats_lock:
+            _stats["hits" if body is not None else "misses"] += 1
+        return body
+
+    def put(self, key: Hashable, body: bytes) -> None:
+        max_entries, max_bytes = config.MISSION_PAGE_CACHE_SIZE, config.MISSION_PAGE_CACHE_BYTES
+        if max_entries <= 0 or len(body) > max_bytes:
+            return
+        evicted = 0
+        with self._lock:
+            old = self.pages.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self.pages[key] = body
+            self.bytes += len(body)
+            while len(self.pages) > max_entries or self.bytes > max_bytes:
+                _, dropped = self.pages.popitem(last=False)
+                self.bytes -= len(dropped)
+                evicted += 1
+        if evicted:
+            with _stats_lock:
+                _stats["evictions"] += evicted
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        if not any(name == self.name for _, name, _, _ in ops):
+            return True
+        if self.pages:
+            with _stats_lock:
+                _stats["invalidations"] += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with _stats_lock:
+            out: Dict[str, Any] = dict(_stats)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else None
+        out["entries"], out["bytes"] = len(self.pages), self.bytes
+        return out
@@ -0,0 +1,47 @@
+import base64, json
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Cursors are opaque to clients: urlsafe base64 of the JSON sort key of the
+# last item on a page. The next page starts strictly after that key, so rows
+# inserted or deleted meanwhile never shift it like an offset would.
+
+
+def encode_cursor(key: Any) -> str:
+    raw = json.dumps(list(key) if isinstance(key, tuple) else key, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode(cursor: str) -> Any:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+
+
+def _is_int(v: Any) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def mission_cursor(cursor: Optional[str]) -> Optional[Tuple[int, float, int]]:
+    """Decode a /missions cursor into a mission_order_key."""
+    if cursor is None:
+        return None
+    key = _decode(cursor)
+    if (
+        not isinstance(key, list) or len(key) != 3 or key[0] not in (0, 1)
+        or not isinstance(key[1], (int, float)) or isinstance(key[1], bool) or not _is_int(key[2])
+    ):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return (key[0], float(key[1]), key[2])
+
+
+def user_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Decode an /admin/users cursor into a user id."""
+    if cursor is None:
+        return None
+    key = _decode(cursor)
+    if not _is_int(key):
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    return key
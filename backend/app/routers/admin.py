@@ -1,15 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import Optional, Dict, Any
 from datetime import datetime, timezone
-from app.storage import load_db, save_db
+from app import notify, storage, sweeper
+from app.astorage import read, transact, write
+from app.storage import read_db, save_db, cache_stats, mission_pages, query_users
+from app.pagination import encode_cursor, user_cursor
 from app.schemas import UserOut, UserAdminUpdate
-from app.routers.auth import _current_user as current_user_dep
+from app.serialize import envelope, render_user
+from app.routers.auth import _current_user as current_user_dep, _invalidate_user, _invalidate_all
 import os
 
 router = APIRouter()
 
 
-def _admin_user(user: Dict[str, Any] = Depends(current_user_dep)) -> Dict[str, Any]:
+async def _admin_user(user: Dict[str, Any] = Depends(current_user_dep)) -> Dict[str, Any]:
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="forbidden")
     return user
@@ -25,66 +29,92 @@ def _to_out(u: Dict[str, Any]) -> UserOut:
 
 
 @router.get("/admin/users")
-def list_users(
+async def list_users(
     q: Optional[str] = None,
-    page: int = 1,
-    per_page: int = 10,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    with_total: bool = True,
     user: Dict[str, Any] = Depends(_admin_user),
 ):
-    db = load_db()
-    users = [u for u in db.get("users", []) if not u.get("deleted_at")]
-    if q:
-        ql = q.lower()
-        users = [u for u in users if ql in u.get("username", "").lower()]
-    total = len(users)
-    start = (page - 1) * per_page
-    end = start + per_page
-    items = [_to_out(u).model_dump() for u in users[start:end]]
-    return {"items": items, "page": page, "per_page": per_page, "total": total}
+    after = user_cursor(cursor)
+    return Response(await read(_users_page, q, page, per_page, after, with_total), media_type="application/json")
+
+
+def _users_page(q: Optional[str], page: int, per_page: int, after: Optional[int], with_total: bool) -> bytes:
+    # With a cursor, page is ignored; one extra row tells whether a next page exists.
+    offset = 0 if after is not None else (page - 1) * per_page
+    users, total = query_users(q, offset=offset, limit=per_page + 1, after=after, count=with_total)
+    next_cursor = encode_cursor(users[per_page - 1]["id"]) if len(users) > per_page else None
+    items = storage.fragments("users", render_user).encode(users[:per_page])
+    return envelope(items, page=page, per_page=per_page, total=total, next_cursor=next_cursor)
 
 
 @router.get("/admin/users/{uid}", response_model=UserOut)
-def get_user(uid: int, user: Dict[str, Any] = Depends(_admin_user)):
-    db = load_db()
-    u = next((u for u in db.get("users", []) if u.get("id") == uid and not u.get("deleted_at")), None)
-    if not u:
+async def get_user(uid: int, user: Dict[str, Any] = Depends(_admin_user)):
+    u = await read(storage.get_user, uid)
+    if not u or u.get("deleted_at"):
         raise HTTPException(status_code=404, detail="user not found")
     return _to_out(u)
 
 
 @router.put("/admin/users/{uid}", response_model=UserOut)
-def update_user(uid: int, payload: UserAdminUpdate, user: Dict[str, Any] = Depends(_admin_user)):
-    db = load_db()
-    users = db.get("users", [])
-    idx = next((i for i, u in enumerate(users) if u.get("id") == uid and not u.get("deleted_at")), None)
-    if idx is None:
+async def update_user(uid: int, payload: UserAdminUpdate, user: Dict[str, Any] = Depends(_admin_user)):
+    u = await transact(_update_user, uid, payload)
+    _invalidate_user(uid)
+    return _to_out(u)
+
+
+def _update_user(db: Dict[str, Any], uid: int, payload: UserAdminUpdate) -> Dict[str, Any]:
+    u = storage.get_user(uid)
+    if not u or u.get("deleted_at"):
         raise HTTPException(status_code=404, detail="user not found")
-    cur = dict(users[idx])
+    cur = dict(u)
     if payload.role is not None:
         cur["role"] = payload.role
     if payload.is_active is not None:
         cur["is_active"] = payload.is_active
-    users[idx] = cur
-    save_db(db)
-    return _to_out(cur)
+    db.put("users", cur)
+    return cur
 
 
 @router.delete("/admin/users/{uid}", status_code=204)
-def delete_user(uid: int, user: Dict[str, Any] = Depends(_admin_user)):
-    db = load_db()
-    u = next((u for u in db.get("users", []) if u.get("id") == uid and not u.get("deleted_at")), None)
-    if not u:
+async def delete_user(uid: int, user: Dict[str, Any] = Depends(_admin_user)):
+    await transact(_delete_user, uid)
+    _invalidate_user(uid)
+
+
+def _delete_user(db: Dict[str, Any], uid: int) -> None:
+    u = storage.get_user(uid)
+    if not u or u.get("deleted_at"):
         raise HTTPException(status_code=404, detail="user not found")
-    u["deleted_at"] = datetime.now(timezone.utc).isoformat()
-    u["is_active"] = False
-    save_db(db)
-    return
+    db.put("users", dict(u, deleted_at=datetime.now(timezone.utc).isoformat(), is_active=False))
+
+
+@router.get("/admin/storage/stats")
+async def storage_stats(user: Dict[str, Any] = Depends(_admin_user)):
+    return await read(_storage_stats)
+
+
+def _storage_stats() -> Dict[str, Any]:
+    return {
+        "cache": cache_stats(),
+        "transactions": storage.txn_stats(),
+        "mission_pages": mission_pages().stats(),
+        "token_sweeper": sweeper.stats(),
+    }
+
+
+@router.post("/admin/tokens/sweep")
+async def sweep_tokens(user: Dict[str, Any] = Depends(_admin_user)):
+    return await sweeper.sweep_expired_tokens()
 
 
 @router.post("/admin/reset")
-def reset(user: Dict[str, Any] = Depends(_admin_user)):
+async def reset(user: Dict[str, Any] = Depends(_admin_user)):
     db = {"users": [], "tokens": [], "missions": [], "assignments": []}
-    save_db(db)
+    await write(save_db, db)
+    _invalidate_all()
     return {"ok": True}
 
 
@@ -96,31 +126,27 @@ def _users_with_prefs(db: Dict[str, Any]):
 
 
 @router.get("/admin/notifications/diagnostic")
-def notifications_diag(user: Dict[str, Any] = Depends(_admin_user)):
-    db = load_db()
+async def notifications_diag(user: Dict[str, Any] = Depends(_admin_user)):
+    db = await read(read_db)
     users = _users_with_prefs(db)
     return {"users_with_prefs": len(users)}
 
 
 @router.post("/admin/notifications/diagnostic/test")
-def notifications_diag_test(user: Dict[str, Any] = Depends(_admin_user)):
-    db = load_db()
+async def notifications_diag_test(user: Dict[str, Any] = Depends(_admin_user)):
+    db = await read(read_db)
     users = _users_with_prefs(db)
     dry_run = os.environ.get("NOTIFY_DRY_RUN", "1") == "1"
-    tested = 0
-    for u in users:
-        prefs = u.get("prefs", {})
-        channels = []
-        if prefs.get("email"):
-            channels.append("email")
-        if prefs.get("telegram") and prefs.get("telegram_chat_id"):
-            channels.append("telegram")
-        tested += 1
-        if dry_run:
-            for ch in channels:
-                if ch == "email":
-                    print(f"DRY RUN: would send email to {prefs.get('email')}")
-                elif ch == "telegram":
-                    print(f"DRY RUN: would send telegram to {prefs.get('telegram_chat_id')}")
-    return {"ok": True, "dry_run": dry_run, "tested": tested}
+    messages = [m for u in users for m in notify.user_messages(u, notify.TEST_SUBJECT, notify.TEST_BODY)]
+    # Sent in the background; poll the job for progress.
+    job = notify.submit(messages, dry_run)
+    return {"ok": True, "dry_run": dry_run, "tested": len(users), "job_id": job["id"]}
+
+
+@router.get("/admin/notifications/jobs/{job_id}")
+async def notification_job(job_id: str, user: Dict[str, Any] = Depends(_admin_user)):
+    job = notify.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
 
@@ -1,66 +1,138 @@
-from fastapi import APIRouter, Depends, HTTPException, Body
-from fastapi.responses import JSONResponse
-from typing import Dict, Any
+import zlib
+from anyio import from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Iterator, List, Optional
 from datetime import datetime, timezone
-from app.storage import load_db, save_db
-from app.routers.auth import _current_user as current_user_dep
+from app import config
+from app.backups import COLLECTIONS, BackupError, BackupReader, gzipped, iter_backup
+from app.changes import ChangesTooOld
+from app.storage import backup_snapshot, change_seq, read_db, save_db, write_lock
+from app.routers.auth import _current_user as current_user_dep, _invalidate_all
 
 router = APIRouter()
 
+_MERGED = ["users", "missions", "assignments"]
 
-def _admin_user(user: Dict[str, Any] = Depends(current_user_dep)) -> Dict[str, Any]:
+
+class _OutOfChain(Exception):
+    pass
+
+
+async def _admin_user(user: Dict[str, Any] = Depends(current_user_dep)) -> Dict[str, Any]:
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="forbidden")
     return user
 
 
 @router.get("/admin/backup")
-def backup(user: Dict[str, Any] = Depends(_admin_user)):
-    db = load_db()
-    payload = {
-        "users": db.get("users", []),
-        "tokens": db.get("tokens", []),
-        "missions": db.get("missions", []),
-        "assignments": db.get("assignments", []),
-    }
+def backup(
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    gzip: bool = False,
+    since: Optional[int] = Query(None, ge=0),
+    user: Dict[str, Any] = Depends(_admin_user),
+):
+    # The cached snapshot is never mutated (save_db swaps in a new one), so it
+    # can be streamed record by record without copying it first.
+    try:
+        db, seq, changed = backup_snapshot(since)
+    except ChangesTooOld as e:
+        raise HTTPException(status_code=410, detail=str(e))
     now = datetime.now(timezone.utc)
-    data = {
-        "version": 1,
-        "created_at": now.isoformat(),
-        "payload": payload,
-    }
-    filename = f"backup_{now.strftime('%Y%m%d_%H%M%S')}.json"
+    body = iter_backup(db, now.isoformat(), format, seq, since, changed)
+    kind = "backup" if since is None else f"backup_since_{since}"
+    filename = f"{kind}_{now.strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = "application/json" if format == "json" else "application/x-ndjson"
+    if gzip:
+        body, filename, media_type = gzipped(body), filename + ".gz", "application/gzip"
     headers = {"Content-Disposition": f"attachment; filename=\"{filename}\""}
-    return JSONResponse(content=data, headers=headers)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
+
+
+def _chunks(request: Request) -> Iterator[bytes]:
+    """Pull the request body into a worker thread, one chunk at a time."""
+    stream = request.stream().__aiter__()
+
+    async def _next() -> Optional[bytes]:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    while True:
+        chunk = from_thread.run(_next)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _merge(base: Dict[str, Any], upserts: Dict[str, Dict[Any, Dict[str, Any]]], deleted: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """Upsert users, missions and assignments by id; tokens are kept as they are.
+
+    Lists are copied but records are shared with the cached snapshot.
+    """
+    db = dict(base)
+    for name in _MERGED:
+        merged = list(base.get(name, []))
+        index = {item.get("id"): i for i, item in enumerate(merged)}
+        for key, rec in upserts[name].items():
+            i = index.get(key)
+            if i is None:
+                index[key] = len(merged)
+                merged.append(rec)
+            else:
+                merged[i] = rec
+        gone = set(deleted.get(name, ()))
+        db[name] = [item for item in merged if item.get("id") not in gone] if gone else merged
+    db.setdefault("tokens", [])
+    return db
+
+
+def _restore(chunks: Iterator[bytes], wipe: bool, verify: bool) -> Dict[str, int]:
+    reader = BackupReader(chunks, config.RESTORE_MAX_INFLATED)
+    db: Dict[str, Any] = {k: [] for k in COLLECTIONS}
+    # A merge only collects the upload here (later records with the same id
+    # win); it is applied to the current data under the write lock below, so
+    # no write is lost while a slow upload is read.
+    upserts: Dict[str, Dict[Any, Dict[str, Any]]] = {k: {} for k in _MERGED}
+    for name, rec in reader.records():
+        if wipe:
+            db[name].append(rec)
+        elif name in upserts:
+            upserts[name][rec.get("id")] = rec
+    if verify and not reader.verified():
+        raise BackupError("checksum mismatch")
+    since = reader.meta.get("since")
+    if since is not None and wipe:
+        raise BackupError("an incremental backup must be restored with wipe=false")
+    # Nothing is written until the whole upload has been read and checked.
+    seq = reader.meta.get("seq")
+    restored = seq if isinstance(seq, int) else None
+    if wipe:
+        save_db(db, restored=restored)
+        return reader.seen
+    with write_lock():
+        if since is not None:
+            last = change_seq()[1]
+            if last != since:
+                raise _OutOfChain(f"backup is incremental since {since}, last restored backup is at {last}")
+        save_db(_merge(read_db(), upserts, reader.deleted), restored=restored)
+    return reader.seen
 
 
 @router.post("/admin/restore")
-def restore(
-    data: Dict[str, Any] = Body(...),
+async def restore(
+    request: Request,
     wipe: bool = True,
+    verify: bool = False,
     user: Dict[str, Any] = Depends(_admin_user),
 ):
-    if data.get("version") != 1 or not isinstance(data.get("payload"), dict):
-        raise HTTPException(status_code=422, detail="invalid backup")
-    payload = data["payload"]
-    required = ["users", "tokens", "missions", "assignments"]
-    for k in required:
-        if k not in payload or not isinstance(payload.get(k), list):
-            raise HTTPException(status_code=422, detail="invalid backup")
-    if wipe:
-        db = {k: payload.get(k, []) for k in required}
-    else:
-        db = load_db()
-        for k in ["users", "missions", "assignments"]:
-            existing = db.get(k, [])
-            index = {item.get("id"): i for i, item in enumerate(existing)}
-            for item in payload.get(k, []):
-                idx = index.get(item.get("id"))
-                if idx is None:
-                    existing.append(item)
-                else:
-                    existing[idx] = item
-            db[k] = existing
-        db.setdefault("tokens", [])
-    save_db(db)
-    return {"ok": True}
+    try:
+        counts = await run_in_threadpool(_restore, _chunks(request), wipe, verify)
+    except (BackupError, UnicodeDecodeError, zlib.error) as e:
+        raise HTTPException(status_code=422, detail=f"invalid backup: {e}")
+    except _OutOfChain as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    _invalidate_all()
+    return {"ok": True, "records": counts}
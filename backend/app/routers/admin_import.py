@@ -0,0 +1,135 @@
+import csv, json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app import config, storage
+from app.astorage import transact
+from app.routers.auth import _current_user as current_user_dep
+from app.routers.missions import _to_record
+from app.schemas import MissionCreate
+from app.streams import LineTooLong, iter_lines
+
+router = APIRouter()
+
+_MAX_RECORD = 1 << 20
+
+
+async def _admin_user(user: Dict[str, Any] = Depends(current_user_dep)) -> Dict[str, Any]:
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="forbidden")
+    return user
+
+
+async def _ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    n = 0
+    async for line in lines:
+        n += 1
+        if not line.strip():
+            continue
+        try:
+            yield n, json.loads(line)
+        except ValueError as e:
+            yield n, e
+
+
+async def _csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    # A quoted field may span lines; a record is complete once its quotes balance.
+    header: Optional[List[str]] = None
+    record, first, n = "", 0, 0
+    async for line in lines:
+        n += 1
+        if not record:
+            first = n
+        record = record + "\n" + line if record else line
+        if record.count('"') % 2:
+            if len(record) > _MAX_RECORD:
+                raise LineTooLong(f"record longer than {_MAX_RECORD} characters")
+            continue
+        values, record = next(csv.reader([record])), ""
+        if not any(v.strip() for v in values):
+            continue
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) != len(header):
+            yield first, ValueError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        row: Dict[str, Any] = {k: v for k, v in zip(header, values) if v != ""}
+        if "positions" in row:
+            try:
+                row["positions"] = json.loads(row["positions"])
+            except ValueError as e:
+                yield first, e
+                continue
+        yield first, row
+    if record:
+        yield first, ValueError("unterminated quoted field")
+
+
+def _errors(e: Exception) -> List[Dict[str, Any]]:
+    if isinstance(e, ValidationError):
+        return [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+    return [{"loc": [], "msg": str(e)}]
+
+
+def _commit(db: Dict[str, Any], batch: List[Dict[str, Any]]) -> None:
+    mid = storage.next_mission_id(len(batch))
+    # Runs again on a conflict, so ids go on copies of the validated rows.
+    for i, m in enumerate(batch):
+        db.put("missions", dict(m, id=mid + i))
+
+
+@router.post("/admin/missions/import")
+async def import_missions(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    user: Dict[str, Any] = Depends(_admin_user),
+):
+    """Create missions from an NDJSON or CSV body, read as it streams in.
+
+    Each row is validated with MissionCreate; valid rows are stored every
+    IMPORT_BATCH_SIZE rows and invalid ones reported by line number. Rows
+    stored before an error stay stored. CSV needs a header row; its
+    positions column, if any, holds a JSON list.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    lines = iter_lines(request.stream())
+    rows = _csv_rows(lines) if format == "csv" else _ndjson_rows(lines)
+    batch: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    imported = failed = batches = 0
+    try:
+        async for n, row in rows:
+            if isinstance(row, Exception):
+                err: Optional[Exception] = row
+            elif not isinstance(row, dict):
+                err = ValueError("row must be an object")
+            else:
+                try:
+                    batch.append(_to_record(MissionCreate.model_validate(row)))
+                    err = None
+                except ValidationError as e:
+                    err = e
+            if err is not None:
+                failed += 1
+                if len(errors) < config.IMPORT_MAX_ERRORS:
+                    errors.append({"line": n, "errors": _errors(err)})
+                continue
+            if len(batch) >= config.IMPORT_BATCH_SIZE:
+                await transact(_commit, batch)
+                imported, batches, batch = imported + len(batch), batches + 1, []
+    except (LineTooLong, UnicodeDecodeError) as e:
+        # The rest of the body cannot be read; rows before it are still stored.
+        failed += 1
+        errors.append({"line": None, "errors": _errors(e)})
+    if batch:
+        await transact(_commit, batch)
+        imported, batches = imported + len(batch), batches + 1
+    return {
+        "imported": imported,
+        "failed": failed,
+        "batches": batches,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
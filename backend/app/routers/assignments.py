@@ -1,46 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import Dict, Any, List
-from app.storage import load_db, save_db
-from app.schemas import AssignmentIn, AssignmentOut
+from app import storage
+from app.astorage import read, transact
+from app.serialize import envelope, render_assignment
+from app.storage import get_mission, mission_assignments, count_assignments, next_assignment_id
+from app.schemas import AssignmentIn, AssignmentOut, AssignmentBulkIn
 from app.routers.auth import _current_user as current_user_dep
 
 router = APIRouter()
 
 
-def _ensure_missions(db: Dict[str, Any]) -> None:
-    db.setdefault("missions", [])
-
-
-def _ensure_assignments(db: Dict[str, Any]) -> None:
-    db.setdefault("assignments", [])
-
-
-def _next_id(items: List[Dict[str, Any]]) -> int:
-    return (max((x.get("id", 0) for x in items), default=0) + 1)
-
-
 def _to_out(a: Dict[str, Any]) -> AssignmentOut:
     return AssignmentOut(**a)
 
 
 @router.post("/missions/{mid}/assign", response_model=AssignmentOut)
-def create_assignment(mid: int, payload: AssignmentIn, user=Depends(current_user_dep)):
-    db = load_db()
-    _ensure_missions(db)
-    _ensure_assignments(db)
-    mission = next((m for m in db["missions"] if m.get("id") == mid), None)
+async def create_assignment(mid: int, payload: AssignmentIn, user=Depends(current_user_dep)):
+    # Checked and stored in one transaction, which commits only if no other
+    # assignment was stored since the check, so capacity cannot be oversubscribed.
+    return _to_out(await transact(_create_assignment, mid, payload))
+
+
+def _create_assignment(db: Dict[str, Any], mid: int, payload: AssignmentIn) -> Dict[str, Any]:
+    mission = get_mission(mid)
     if not mission:
         raise HTTPException(status_code=404, detail="mission not found")
     pos = next((p for p in mission.get("positions", []) if p.get("label") == payload.role_label), None)
     if not pos:
         raise HTTPException(status_code=422, detail="invalid role_label")
-    existing = [
-        a for a in db["assignments"]
-        if a.get("mission_id") == mid and a.get("role_label") == payload.role_label
-    ]
-    if len(existing) >= pos.get("count", 0):
+    if count_assignments(mid, payload.role_label) >= pos.get("count", 0):
         raise HTTPException(status_code=422, detail="capacity exceeded")
-    aid = _next_id(db["assignments"])
+    aid = next_assignment_id()
     a = {
         "id": aid,
         "mission_id": mid,
@@ -48,43 +38,75 @@ def create_assignment(mid: int, payload: AssignmentIn, user=Depends(current_user
         "role_label": payload.role_label,
         "status": payload.status,
     }
-    db["assignments"].append(a)
-    save_db(db)
-    return _to_out(a)
+    db.put("assignments", a)
+    return a
 
 
-@router.get("/missions/{mid}/assignments")
-def list_assignments(mid: int):
-    db = load_db()
-    _ensure_missions(db)
-    _ensure_assignments(db)
-    mission = next((m for m in db["missions"] if m.get("id") == mid), None)
+@router.post("/missions/{mid}/assign/bulk")
+async def create_assignments_bulk(
+    mid: int, payload: AssignmentBulkIn, all_or_nothing: bool = False, user=Depends(current_user_dep)
+):
+    return await transact(_create_assignments_bulk, mid, payload, all_or_nothing)
+
+
+def _create_assignments_bulk(db: Dict[str, Any], mid: int, payload: AssignmentBulkIn, all_or_nothing: bool) -> Dict[str, Any]:
+    """Validate every item against position capacity, then store the accepted ones in one write.
+
+    Items are checked in order, each against the assignments already stored
+    plus the ones accepted before it. With all_or_nothing, a single rejected
+    item rejects the whole batch (422) and nothing is written.
+    """
+    mission = get_mission(mid)
     if not mission:
         raise HTTPException(status_code=404, detail="mission not found")
-    items = [
-        _to_out(a).model_dump() for a in db["assignments"] if a.get("mission_id") == mid
-    ]
-    return {"items": items, "total": len(items)}
+    capacity = {p.get("label"): p.get("count", 0) for p in mission.get("positions", [])}
+    used: Dict[str, int] = {}
+    aid = next_assignment_id(len(payload.items))
+    results: List[Dict[str, Any]] = []
+    accepted: List[Dict[str, Any]] = []
+    for i, item in enumerate(payload.items):
+        label = item.role_label
+        if label not in capacity:
+            results.append({"index": i, "ok": False, "detail": "invalid role_label"})
+            continue
+        if label not in used:
+            used[label] = count_assignments(mid, label)
+        if used[label] >= capacity[label]:
+            results.append({"index": i, "ok": False, "detail": "capacity exceeded"})
+            continue
+        used[label] += 1
+        a = {"id": aid, "mission_id": mid, "user_id": item.user_id, "role_label": label, "status": item.status}
+        aid += 1
+        accepted.append(a)
+        results.append({"index": i, "ok": True, "assignment": _to_out(a).model_dump()})
+    rejected = len(results) - len(accepted)
+    if rejected and all_or_nothing:
+        raise HTTPException(status_code=422, detail={"items": results})
+    for a in accepted:
+        db.put("assignments", a)
+    return {"items": results, "created": len(accepted), "rejected": rejected}
+
+
+@router.get("/missions/{mid}/assignments")
+async def list_assignments(mid: int):
+    return Response(await read(_list_assignments, mid), media_type="application/json")
+
+
+def _list_assignments(mid: int) -> bytes:
+    if not get_mission(mid):
+        raise HTTPException(status_code=404, detail="mission not found")
+    items = storage.fragments("assignments", render_assignment).encode(mission_assignments(mid))
+    return envelope(items, total=len(items))
 
 
 @router.delete("/missions/{mid}/assignments/{aid}", status_code=204)
-def delete_assignment(mid: int, aid: int, user=Depends(current_user_dep)):
-    db = load_db()
-    _ensure_missions(db)
-    _ensure_assignments(db)
-    mission = next((m for m in db["missions"] if m.get("id") == mid), None)
-    if not mission:
+async def delete_assignment(mid: int, aid: int, user=Depends(current_user_dep)):
+    await transact(_delete_assignment, mid, aid)
+
+
+def _delete_assignment(db: Dict[str, Any], mid: int, aid: int) -> None:
+    if not get_mission(mid):
         raise HTTPException(status_code=404, detail="mission not found")
-    idx = next(
-        (
-            i
-            for i, a in enumerate(db["assignments"])
-            if a.get("id") == aid and a.get("mission_id") == mid
-        ),
-        None,
-    )
-    if idx is None:
+    if not any(a.get("id") == aid for a in mission_assignments(mid)):
         raise HTTPException(status_code=404, detail="assignment not found")
-    db["assignments"].pop(idx)
-    save_db(db)
-    return
+    db.delete("assignments", aid)
@@ -1,40 +1,99 @@
 from fastapi import APIRouter, HTTPException, Header, Depends
-from typing import Optional, Dict, Any
-from app.storage import load_db, save_db
+from typing import Optional, Dict, Any, Set, Tuple
+from app.storage import find_user, username_taken, next_user_id, get_token, get_user, user_tokens
 from app.schemas import UserIn, UserOut, TokenOut, NotificationPrefsIn
-from app import config
-import secrets, bcrypt, os
+from app import config, notify
+from app.astorage import read, transact
+from app.hashing import hash_password_async, verify_password_async
+import secrets, os, threading, time
 from datetime import datetime, timezone, timedelta
 
 router = APIRouter()
 
-def _hash_password(pw: str) -> str:
-    return bcrypt.hashpw(pw.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-def _verify_password(pw: str, hashed: str) -> bool:
-    try:
-        return bcrypt.checkpw(pw.encode("utf-8"), hashed.encode("utf-8"))
-    except Exception:
-        return False
-
 def _new_token(user_id: int) -> str:
     return "tok_{0}_{1}".format(user_id, secrets.token_hex(16))
 
-@router.post("/auth/register", response_model=UserOut)
-def register(payload: UserIn):
-    db = load_db()
-    if any(u["username"] == payload.username for u in db.get("users", [])):
+# Resolved sessions: token -> (cached until, token expiry, user). Entries are
+# dropped by the _invalidate_* hooks when a handler changes a user; the short
+# AUTH_CACHE_TTL bounds staleness for writes made by other processes.
+# _cache_generation is bumped by every invalidation so a resolve that loaded
+# the user before a write does not store its stale copy afterwards.
+_user_cache: Dict[str, Tuple[float, datetime, Dict[str, Any]]] = {}
+_user_tokens: Dict[int, Set[str]] = {}
+_user_cache_lock = threading.Lock()
+_cache_generation = 0
+
+def _current_generation() -> int:
+    with _user_cache_lock:
+        return _cache_generation
+
+def _cached_session(token: str) -> Optional[Tuple[datetime, Dict[str, Any]]]:
+    with _user_cache_lock:
+        hit = _user_cache.get(token)
+        if hit is None:
+            return None
+        if hit[0] <= time.monotonic():
+            _drop_session(token)
+            return None
+        return hit[1], hit[2]
+
+def _cache_session(token: str, expires_at: datetime, user: Dict[str, Any], generation: int) -> None:
+    if config.AUTH_CACHE_TTL <= 0:
+        return
+    with _user_cache_lock:
+        if generation != _cache_generation:
+            return
+        while len(_user_cache) >= config.AUTH_CACHE_SIZE:
+            _drop_session(next(iter(_user_cache)))
+        _user_cache[token] = (time.monotonic() + config.AUTH_CACHE_TTL, expires_at, user)
+        _user_tokens.setdefault(user["id"], set()).add(token)
+
+def _drop_session(token: str) -> None:
+    hit = _user_cache.pop(token, None)
+    if hit is not None:
+        tokens = _user_tokens.get(hit[2]["id"])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del _user_tokens[hit[2]["id"]]
+
+def _invalidate_user(uid: int) -> None:
+    global _cache_generation
+    with _user_cache_lock:
+        _cache_generation += 1
+        for token in list(_user_tokens.get(uid, ())):
+            _drop_session(token)
+
+def _invalidate_all() -> None:
+    global _cache_generation
+    with _user_cache_lock:
+        _cache_generation += 1
+        _user_cache.clear()
+        _user_tokens.clear()
+
+def _create_user(db: Dict[str, Any], username: str, password_hash: str) -> int:
+    # A username stays taken after its user is soft-deleted.
+    if username_taken(username):
         raise HTTPException(status_code=409, detail="User already exists")
-    next_id = (max([u.get("id", 0) for u in db.get("users", [])]) + 1) if db.get("users") else 1
+    next_id = next_user_id()
     user = {
         "id": next_id,
-        "username": payload.username,
-        "password_hash": _hash_password(payload.password),
+        "username": username,
+        "password_hash": password_hash,
         "role": "intermittent",
         "is_active": True,
     }
-    db["users"].append(user)
-    save_db(db)
+    db.put("users", user)
+    return next_id
+
+# bcrypt runs in the hashing process pool and storage calls in app.astorage's
+# threads, so no handler here holds a threadpool slot while it waits.
+@router.post("/auth/register", response_model=UserOut)
+async def register(payload: UserIn):
+    if await read(username_taken, payload.username):
+        raise HTTPException(status_code=409, detail="User already exists")
+    password_hash = await hash_password_async(payload.password)
+    next_id = await transact(_create_user, payload.username, password_hash)
     return {
         "id": next_id,
         "username": payload.username,
@@ -43,37 +102,49 @@ def register(payload: UserIn):
     }
 
 @router.post("/auth/token-json", response_model=TokenOut)
-def token_json(payload: UserIn):
-    db = load_db()
-    user = next((u for u in db.get("users", []) if u["username"] == payload.username), None)
-    if not user or not _verify_password(payload.password, user["password_hash"]):
+async def token_json(payload: UserIn):
+    user = await read(find_user, payload.username)
+    if not user or not await verify_password_async(payload.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    tok = _new_token(user["id"])
-    db.setdefault("tokens", [])
-    db["tokens"] = [t for t in db["tokens"] if t.get("user_id") != user["id"]]
-    db["tokens"].append({"token": tok, "user_id": user["id"], "created_at": datetime.now(timezone.utc).isoformat()})
-    save_db(db)
+    tok = await transact(_issue_token, user)
+    _invalidate_user(user["id"])
     return {"access_token": tok}
 
-def _current_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+def _issue_token(db: Dict[str, Any], user: Dict[str, Any]) -> str:
+    tok = _new_token(user["id"])
+    for t in user_tokens(user["id"]):
+        db.delete("tokens", t.get("token"))
+    db.put("tokens", {"token": tok, "user_id": user["id"], "created_at": datetime.now(timezone.utc).isoformat()})
+    return tok
+
+async def _current_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Token required")
     token = authorization.split(" ", 1)[1].strip()
-    db = load_db()
-    t = next((t for t in db.get("tokens", []) if t["token"] == token), None)
+    hit = _cached_session(token)
+    if hit is not None:
+        if hit[0] <= datetime.now(timezone.utc):
+            raise HTTPException(status_code=401, detail="Token expired")
+        return hit[1]
+    return await read(_resolve_session, token)
+
+def _resolve_session(token: str) -> Dict[str, Any]:
+    generation = _current_generation()
+    t = get_token(token)
     if not t:
         raise HTTPException(status_code=401, detail="Invalid token")
     created_at = datetime.fromisoformat(t.get("created_at"))
-    ttl = timedelta(minutes=config.TOKEN_TTL)
-    if created_at + ttl <= datetime.now(timezone.utc):
+    expires_at = created_at + timedelta(minutes=config.TOKEN_TTL)
+    if expires_at <= datetime.now(timezone.utc):
         raise HTTPException(status_code=401, detail="Token expired")
-    user = next((u for u in db.get("users", []) if u["id"] == t["user_id"]), None)
+    user = get_user(t["user_id"])
     if not user or not user.get("is_active", True):
         raise HTTPException(status_code=401, detail="Inactive user")
+    _cache_session(token, expires_at, user, generation)
     return user
 
 @router.get("/auth/me", response_model=UserOut)
-def me(user: Dict[str, Any] = Depends(_current_user)):
+async def me(user: Dict[str, Any] = Depends(_current_user)):
     return {
         "id": user["id"],
         "username": user["username"],
@@ -83,31 +154,24 @@ def me(user: Dict[str, Any] = Depends(_current_user)):
 
 
 @router.put("/auth/me/prefs")
-def update_prefs(payload: NotificationPrefsIn, user: Dict[str, Any] = Depends(_current_user)):
-    db = load_db()
-    users = db.get("users", [])
-    idx = next((i for i, u in enumerate(users) if u.get("id") == user["id"]), None)
-    if idx is None:
+async def update_prefs(payload: NotificationPrefsIn, user: Dict[str, Any] = Depends(_current_user)):
+    prefs = await transact(_update_prefs, user["id"], payload)
+    _invalidate_user(user["id"])
+    return prefs
+
+
+def _update_prefs(db: Dict[str, Any], uid: int, payload: NotificationPrefsIn) -> Dict[str, Any]:
+    u = get_user(uid)
+    if u is None:
         raise HTTPException(status_code=404, detail="user not found")
     prefs = payload.model_dump()
-    users[idx]["prefs"] = prefs
-    save_db(db)
+    db.put("users", dict(u, prefs=prefs))
     return prefs
 
 
 @router.post("/auth/me/notify-test")
-def notify_test(user: Dict[str, Any] = Depends(_current_user)):
-    prefs = user.get("prefs", {}) or {}
-    channels = []
-    if prefs.get("email"):
-        channels.append("email")
-    if prefs.get("telegram") and prefs.get("telegram_chat_id"):
-        channels.append("telegram")
+async def notify_test(user: Dict[str, Any] = Depends(_current_user)):
+    messages = notify.user_messages(user, notify.TEST_SUBJECT, notify.TEST_BODY)
     dry_run = os.environ.get("NOTIFY_DRY_RUN", "1") == "1"
-    if dry_run:
-        for ch in channels:
-            if ch == "email":
-                print(f"DRY RUN: would send email to {prefs.get('email')}")
-            elif ch == "telegram":
-                print(f"DRY RUN: would send telegram to {prefs.get('telegram_chat_id')}")
-    return {"ok": True, "dry_run": dry_run, "channels": channels}
+    job = notify.submit(messages, dry_run)
+    return {"ok": True, "dry_run": dry_run, "channels": [m.channel for m in messages], "job_id": job["id"]}
@@ -1,19 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime
-from app.storage import load_db, save_db
+from app import storage
+from app.astorage import read, transact
+from app.etags import etag, matches, not_modified
+from app.indexes import mission_order_key
+from app.pagination import encode_cursor, mission_cursor
+from app.storage import query_missions
 from app.schemas import MissionCreate, MissionUpdate, MissionOut
+from app.serialize import envelope, render_mission
 from app.routers.auth import _current_user as current_user_dep  # reuse auth dep for protected writes
 
 router = APIRouter()
 
 
-def _ensure_missions(db: Dict[str, Any]) -> None:
-    db.setdefault("missions", [])
-
-
-def _next_id(items: List[Dict[str, Any]]) -> int:
-    return (max((x.get("id", 0) for x in items), default=0) + 1)
+def _to_record(payload: MissionCreate) -> Dict[str, Any]:
+    m = payload.model_dump()
+    # Serialize datetimes to isoformat
+    m["start"] = payload.start.isoformat()
+    m["end"] = payload.end.isoformat()
+    return m
 
 
 def _to_out(m: Dict[str, Any]) -> MissionOut:
@@ -22,90 +28,120 @@ def _to_out(m: Dict[str, Any]) -> MissionOut:
 
 
 @router.get("/missions")
-def list_missions(
+async def list_missions(
     q: Optional[str] = None,
     status: Optional[str] = Query(None, pattern="^(draft|published)$"),
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None,
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    if_none_match: Optional[str] = Header(None),
 ):
-    db = load_db()
-    _ensure_missions(db)
-    items = db["missions"]
-
-    def match(m: Dict[str, Any]) -> bool:
-        ok = True
-        if q:
-            qq = q.lower()
-            txt = (m.get("title", "") + " " + (m.get("location") or "")).lower()
-            ok = ok and (qq in txt)
-        if status:
-            ok = ok and (m.get("status") == status)
-        if date_from:
-            try:
-                ok = ok and (datetime.fromisoformat(m["start"]) >= date_from)
-            except Exception:
-                ok = False
-        if date_to:
-            try:
-                ok = ok and (datetime.fromisoformat(m["end"]) <= date_to)
-            except Exception:
-                ok = False
-        return ok
-
-    filtered = [m for m in items if match(m)]
-    filtered.sort(key=lambda m: m.get("start"))  # ISO strings sort well but keep simple
-
-    total = len(filtered)
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    slice_items = filtered[start_idx:end_idx]
-
-    return {
-        "items": [_to_out(m).model_dump() for m in slice_items],
-        "page": page,
-        "per_page": per_page,
-        "total": total,
-    }
+    after = mission_cursor(cursor)
+    # The version is read before the query, so a write in between can only
+    # make the body newer than its tag, never older.
+    tag = etag("missions", await read(storage.change_version, "missions"))
+    if matches(if_none_match, tag):
+        return not_modified(tag)
+    # Equivalent queries share a page: q matches case-insensitively and the
+    # dates are compared as parsed values.
+    key = (
+        q.lower() if q else None,
+        status,
+        date_from.isoformat() if date_from else None,
+        date_to.isoformat() if date_to else None,
+        page,
+        per_page,
+        after,
+        with_total,
+    )
+    body = await read(_cached_page, key, q, status, date_from, date_to, page, per_page, after, with_total)
+    return Response(content=body, media_type="application/json", headers={"ETag": tag})
+
+
+def _cached_page(key: Tuple[Any, ...], *args: Any) -> bytes:
+    pages = storage.mission_pages()
+    body = pages.get(key)
+    if body is None:
+        body = _page(*args)
+        pages.put(key, body)
+    return body
+
+
+def _page(
+    q: Optional[str],
+    status: Optional[str],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    page: int,
+    per_page: int,
+    after: Optional[Tuple[int, float, int]],
+    with_total: bool,
+) -> bytes:
+    # With a cursor, page is ignored; one extra row tells whether a next page exists.
+    slice_items, total = query_missions(
+        q=q,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+        offset=0 if after is not None else (page - 1) * per_page,
+        limit=per_page + 1,
+        after=after,
+        count=with_total,
+    )
+    next_cursor = None
+    if len(slice_items) > per_page:
+        next_cursor = encode_cursor(mission_order_key(slice_items[per_page - 1]))
+
+    items = storage.fragments("missions", render_mission).encode(slice_items[:per_page])
+    return envelope(items, page=page, per_page=per_page, total=total, next_cursor=next_cursor)
 
 
 @router.post("/missions", response_model=MissionOut)
-def create_mission(payload: MissionCreate, user=Depends(current_user_dep)):
-    db = load_db()
-    _ensure_missions(db)
+async def create_mission(payload: MissionCreate, user=Depends(current_user_dep)):
+    return _to_out(await transact(_create_mission, payload))
+
+
+def _create_mission(db: Dict[str, Any], payload: MissionCreate) -> Dict[str, Any]:
     # Validate final times (MissionCreate already validates, but explicit check is fine)
     if payload.end <= payload.start:
         raise HTTPException(status_code=422, detail="end must be after start")
-    mid = _next_id(db["missions"])
-    m = payload.model_dump()
-    m["id"] = mid
-    # Serialize datetimes to isoformat
-    m["start"] = payload.start.isoformat()
-    m["end"] = payload.end.isoformat()
-    db["missions"].append(m)
-    save_db(db)
-    return _to_out(m)
+    m = _to_record(payload)
+    m["id"] = storage.next_mission_id()
+    db.put("missions", m)
+    return m
 
 
 @router.get("/missions/{mid}", response_model=MissionOut)
-def get_mission(mid: int):
-    db = load_db()
-    _ensure_missions(db)
-    m = next((x for x in db["missions"] if x.get("id") == mid), None)
+async def get_mission(mid: int, response: Response, if_none_match: Optional[str] = Header(None)):
+    version, m = await read(_versioned_mission, mid)
+    # A missing mission has no representation for If-None-Match (even "*") to match.
     if not m:
         raise HTTPException(status_code=404, detail="mission not found")
+    tag = etag("mission", mid, version)
+    if matches(if_none_match, tag):
+        return not_modified(tag)
+    response.headers["ETag"] = tag
     return _to_out(m)
 
 
+def _versioned_mission(mid: int) -> Tuple[int, Optional[Dict[str, Any]]]:
+    # The version is read first, so the record can only be newer than its tag.
+    return storage.change_version("missions", mid), storage.get_mission(mid)
+
+
 @router.put("/missions/{mid}", response_model=MissionOut)
-def update_mission(mid: int, payload: MissionUpdate, user=Depends(current_user_dep)):
-    db = load_db()
-    _ensure_missions(db)
-    idx = next((i for i, x in enumerate(db["missions"]) if x.get("id") == mid), None)
-    if idx is None:
+async def update_mission(mid: int, payload: MissionUpdate, user=Depends(current_user_dep)):
+    return _to_out(await transact(_update_mission, mid, payload))
+
+
+def _update_mission(db: Dict[str, Any], mid: int, payload: MissionUpdate) -> Dict[str, Any]:
+    old = storage.get_mission(mid)
+    if old is None:
         raise HTTPException(status_code=404, detail="mission not found")
-    cur = dict(db["missions"][idx])
+    cur = dict(old)
 
     # Apply updates
     data = payload.model_dump(exclude_unset=True)
@@ -123,19 +159,17 @@ def update_mission(mid: int, payload: MissionUpdate, user=Depends(current_user_d
     except ValueError:
         raise HTTPException(status_code=422, detail="invalid datetime format")
 
-    db["missions"][idx] = cur
-    save_db(db)
-    return _to_out(cur)
+    db.put("missions", cur)
+    return cur
 
 
 @router.delete("/missions/{mid}", status_code=204)
-def delete_mission(mid: int, user=Depends(current_user_dep)):
-    db = load_db()
-    _ensure_missions(db)
-    before = len(db["missions"])
-    db["missions"] = [x for x in db["missions"] if x.get("id") != mid]
-    if len(db["missions"]) == before:
+async def delete_mission(mid: int, user=Depends(current_user_dep)):
+    await transact(_delete_mission, mid)
+
+
+def _delete_mission(db: Dict[str, Any], mid: int) -> None:
+    if storage.get_mission(mid) is None:
         raise HTTPException(status_code=404, detail="mission not found")
-    save_db(db)
-    return
+    db.delete("missions", mid)
 
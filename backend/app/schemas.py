@@ -123,3 +123,7 @@ class AssignmentOut(BaseModel):
         if v not in allowed:
             raise ValueError("invalid status")
         return v
+
+
+class AssignmentBulkIn(BaseModel):
+    items: List[AssignmentIn] = Field(min_length=1, max_length=500)
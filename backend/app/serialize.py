@@ -0,0 +1,153 @@
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.journal import Op
+from app.schemas import AssignmentOut, MissionOut, UserOut
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder writes the same bytes, only slower
+    orjson = None
+
+# Read endpoints serialize stored records straight to JSON bytes instead of
+# building an output model per record. A renderer writes exactly what
+# JSONResponse(jsonable_encoder(Model(**rec).model_dump())) would, for records
+# in the shape the write paths store; anything else (legacy or hand-edited
+# data) goes through the model, so errors and coercions are unchanged.
+
+
+def dumps(value: Any) -> bytes:
+    """JSONResponse's encoding: compact, UTF-8, no NaN."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def envelope(items: List[bytes], **fields: Any) -> bytes:
+    """{"items": [...], **fields} from already encoded items."""
+    parts = [b'{"items":[', b",".join(items), b"]"]
+    for k, v in fields.items():
+        parts += [b",", dumps(k), b":", dumps(v)]
+    parts.append(b"}")
+    return b"".join(parts)
+
+
+def _model(model: Any, rec: Dict[str, Any]) -> bytes:
+    return dumps(jsonable_encoder(model(**rec).model_dump()))
+
+
+def _int(v: Any) -> bool:
+    return type(v) is int
+
+
+def _str(v: Any) -> bool:
+    return type(v) is str
+
+
+def _when(v: Any) -> Optional[datetime]:
+    # Only strings that parse back to themselves are emitted as stored.
+    if not _str(v):
+        return None
+    try:
+        d = datetime.fromisoformat(v)
+    except ValueError:
+        return None
+    return d if d.isoformat() == v else None
+
+
+def _position(p: Any) -> Optional[Dict[str, Any]]:
+    if type(p) is not dict or not _str(p.get("label")) or not _int(p.get("count")) or p["count"] < 1:
+        return None
+    skills = p.get("skills", {})
+    if type(skills) is not dict or not all(_str(k) and _str(v) for k, v in skills.items()):
+        return None
+    return {"label": p["label"], "count": p["count"], "skills": skills}
+
+
+def render_mission(m: Dict[str, Any]) -> bytes:
+    start, end = _when(m.get("start")), _when(m.get("end"))
+    location, status = m.get("location"), m.get("status", "draft")
+    positions = m.get("positions", [])
+    ok = (
+        start is not None and end is not None
+        and (start.tzinfo is None) == (end.tzinfo is None) and end > start
+        and _int(m.get("id")) and _str(m.get("title"))
+        and (location is None or _str(location)) and status in ("draft", "published")
+        and type(positions) is list
+    )
+    out = [_position(p) for p in positions] if ok else []
+    if not ok or None in out:
+        return _model(MissionOut, m)
+    return dumps({
+        "title": m["title"],
+        "start": m["start"],
+        "end": m["end"],
+        "location": location,
+        "status": status,
+        "id": m["id"],
+        "positions": out,
+    })
+
+
+_ASSIGNMENT_STATUSES = {"invited", "confirmed", "declined", "tentative"}
+
+
+def render_assignment(a: Dict[str, Any]) -> bytes:
+    fields = ("id", "mission_id", "user_id", "role_label", "status")
+    if not (
+        _int(a.get("id")) and _int(a.get("mission_id")) and _int(a.get("user_id"))
+        and _str(a.get("role_label")) and a.get("status") in _ASSIGNMENT_STATUSES
+    ):
+        return _model(AssignmentOut, a)
+    return dumps({k: a[k] for k in fields})
+
+
+def render_user(u: Dict[str, Any]) -> bytes:
+    out = {
+        "id": u["id"],
+        "username": u["username"],
+        "role": u.get("role", "intermittent"),
+        "is_active": u.get("is_active", True),
+    }
+    if not (_int(out["id"]) and _str(out["username"]) and _str(out["role"]) and type(out["is_active"]) is bool):
+        return _model(UserOut, out)
+    return dumps(out)
+
+
+class Fragments:
+    """Encoded records of one collection by key, as a storage view.
+
+    An entry keeps the record it was rendered from and is only reused for an
+    equal record, so a render racing a write can never serve stale bytes;
+    apply() just keeps the map from growing with replaced records.
+    """
+
+    def __init__(self, db: Dict[str, Any], name: str, render: Callable[[Dict[str, Any]], bytes]) -> None:
+        self.name = name
+        self.render = render
+        self.items: Dict[Any, Tuple[Dict[str, Any], bytes]] = {}
+
+    def encode(self, records: List[Dict[str, Any]]) -> List[bytes]:
+        out = []
+        for rec in records:
+            key = rec.get("id")
+            hit = self.items.get(key)
+            if hit is not None and (hit[0] is rec or hit[0] == rec):
+                out.append(hit[1])
+                continue
+            body = self.render(rec)
+            self.items[key] = (rec, body)
+            out.append(body)
+        return out
+
+    def apply(self, ops: List[Op], db: Dict[str, Any]) -> bool:
+        for kind, name, key, _ in ops:
+            if name != self.name:
+                continue
+            if kind in ("set", "drop"):
+                return False
+            self.items.pop(key, None)
+        return True
@@ -0,0 +1,114 @@
+import json, os, shutil, threading
+from typing import Any, Dict, List, Tuple
+
+from app.changes import CHANGES
+from app.journal import Op, file_signature, is_racy, stamp_mtime, write_atomic
+
+# One JSON file per top-level collection, so a write only rewrites the
+# collections it changed:
+#
+#   collections/users.json, tokens.json, missions.json, assignments.json
+#   collections/_changes.missions.json   change log entries of one collection
+#   collections/_changes.json            the log's own entries (_floor, _restored)
+#
+# Each file is replaced atomically. Change log files are written before the
+# collections they describe, so a crash in between can only leave the log
+# claiming a change that did not land, which an incremental backup tolerates.
+
+_MISSING = object()
+
+
+def _segment(eid: str) -> str:
+    name, colon, _ = eid.partition(":")
+    return CHANGES + "." + name if colon else CHANGES
+
+
+class SplitStore:
+    """A directory of per-collection JSON files; each file is its own version."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # Parsed files by name with the signature they were read at; reused
+        # until the file changes, so a reload only parses what another process wrote.
+        self.parsed: Dict[str, Tuple[Tuple[int, int, int], Any]] = {}
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name + ".json")
+
+    def _names(self) -> List[str]:
+        return sorted(f[:-5] for f in os.listdir(self.path) if f.endswith(".json"))
+
+    def signature(self) -> Tuple[int, ...]:
+        sig: Tuple[int, ...] = ()
+        for name in self._names():
+            sig += file_signature(self._file(name))
+        return sig
+
+    def _load(self, name: str) -> Any:
+        path = self._file(name)
+        sig = file_signature(path)
+        hit = self.parsed.get(name)
+        if hit is not None and hit[0] == sig and not is_racy(sig):
+            return hit[1]
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+        self.parsed[name] = (sig, value)
+        return value
+
+    def read(self) -> Dict[str, Any]:
+        db: Dict[str, Any] = {}
+        changes: List[Dict[str, Any]] = []
+        for name in self._names():
+            if name == CHANGES or name.startswith(CHANGES + "."):
+                changes += self._load(name)
+            else:
+                db[name] = self._load(name)
+        if changes:
+            db[CHANGES] = changes
+        return db
+
+    def write(self, db: Dict[str, Any], ops: List[Op]) -> None:
+        names = set()
+        segments = False
+        for kind, name, key, _ in ops:
+            if name != CHANGES:
+                names.add(name)
+            elif kind in ("put", "del"):
+                names.add(_segment(key))
+                segments = True
+            else:
+                names.update(n for n in self._names() if n == CHANGES or n.startswith(CHANGES + "."))
+                names.add(CHANGES)
+                segments = True
+        values: Dict[str, Any] = {}
+        if segments:
+            for e in db.get(CHANGES, []):
+                values.setdefault(_segment(e["id"]), []).append(e)
+        for name in sorted(names, key=lambda n: not n.startswith(CHANGES)):
+            value = values.get(name, []) if name == CHANGES or name.startswith(CHANGES + ".") else db.get(name, _MISSING)
+            path = self._file(name)
+            if value is _MISSING:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                self.parsed.pop(name, None)
+                continue
+            write_atomic(path, lambda f: json.dump(value, f, ensure_ascii=True, indent=2))
+            stamp_mtime(path)
+            self.parsed[name] = (file_signature(path), value)
+
+
+def init_split(path: str, db: Dict[str, Any]) -> None:
+    """Create the directory at path holding db, unless it already exists."""
+    if os.path.isdir(path):
+        return
+    # Built aside and renamed into place, so a process starting at the same
+    # time never sees a half-written directory or overwrites a finished one.
+    tmp = path + f".{os.getpid()}.{threading.get_ident()}.init"
+    os.makedirs(tmp)
+    SplitStore(tmp).write(db, [("set", name, None, value) for name, value in db.items()])
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp)
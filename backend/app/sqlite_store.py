@@ -0,0 +1,345 @@
+import json, os, sqlite3, threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.changes import CHANGES
+from app.journal import Op
+
+# Collections with their own table; other top-level keys are kept as JSON in meta.
+TABLES = ("users", "tokens", "missions", "assignments")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT,
+    username_lower TEXT,
+    deleted_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_username_lower ON users (username_lower);
+CREATE TABLE IF NOT EXISTS tokens (
+    token TEXT PRIMARY KEY,
+    user_id INTEGER,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tokens_user_id ON tokens (user_id);
+CREATE TABLE IF NOT EXISTS missions (
+    id INTEGER PRIMARY KEY,
+    status TEXT,
+    start TEXT,
+    "end" TEXT,
+    start_ts REAL,
+    start_aware INTEGER,
+    end_ts REAL,
+    end_aware INTEGER,
+    search TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS missions_start_ts ON missions (start_ts, id);
+CREATE INDEX IF NOT EXISTS missions_end_ts ON missions (end_ts);
+CREATE TABLE IF NOT EXISTS positions (
+    mission_id INTEGER NOT NULL,
+    label TEXT,
+    count INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS positions_mission ON positions (mission_id, label);
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    mission_id INTEGER,
+    user_id INTEGER,
+    role_label TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assignments_mission ON assignments (mission_id, role_label);
+CREATE TABLE IF NOT EXISTS changes (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=True, separators=(",", ":"))
+
+
+def parse_ts(value: Any) -> Tuple[Optional[float], Optional[int]]:
+    """(epoch seconds, aware flag) for an ISO datetime; naive values are read as UTC."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None, None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc).timestamp(), 0
+    return dt.timestamp(), 1
+
+
+class SqliteStore:
+    """Users, tokens, missions, positions and assignments in one SQLite file (WAL mode).
+
+    Each row keeps the full record as JSON in `data`; the other columns only
+    exist to be indexed and filtered on.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def signature(self) -> Tuple[int, ...]:
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return (int(row[0]) if row else 0,)
+
+    def read(self) -> Dict[str, Any]:
+        conn = self._conn()
+        db: Dict[str, Any] = {}
+        for name in TABLES:
+            db[name] = [json.loads(r[0]) for r in conn.execute(f"SELECT data FROM {name} ORDER BY rowid")]
+        for key, value in conn.execute("SELECT key, value FROM meta WHERE key LIKE 'extra:%'"):
+            db[key[len("extra:"):]] = json.loads(value)
+        # Like data.json before change tracking started, an empty log is left out.
+        changes = [json.loads(r[0]) for r in conn.execute("SELECT data FROM changes ORDER BY rowid")]
+        if changes:
+            db[CHANGES] = changes
+        return db
+
+    # --- writes -----------------------------------------------------------
+
+    def _put(self, conn: sqlite3.Connection, name: str, rec: Dict[str, Any]) -> None:
+        data = _dumps(rec)
+        if name == "users":
+            username = rec.get("username")
+            conn.execute(
+                "INSERT INTO users (id, username, username_lower, deleted_at, data) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET username = excluded.username, username_lower = excluded.username_lower, "
+                "deleted_at = excluded.deleted_at, data = excluded.data",
+                (rec.get("id"), username, username.lower() if isinstance(username, str) else None, rec.get("deleted_at"), data),
+            )
+        elif name == "tokens":
+            conn.execute(
+                "INSERT INTO tokens (token, user_id, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(token) DO UPDATE SET user_id = excluded.user_id, created_at = excluded.created_at, data = excluded.data",
+                (rec.get("token"), rec.get("user_id"), rec.get("created_at"), data),
+            )
+        elif name == "missions":
+            start_ts, start_aware = parse_ts(rec.get("start"))
+            end_ts, end_aware = parse_ts(rec.get("end"))
+            search = ((rec.get("title") or "") + " " + (rec.get("location") or "")).lower()
+            conn.execute(
+                'INSERT INTO missions (id, status, start, "end", start_ts, start_aware, end_ts, end_aware, search, data) '
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                'ON CONFLICT(id) DO UPDATE SET status = excluded.status, start = excluded.start, "end" = excluded."end", '
+                "start_ts = excluded.start_ts, start_aware = excluded.start_aware, end_ts = excluded.end_ts, "
+                "end_aware = excluded.end_aware, search = excluded.search, data = excluded.data",
+                (rec.get("id"), rec.get("status"), rec.get("start"), rec.get("end"), start_ts, start_aware, end_ts, end_aware, search, data),
+            )
+            conn.execute("DELETE FROM positions WHERE mission_id = ?", (rec.get("id"),))
+            conn.executemany(
+                "INSERT INTO positions (mission_id, label, count, data) VALUES (?, ?, ?, ?)",
+                [(rec.get("id"), p.get("label"), p.get("count"), _dumps(p)) for p in rec.get("positions") or [] if isinstance(p, dict)],
+            )
+        else:
+            conn.execute(
+                "INSERT INTO assignments (id, mission_id, user_id, role_label, status, data) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET mission_id = excluded.mission_id, user_id = excluded.user_id, "
+                "role_label = excluded.role_label, status = excluded.status, data = excluded.data",
+                (rec.get("id"), rec.get("mission_id"), rec.get("user_id"), rec.get("role_label"), rec.get("status"), data),
+            )
+
+    def _delete(self, conn: sqlite3.Connection, name: str, key: Any) -> None:
+        if name == "tokens":
+            conn.execute("DELETE FROM tokens WHERE token = ?", (key,))
+            return
+        conn.execute(f"DELETE FROM {name} WHERE id = ?", (key,))
+        if name == "missions":
+            conn.execute("DELETE FROM positions WHERE mission_id = ?", (key,))
+
+    def _clear(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(f"DELETE FROM {name}")
+        if name == "missions":
+            conn.execute("DELETE FROM positions")
+
+    def _log(self, conn: sqlite3.Connection, kind: str, key: Any, value: Any) -> None:
+        if kind in ("set", "drop"):
+            conn.execute("DELETE FROM changes")
+            conn.executemany("INSERT INTO changes (id, data) VALUES (?, ?)", [(e["id"], _dumps(e)) for e in value or []])
+        elif kind == "put":
+            conn.execute(
+                "INSERT INTO changes (id, data) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+                (key, _dumps(value)),
+            )
+        else:
+            conn.execute("DELETE FROM changes WHERE id = ?", (key,))
+
+    def write(self, db: Dict[str, Any], ops: Optional[List[Op]]) -> None:
+        """Apply ops in one transaction; ops=None replaces every table with db."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if ops is None:
+                conn.execute("DELETE FROM meta WHERE key LIKE 'extra:%'")
+                ops = [("set", name, None, db.get(name, [])) for name in TABLES]
+                ops += [("set", name, None, value) for name, value in db.items() if name not in TABLES and name != CHANGES]
+                ops.append(("set", CHANGES, None, db.get(CHANGES, [])))
+            for kind, name, key, value in ops:
+                if name == CHANGES:
+                    self._log(conn, kind, key, value)
+                    continue
+                if name not in TABLES:
+                    if kind == "drop":
+                        conn.execute("DELETE FROM meta WHERE key = ?", ("extra:" + name,))
+                    elif kind == "set":
+                        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ("extra:" + name, _dumps(value)))
+                    continue
+                if kind in ("set", "drop"):
+                    self._clear(conn, name)
+                    for rec in value or []:
+                        self._put(conn, name, rec)
+                elif kind == "put":
+                    self._put(conn, name, value)
+                else:
+                    self._delete(conn, name, key)
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('version', '1') "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- queries ----------------------------------------------------------
+
+    def _one(self, sql: str, args: Tuple[Any, ...]) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(sql, args).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user(self, uid: int) -> Optional[Dict[str, Any]]:
+        return self._one("SELECT data FROM users WHERE id = ?", (uid,))
+
+    def find_user(self, username: str) -> Optional[Dict[str, Any]]:
+        return self._one("SELECT data FROM users WHERE username = ? AND deleted_at IS NULL ORDER BY id LIMIT 1", (username,))
+
+    def username_taken(self, username: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM users WHERE username = ? LIMIT 1", (username,)).fetchone() is not None
+
+    def next_user_id(self) -> int:
+        return (self._conn().execute("SELECT MAX(id) FROM users").fetchone()[0] or 0) + 1
+
+    def next_assignment_id(self) -> int:
+        return (self._conn().execute("SELECT MAX(id) FROM assignments").fetchone()[0] or 0) + 1
+
+    def next_mission_id(self) -> int:
+        return (self._conn().execute("SELECT MAX(id) FROM missions").fetchone()[0] or 0) + 1
+
+    def get_token(self, token: str) -> Optional[Dict[str, Any]]:
+        return self._one("SELECT data FROM tokens WHERE token = ?", (token,))
+
+    def user_tokens(self, uid: int) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM tokens WHERE user_id = ? ORDER BY rowid", (uid,))
+        return [json.loads(r[0]) for r in rows]
+
+    def get_mission(self, mid: int) -> Optional[Dict[str, Any]]:
+        return self._one("SELECT data FROM missions WHERE id = ?", (mid,))
+
+    def _page(
+        self,
+        table: str,
+        where: List[str],
+        args: List[Any],
+        order: str,
+        offset: int,
+        limit: int,
+        seek: Optional[Tuple[str, List[Any]]] = None,
+        count: bool = True,
+    ):
+        """One page of rows; seek is a keyset condition that applies to the page but not to the total."""
+        clause = (" WHERE " + " AND ".join(where)) if where else ""
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM {table}{clause}", args).fetchone()[0] if count else None
+        if seek is not None:
+            where, args = where + [seek[0]], args + seek[1]
+            clause = " WHERE " + " AND ".join(where)
+        rows = conn.execute(
+            f"SELECT data FROM {table}{clause} ORDER BY {order} LIMIT ? OFFSET ?", args + [limit, offset]
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows], total
+
+    def query_missions(
+        self,
+        q: Optional[str],
+        status: Optional[str],
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+        offset: int,
+        limit: int,
+        after: Optional[Tuple[int, float, Any]] = None,
+        count: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        where: List[str] = []
+        args: List[Any] = []
+        if q:
+            where.append("instr(search, ?) > 0")
+            args.append(q.lower())
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        if date_from:
+            # Aware and naive datetimes do not compare, so only same-kind rows can match.
+            ts, aware = parse_ts(date_from.isoformat())
+            where.append("start_aware = ? AND start_ts >= ?")
+            args += [aware, ts]
+        if date_to:
+            ts, aware = parse_ts(date_to.isoformat())
+            where.append("end_aware = ? AND end_ts <= ?")
+            args += [aware, ts]
+        seek: Optional[Tuple[str, List[Any]]] = None
+        if after is not None:
+            # after is (0, 0.0, id) for missions without a parsable start,
+            # which sort first as NULL start_ts, else (1, start_ts, id).
+            group, ts, mid = after
+            if group == 0:
+                seek = ("(start_ts IS NOT NULL OR id > ?)", [mid])
+            else:
+                seek = ("(start_ts > ? OR (start_ts = ? AND id > ?))", [ts, ts, mid])
+        return self._page("missions", where, args, "start_ts, id", offset, limit, seek, count)
+
+    def query_users(
+        self, q: Optional[str], offset: int, limit: int, after: Optional[int] = None, count: bool = True
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        where = ["deleted_at IS NULL"]
+        args: List[Any] = []
+        if q:
+            # A range on username_lower so the prefix search can use its index.
+            where.append("username_lower >= ? AND username_lower < ?")
+            args += [q.lower(), q.lower() + "\U0010ffff"]
+        seek = ("id > ?", [after]) if after is not None else None
+        return self._page("users", where, args, "id", offset, limit, seek, count)
+
+    def mission_assignments(self, mid: int) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT data FROM assignments WHERE mission_id = ? ORDER BY id", (mid,))
+        return [json.loads(r[0]) for r in rows]
+
+    def count_assignments(self, mid: int, role_label: str) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM assignments WHERE mission_id = ? AND role_label = ?", (mid, role_label)
+        ).fetchone()[0]
+
+
+def migrate(db: Dict[str, Any], path: str) -> Dict[str, int]:
+    """Copy a data.json-shaped database into a fresh SQLite file; returns row counts."""
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    store = SqliteStore(path)
+    store.write(db, None)
+    return {name: len(db.get(name, [])) for name in TABLES}
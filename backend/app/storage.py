@@ -1,7 +1,23 @@
-import json, os, threading
-from typing import Any, Dict
+import json, logging, os, random, threading, time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from app import config
+from app.changes import CHANGES, ChangeLog
+from app.indexes import AssignmentIndex, KeyIndex, MissionTimeIndex, MissionTextIndex, TokenIndex, UsernameIndex
+from app.journal import KEYS, Journal, Op, apply_ops, diff_db, file_signature, is_racy, stamp_mtime, write_atomic
+from app.locks import FileLock
+from app.page_cache import PageCache
+from app.serialize import Fragments
+from app.split_store import SplitStore, init_split
+from app.sqlite_store import SqliteStore
 
-_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+# _lock guards the in-process cache; write_lock() serializes writers across
+# processes and is always taken before _lock, never while holding it.
+_lock = threading.RLock()
+_write_locks: Dict[str, FileLock] = {}
 
 def _data_dir() -> str:
     d = os.environ.get("DATA_DIR", "/data")
@@ -11,20 +27,901 @@ def _data_dir() -> str:
 def _db_path() -> str:
     return os.path.join(_data_dir(), "data.json")
 
+def _sqlite_path() -> str:
+    return os.path.join(_data_dir(), "data.sqlite3")
+
+def _split_path() -> str:
+    return os.path.join(_data_dir(), "collections")
+
+def _store_path() -> str:
+    if config.STORAGE_BACKEND == "sqlite":
+        return _sqlite_path()
+    if config.STORAGE_BACKEND == "split":
+        return _split_path()
+    return _db_path()
+
+def _empty() -> Dict[str, Any]:
+    return {"users": [], "tokens": [], "missions": [], "assignments": []}
+
 def _init_if_missing(path: str) -> None:
-    if not os.path.exists(path):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"users": [], "tokens": [], "missions": [], "assignments": []}, f)
+    if os.path.exists(path):
+        return
+    # Linked into place so that a process starting at the same time never
+    # overwrites a store another one already wrote to.
+    tmp = path + f".{os.getpid()}.{threading.get_ident()}.init"
+    write_atomic(tmp, lambda f: json.dump(_empty(), f))
+    try:
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
 
-def load_db() -> Dict[str, Any]:
-    path = _db_path()
-    _init_if_missing(path)
+def write_lock() -> FileLock:
+    """The cross-process write lock of the current store; hold it around read-modify-write."""
+    path = os.path.join(_data_dir(), "data.lock")
     with _lock:
-        with open(path, "r", encoding="utf-8") as f:
+        lock = _write_locks.get(path)
+        if lock is None:
+            lock = _write_locks[path] = FileLock(path)
+        return lock
+
+def _copy_value(v: Any) -> Any:
+    # Records are copied one level deep; nested values (positions, prefs) are
+    # shared, so callers must replace them rather than mutate them in place.
+    return [dict(r) if isinstance(r, dict) else r for r in v] if isinstance(v, list) else v
+
+def _copy(db: Dict[str, Any], names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    # The change log is bookkeeping for save_db and is left out.
+    if names is None:
+        return {k: _copy_value(v) for k, v in db.items() if k != CHANGES}
+    return {k: _copy_value(db[k]) for k in names if k in db and k != CHANGES}
+
+
+class _Partial(dict):
+    """A load_db(collections) result; save_db keeps the collections it lacks."""
+
+
+class _JsonFile:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def signature(self) -> Tuple[int, ...]:
+        return file_signature(self.path)
+
+    def read(self) -> Dict[str, Any]:
+        with open(self.path, "r", encoding="utf-8") as f:
             return json.load(f)
 
-def save_db(db: Dict[str, Any]) -> None:
-    path = _db_path()
+    def write(self, db: Dict[str, Any], ops: Any) -> None:
+        write_atomic(self.path, lambda f: json.dump(db, f, ensure_ascii=True, indent=2))
+        stamp_mtime(self.path)
+
+
+class _Cache:
+    """Last parsed database for one (backend, path), revalidated by backend signature."""
+
+    def __init__(self, backend: Any) -> None:
+        self.backend = backend
+        self.db: Optional[Dict[str, Any]] = None
+        self.sig: Optional[Tuple[int, ...]] = None
+        self.racy = False
+        self.version = 0
+        # Version at which each top-level collection last changed, what
+        # transactions that read a whole collection check against.
+        self.stamps: Dict[str, int] = {}
+        # Version at which each record (name, key) and each group of records
+        # (name, field, value) last changed, for transactions that only read
+        # those; see _stamp. A collection replaced as a whole, or reloaded
+        # after another process wrote it, has no per-record stamps, so
+        # `replaced` makes every read of it conflict.
+        self.key_stamps: Dict[Tuple[Any, ...], int] = {}
+        self.replaced: Dict[str, int] = {}
+        self.key_floor = 0
+        # Highest id of each id range reserved by a transaction still in flight.
+        self.reserved: Dict[str, List[int]] = {}
+        # Derived indexes over db, kept current by save_db (see app.indexes).
+        self.views: Dict[str, Any] = {}
+
+    def view(self, name: str, factory: Callable[[Dict[str, Any]], Any]) -> Any:
+        v = self.views.get(name)
+        if v is None:
+            v = self.views[name] = factory(self.db)
+        return v
+
+
+_caches: Dict[Tuple[str, str], _Cache] = {}
+_stats = {"hits": 0, "misses": 0}
+
+
+def _entry() -> _Cache:
+    """Return the cache entry for the current DATA_DIR and backend; call with _lock held."""
+    path = _store_path()
+    if config.STORAGE_BACKEND == "split":
+        if not os.path.isdir(path):
+            # First start on split files: carry over the data of the json or journal backend.
+            old = _db_path()
+            init_split(path, Journal(old).read() if os.path.exists(old) else _empty())
+    elif config.STORAGE_BACKEND != "sqlite":
+        _init_if_missing(path)
+    key = (config.STORAGE_BACKEND, path)
+    c = _caches.get(key)
+    if c is None:
+        if config.STORAGE_BACKEND == "sqlite":
+            backend: Any = SqliteStore(path)
+        elif config.STORAGE_BACKEND == "split":
+            backend = SplitStore(path)
+        elif config.STORAGE_BACKEND == "journal":
+            backend = Journal(path)
+        else:
+            backend = _JsonFile(path)
+        c = _caches[key] = _Cache(backend)
+    return c
+
+def _cache() -> _Cache:
+    """Return the cache entry, reloading it if the backend changed; call with _lock held."""
+    c = _entry()
+    sig = c.backend.signature()
+    if c.db is not None and sig == c.sig and not c.racy:
+        _stats["hits"] += 1
+        return c
+    _stats["misses"] += 1
+    # Signature is taken before reading so a write racing the read forces another reload.
+    old, c.db = c.db, c.backend.read()
+    c.sig = sig
+    c.racy = is_racy(sig)
+    c.version += 1
+    if old is not None:
+        # Another process wrote: find out what it changed.
+        for name in set(old) | set(c.db):
+            if old.get(name) is not c.db.get(name) and old.get(name) != c.db.get(name):
+                c.stamps[name] = c.replaced[name] = c.version
+    c.views.clear()
+    return c
+
+def load_db(collections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Return a private copy of the database that the caller may mutate and pass to save_db.
+
+    With collections, only those are copied, and save_db leaves the others as they are.
+    """
+    with _lock:
+        db = _cache().db
+        return _copy(db) if collections is None else _Partial(_copy(db, collections))
+
+def read_db() -> Dict[str, Any]:
+    """Return the shared cached database without copying. Callers must not mutate it.
+
+    Unlike load_db it includes the "_changes" log; save_db keeps the log of
+    the current database whether or not db carries it.
+    """
     with _lock:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(db, f, ensure_ascii=True, indent=2)
+        return _cache().db
+
+def save_db(db: Dict[str, Any], restored: Optional[int] = None) -> None:
+    """Persist db. save_db takes ownership of db; do not mutate it afterwards.
+
+    restored records the backup sequence number db was restored from. To
+    avoid losing another writer's update, load db under write_lock() too,
+    or use transaction().
+    """
+    _submit(_Write(db=db, restored=restored))
+
+def _stage(c: _Cache, db: Dict[str, Any], ops: List[Op], restored: Optional[int] = None) -> List[Op]:
+    """Make db the cached database; returns ops plus the change log's own.
+
+    Call with write_lock() and _lock held, and follow with _persist. ops
+    turn c.db into db.
+    """
+    version = c.version + 1
+    _stamp(c, ops, version)
+    ops = ops + c.view("changes", ChangeLog).record(ops, db, restored)
+    c.db = db
+    for name, v in list(c.views.items()):
+        if not v.apply(ops, db):
+            del c.views[name]
+    # With the write lock held, the files only change through _persist.
+    c.racy = False
+    c.version = version
+    for _, name, _, _ in ops:
+        c.stamps[name] = version
+    return ops
+
+# Groups of records transactions read through the query functions:
+# assignments of a mission, tokens of a user, users with a username.
+_GROUPS = {"assignments": "mission_id", "tokens": "user_id", "users": "username"}
+_KEY_STAMPS_MAX = 100_000
+
+def _stamp(c: _Cache, ops: List[Op], version: int) -> None:
+    """Record the records and groups ops change; call from _stage before c.db changes."""
+    seen: Dict[Tuple[str, Any], Any] = {}
+    for kind, name, key, value in ops:
+        if name == CHANGES:
+            continue
+        if kind not in ("put", "del"):
+            c.replaced[name] = version
+            continue
+        c.key_stamps[(name, key)] = version
+        field = _GROUPS.get(name)
+        if field is None:
+            continue
+        # A record that moves between groups changes both.
+        old = seen[(name, key)] if (name, key) in seen else _by_key(c, name).get(key)
+        seen[(name, key)] = value
+        for rec in (old, value):
+            if isinstance(rec, dict):
+                c.key_stamps[(name, field, rec.get(field))] = version
+    if len(c.key_stamps) > _KEY_STAMPS_MAX:
+        # Forget them all; transactions from before now conflict on any record read.
+        c.key_stamps.clear()
+        c.key_floor = version
+
+def _stage_ops(c: _Cache, ops: List[Op]) -> List[Op]:
+    if not ops:
+        return []
+    db = dict(c.db)
+    _apply_indexed(c, db, ops)
+    return _stage(c, db, ops)
+
+def _apply_indexed(c: _Cache, db: Dict[str, Any], ops: List[Op]) -> None:
+    """apply_ops for the cached database; call with _lock held.
+
+    Puts and deletes find their record through the collection's key index
+    and patch a copy of the list, so a commit costs a list copy and one
+    C-level search per changed record rather than re-keying the collection.
+    """
+    by_name: Dict[str, List[Op]] = {}
+    for op in ops:
+        by_name.setdefault(op[1], []).append(op)
+    rest: List[Op] = []
+    for name, group in by_name.items():
+        items = db.get(name, [])
+        if not isinstance(items, list) or any(kind not in ("put", "del") for kind, _, _, _ in group):
+            rest += group
+            continue
+        index = _by_key(c, name).records
+        if len(index) != len(items):
+            # Duplicate or missing keys: leave them to apply_ops.
+            rest += group
+            continue
+        items = list(items)
+        current: Dict[Any, Any] = {}
+        for kind, _, key, value in group:
+            old = current[key] if key in current else index.get(key)
+            if kind == "put" and old is None:
+                items.append(value)
+            elif kind == "put":
+                items[items.index(old)] = value
+            elif old is not None:
+                del items[items.index(old)]
+            current[key] = value
+        db[name] = items
+    apply_ops(db, rest)
+
+def _persist(c: _Cache, ops: List[Op]) -> None:
+    try:
+        c.backend.write(c.db, ops)
+    except BaseException:
+        # The cache is ahead of the files now; reload it from them.
+        c.db = None
+        c.sig = None
+        c.views.clear()
+        raise
+    # Our own writes stamp a precise mtime, so they are never racy.
+    c.sig = c.backend.signature()
+
+# --- transactions -------------------------------------------------------------
+# transaction(fn) runs fn on a private copy without holding any lock, then
+# commits only if nothing fn read or wrote changed in the meantime, and
+# otherwise runs it again on fresh data. Going through the copy itself reads
+# the whole collection; the query functions below read one record or group
+# of records, answered from the current data, so they may see a newer
+# version than the copy. After TXN_RETRIES conflicts fn runs once more with
+# the write lock held, where nothing can change under it.
+# Handlers look records up with those functions and write with db.put and
+# db.delete, so a commit costs the records it changes; touching db[name]
+# itself copies the collection and diffs it at commit.
+
+_txn = threading.local()
+_txn_stats = {"commits": 0, "conflicts": 0, "locked": 0, "reruns": 0, "flushes": 0, "flushed": 0}
+
+
+class _TxnDb(dict):
+    """A transaction's view of the database; records what fn reads and writes.
+
+    Collections start out shared with the snapshot and are copied the first
+    time fn touches them, so a transaction only pays for what it uses.
+    """
+
+    def __init__(self, base: Dict[str, Any], used: Set[Tuple[Any, ...]]) -> None:
+        super().__init__((k, v) for k, v in base.items() if k != CHANGES)
+        self.used = used
+        self.copied: Set[str] = set()
+        # put()/delete() ops on collections fn has not copied.
+        self.pending: List[Op] = []
+
+    def _use(self, name: Any) -> None:
+        self.used.add((name,))
+        if name not in self.copied:
+            self.copied.add(name)
+            if dict.__contains__(self, name):
+                dict.__setitem__(self, name, _copy_value(dict.__getitem__(self, name)))
+            mine = [op for op in self.pending if op[1] == name]
+            if mine:
+                self.pending = [op for op in self.pending if op[1] != name]
+                self._apply(mine)
+
+    def _apply(self, ops: List[Op]) -> None:
+        name = ops[0][1]
+        tmp = {name: dict.__getitem__(self, name)} if dict.__contains__(self, name) else {}
+        apply_ops(tmp, ops)
+        dict.__setitem__(self, name, tmp[name])
+
+    # Record-level access. A transaction that only uses these and the query
+    # functions below never copies or diffs a collection, so its cost does
+    # not grow with the collection.
+
+    def records(self, name: str) -> List[Any]:
+        """The collection as of the snapshot, not copied; do not mutate it or its records."""
+        if any(op[1] == name for op in self.pending):
+            self._use(name)
+        self.used.add((name,))
+        items = dict.get(self, name)
+        return items if isinstance(items, list) else []
+
+    def put(self, name: str, record: Dict[str, Any]) -> None:
+        """Insert or replace one record by primary key; record must be a new dict."""
+        self._write(("put", name, record.get(KEYS.get(name, "id")), record))
+
+    def delete(self, name: str, key: Any) -> None:
+        """Remove one record by primary key, if it exists."""
+        self._write(("del", name, key, None))
+
+    def _write(self, op: Op) -> None:
+        # Another transaction writing the same record conflicts with this one.
+        self.used.add((op[1], op[2]))
+        if op[1] in self.copied:
+            self._apply([op])
+        else:
+            self.pending.append(op)
+
+    def __getitem__(self, name: str) -> Any:
+        self._use(name)
+        return super().__getitem__(name)
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self.used.add((name,))
+        self.copied.add(name)
+        self.pending = [op for op in self.pending if op[1] != name]
+        super().__setitem__(name, value)
+
+    def __delitem__(self, name: str) -> None:
+        self._use(name)
+        super().__delitem__(name)
+
+    def __contains__(self, name: object) -> bool:
+        self._use(name)
+        return super().__contains__(name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        self._use(name)
+        return super().get(name, default)
+
+    def setdefault(self, name: str, default: Any = None) -> Any:
+        self._use(name)
+        return super().setdefault(name, default)
+
+    def pop(self, name: str, *default: Any) -> Any:
+        self._use(name)
+        return super().pop(name, *default)
+
+    def _use_all(self) -> None:
+        for name in list(dict.keys(self)):
+            self._use(name)
+
+    def __iter__(self):
+        self._use_all()
+        return super().__iter__()
+
+    def items(self):  # type: ignore[override]
+        self._use_all()
+        return super().items()
+
+    def values(self):  # type: ignore[override]
+        self._use_all()
+        return super().values()
+
+
+def _reading(name: str, *key: Any) -> None:
+    """Note a read of collection name, or of one record (key) or group (field, value) of it."""
+    used = getattr(_txn, "used", None)
+    if used is not None:
+        used.add((name,) + key)
+
+def _reserve(name: str, top: Callable[[], int], count: int) -> int:
+    """First of count new ids above top(), the highest id stored.
+
+    In a transaction the ids are also above those reserved by transactions
+    still in flight, so concurrent inserts do not collide on their ids.
+    top() runs under _lock, where reservations are only released once the
+    ids they held are stored.
+    """
+    reserved = getattr(_txn, "reserved", None)
+    with _lock:
+        if reserved is None:
+            return top() + 1
+        c = _entry()
+        held = c.reserved.setdefault(name, [])
+        first = max([top()] + held) + 1
+        held.append(first + count - 1)
+    reserved.append((c, name, first + count - 1))
+    return first
+
+def _release(reserved: List[Tuple[_Cache, str, int]]) -> None:
+    with _lock:
+        for c, name, last in reserved:
+            c.reserved[name].remove(last)
+    del reserved[:]
+
+def _execute(
+    base: Dict[str, Any], fn: Callable[..., Any], args: Tuple[Any, ...], kwargs: Dict[str, Any]
+) -> Tuple[Any, List[Op], Set[Tuple[Any, ...]], List[Tuple[_Cache, str, int]]]:
+    """Run fn on a view of base; returns (fn's result, its changes, what it read, the ids it reserved).
+
+    The ids stay reserved until passed to _release, once the changes are staged.
+    """
+    used: Set[Tuple[Any, ...]] = set()
+    reserved: List[Tuple[_Cache, str, int]] = []
+    db = _TxnDb(base, used)
+    _txn.used, _txn.reserved = used, reserved
+    try:
+        result = fn(db, *args, **kwargs)
+    except BaseException:
+        _release(reserved)
+        raise
+    finally:
+        _txn.used = _txn.reserved = None
+    ops = diff_db(
+        {n: base[n] for n in db.copied if n in base},
+        {n: dict.__getitem__(db, n) for n in db.copied if dict.__contains__(db, n)},
+    )
+    return result, ops + db.pending, set(used), reserved
+
+def transaction(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run fn(db, *args, **kwargs) and commit its changes to db; returns fn's result.
+
+    fn may run several times, so it must not have side effects other than
+    changing db. An exception from fn aborts without writing.
+    """
+    delay = config.TXN_BACKOFF_MS / 1000
+    for attempt in range(config.TXN_RETRIES + 1):
+        if attempt:
+            # Jittered so that transactions that collided do not collide again.
+            time.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, config.TXN_BACKOFF_MAX_MS / 1000)
+        with _lock:
+            c = _cache()
+            base, version = c.db, c.version
+        result, ops, reads, reserved = _execute(base, fn, args, kwargs)
+        w = _Write(ops=ops, reads=reads, version=version, cache=c, txn=(fn, args, kwargs), result=result, reserved=reserved)
+        _submit(w)
+        with _lock:
+            _txn_stats["commits" if w.ok else "conflicts"] += 1
+        if w.ok:
+            return w.result
+    w = _Write(ops=[], txn=(fn, args, kwargs), locked=True)
+    _submit(w)
+    with _lock:
+        _txn_stats["commits"] += 1
+        _txn_stats["locked"] += 1
+    return w.result
+
+def transaction_nowait(done: Callable[[Any, Optional[BaseException]], None], fn: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+    """Like transaction, but returns once fn has run and its changes are queued for the flusher.
+
+    done(result, error) is then called from the flusher thread once the
+    changes are stored, or the write failed; it must not block. An exception
+    from fn is raised here. Without group commit there is nothing to wait
+    for, and done is called before this returns.
+    """
+    if config.GROUP_COMMIT_MS <= 0 or write_lock().held():
+        done(transaction(fn, *args, **kwargs), None)
+        return
+    with _lock:
+        c = _cache()
+        base, version = c.db, c.version
+    result, ops, reads, reserved = _execute(base, fn, args, kwargs)
+
+    def finished(w: _Write) -> None:
+        if w.error is None and not w.ok:
+            # The store changed under it (another DATA_DIR); run fn again there.
+            _enqueue(_Write(ops=[], txn=w.txn, locked=True, on_done=finished))
+            return
+        with _lock:
+            _txn_stats["commits" if w.ok else "conflicts"] += 1
+        done(w.result, w.error)
+
+    _enqueue(_Write(ops=ops, reads=reads, version=version, cache=c, txn=(fn, args, kwargs), result=result, reserved=reserved, on_done=finished))
+
+def _conflicts(c: _Cache, w: "_Write") -> bool:
+    """Whether anything w's transaction read or wrote changed after its snapshot."""
+    for read in w.reads:
+        name = read[0]
+        if len(read) == 1:
+            if c.stamps.get(name, 0) > w.version:
+                return True
+        elif c.replaced.get(name, 0) > w.version or c.key_floor > w.version or c.key_stamps.get(read, 0) > w.version:
+            return True
+    return False
+
+def txn_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_txn_stats)
+
+
+# --- group commit -------------------------------------------------------------
+# save_db and transaction commits go through _submit. With GROUP_COMMIT_MS
+# set, a single flusher thread collects the writes submitted within that
+# window, applies them in submission order and persists them in one backend
+# write; each caller returns once the write holding its changes is durable.
+# A transaction that conflicts with a write before it in the batch is run
+# again by the flusher on the data as staged so far, rather than sent back
+# to retry. A caller already holding write_lock() commits directly, since
+# the flusher could not take the lock until that caller returns. A locked
+# write (a transaction out of retries) is always run under the lock. A write
+# with on_done is not waited for; the flusher calls on_done(write) instead.
+
+class _Write:
+    """One save_db (db set) or transaction commit (ops set) waiting to be written."""
+
+    def __init__(
+        self,
+        db: Optional[Dict[str, Any]] = None,
+        restored: Optional[int] = None,
+        ops: Optional[List[Op]] = None,
+        reads: Iterable[Tuple[Any, ...]] = (),
+        version: int = 0,
+        cache: Optional[_Cache] = None,
+        txn: Optional[Tuple[Callable[..., Any], Tuple[Any, ...], Dict[str, Any]]] = None,
+        result: Any = None,
+        reserved: Optional[List[Tuple[_Cache, str, int]]] = None,
+        locked: bool = False,
+        on_done: Optional[Callable[["_Write"], None]] = None,
+    ) -> None:
+        self.db = db
+        self.restored = restored
+        self.ops = ops
+        self.reads = reads
+        self.version = version
+        self.cache = cache
+        self.txn = txn
+        self.result = result
+        self.reserved = reserved if reserved is not None else []
+        self.locked = locked
+        self.on_done = on_done
+        self.ok = False
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+_queue: List[_Write] = []
+_queue_cond = threading.Condition()
+_flusher: Optional[threading.Thread] = None
+
+
+def _submit(w: _Write) -> None:
+    if getattr(_txn, "flushing", False):
+        _release(w.reserved)
+        raise RuntimeError("a transaction run by the flusher cannot write on its own")
+    if config.GROUP_COMMIT_MS <= 0 or write_lock().held():
+        _flush([w], rerun=w.locked)
+    else:
+        _enqueue(w)
+        w.done.wait()
+    if w.error is not None:
+        raise w.error
+
+def _enqueue(w: _Write) -> None:
+    global _flusher
+    with _queue_cond:
+        _queue.append(w)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name="storage-flush", daemon=True)
+            _flusher.start()
+        _queue_cond.notify()
+
+def _flush_forever() -> None:
+    while True:
+        with _queue_cond:
+            while not _queue:
+                _queue_cond.wait()
+        # Let the writes arriving within the window join this batch.
+        time.sleep(config.GROUP_COMMIT_MS / 1000)
+        with _queue_cond:
+            batch = _queue[:]
+            del _queue[:]
+        _flush(batch, rerun=True)
+
+def _flush(batch: List[_Write], rerun: bool = False) -> None:
+    pending: List[_Write] = []
+    try:
+        with write_lock(), _lock:
+            c = _cache()
+            ops: List[Op] = []
+            dirty = False
+            for w in batch:
+                if w.ops is None:
+                    db = {**c.db, **w.db} if isinstance(w.db, _Partial) else w.db
+                    db[CHANGES] = c.db.get(CHANGES, [])
+                    ops += _stage(c, db, diff_db(c.db, db), w.restored)
+                    dirty = True
+                elif not w.locked and w.cache is c and not _conflicts(c, w):
+                    # Nothing it used changed since its snapshot.
+                    ops += _stage_ops(c, w.ops)
+                    dirty = dirty or bool(w.ops)
+                elif rerun and (w.locked or w.cache is c) and w.txn is not None:
+                    if ops and isinstance(c.backend, SqliteStore):
+                        # SQLite answers queries from its tables, which must
+                        # hold what fn is about to read.
+                        _persist(c, ops)
+                        ops, pending, dirty = [], [], False
+                    _release(w.reserved)
+                    _txn.flushing = True
+                    try:
+                        w.result, step, _, w.reserved = _execute(c.db, *w.txn)
+                    except Exception as e:
+                        w.error = e
+                        continue
+                    finally:
+                        _txn.flushing = False
+                    ops += _stage_ops(c, step)
+                    dirty = dirty or bool(step)
+                    _txn_stats["reruns"] += 1
+                else:
+                    continue
+                w.ok = True
+                pending.append(w)
+            if dirty:
+                _persist(c, ops)
+            _txn_stats["flushes"] += 1
+            _txn_stats["flushed"] += len(batch)
+    except BaseException as e:
+        # Writes already persisted on their own keep their result.
+        for w in batch:
+            if w in pending or (not w.ok and w.error is None):
+                w.ok = False
+                w.error = e
+    finally:
+        for w in batch:
+            # Staged or not, the ids are no longer needed: staged ones are in the data now.
+            _release(w.reserved)
+            w.done.set()
+            if w.on_done is not None:
+                try:
+                    w.on_done(w)
+                except Exception:
+                    log.exception("storage write callback failed")
+
+def change_seq() -> Tuple[int, Optional[int]]:
+    """(last change sequence number, backup sequence last restored into this store)."""
+    with _lock:
+        changes = _cache().view("changes", ChangeLog)
+        return changes.seq, changes.restored
+
+def change_version(name: str, key: Any = None) -> int:
+    """Change sequence of one record, or of a whole tracked collection (see ChangeLog.version)."""
+    with _lock:
+        return _cache().view("changes", ChangeLog).version(name, key)
+
+def backup_snapshot(since: Optional[int] = None) -> Tuple[Dict[str, Any], int, Optional[Dict[str, Any]]]:
+    """(snapshot, its sequence number, keys per tracked collection changed after since).
+
+    The snapshot is shared like read_db's. Raises ChangesTooOld when changes
+    that far back are no longer tracked.
+    """
+    with _lock:
+        c = _cache()
+        changes = c.view("changes", ChangeLog)
+        return c.db, changes.seq, None if since is None else changes.since(since)
+
+def compact_db() -> None:
+    """Fold the journal into data.json; a no-op for the plain JSON backend."""
+    with write_lock(), _lock:
+        c = _cache()
+        if isinstance(c.backend, Journal):
+            c.backend.compact()
+            c.sig = c.backend.signature()
+
+def mission_pages() -> PageCache:
+    """The GET /missions page cache of the current store."""
+    with _lock:
+        return _cache().view("mission_pages", PageCache)
+
+def fragments(name: str, render: Callable[[Dict[str, Any]], bytes]) -> Fragments:
+    """Encoded records of one collection for the read endpoints (see app.serialize)."""
+    with _lock:
+        return _cache().view("fragments:" + name, lambda db: Fragments(db, name, render))
+
+def cache_stats() -> Dict[str, Any]:
+    with _lock:
+        c = _caches.get((config.STORAGE_BACKEND, _store_path()))
+        return {
+            "backend": config.STORAGE_BACKEND,
+            "version": c.version if c else 0,
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+        }
+
+
+# --- queries ----------------------------------------------------------------
+# Read paths go through these so the SQLite backend can answer them with
+# indexed queries. Results are read-only: with the file backends they are the
+# cached records themselves.
+
+def _source(name: Optional[str] = None, *key: Any) -> Union[SqliteStore, _Cache]:
+    if name is not None:
+        _reading(name, *key)
+    with _lock:
+        c = _entry()
+        if isinstance(c.backend, SqliteStore):
+            return c.backend
+        return _cache()
+
+def _view(c: _Cache, name: str, factory: Callable[[Dict[str, Any]], Any]) -> Any:
+    with _lock:
+        return c.view(name, factory)
+
+def _by_key(c: _Cache, name: str) -> KeyIndex:
+    return _view(c, name, lambda db: KeyIndex(db, name))
+
+def get_user(uid: int) -> Optional[Dict[str, Any]]:
+    src = _source("users", uid)
+    if isinstance(src, SqliteStore):
+        return src.get_user(uid)
+    return _by_key(src, "users").get(uid)
+
+def find_user(username: str) -> Optional[Dict[str, Any]]:
+    """The user with this username that is not soft-deleted."""
+    src = _source("users", "username", username)
+    if isinstance(src, SqliteStore):
+        return src.find_user(username)
+    return _view(src, "users_by_name", UsernameIndex).find(username)
+
+def username_taken(username: str) -> bool:
+    """Whether any user, soft-deleted ones included, has exactly this username."""
+    src = _source("users", "username", username)
+    if isinstance(src, SqliteStore):
+        return src.username_taken(username)
+    return _view(src, "users_by_name", UsernameIndex).is_taken(username)
+
+def next_user_id(count: int = 1) -> int:
+    """First of count new user ids, above every user id, soft-deleted users included (see _reserve)."""
+    src = _source()
+    if isinstance(src, SqliteStore):
+        return _reserve("users", lambda: src.next_user_id() - 1, count)
+    return _reserve("users", lambda: _view(src, "users_by_name", UsernameIndex).max_id, count)
+
+def get_token(token: str) -> Optional[Dict[str, Any]]:
+    src = _source("tokens", token)
+    if isinstance(src, SqliteStore):
+        return src.get_token(token)
+    return _by_key(src, "tokens").get(token)
+
+def user_tokens(uid: int) -> List[Dict[str, Any]]:
+    src = _source("tokens", "user_id", uid)
+    if isinstance(src, SqliteStore):
+        return src.user_tokens(uid)
+    return _view(src, "tokens_by_user", TokenIndex).for_user(uid)
+
+def get_mission(mid: int) -> Optional[Dict[str, Any]]:
+    src = _source("missions", mid)
+    if isinstance(src, SqliteStore):
+        return src.get_mission(mid)
+    return _by_key(src, "missions").get(mid)
+
+def next_mission_id(count: int = 1) -> int:
+    """First of count new mission ids (see _reserve)."""
+    src = _source()
+    if isinstance(src, SqliteStore):
+        return _reserve("missions", lambda: src.next_mission_id() - 1, count)
+    return _reserve("missions", lambda: _by_key(src, "missions").max_id, count)
+
+def query_missions(
+    q: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    offset: int = 0,
+    limit: int = 20,
+    after: Optional[Tuple[int, float, Any]] = None,
+    count: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Missions matching every given filter, ordered by start time then id; returns (page, total).
+
+    after is the mission_order_key of the last mission already seen; the page
+    (and offset) start past it. total counts all matches regardless of
+    after, and is None when count is false.
+    """
+    src = _source("missions")
+    if isinstance(src, SqliteStore):
+        return src.query_missions(q, status, date_from, date_to, offset, limit, after, count)
+    by_start = _view(src, "missions_by_start", MissionTimeIndex)
+    hits = _view(src, "missions_text", MissionTextIndex).search(q) if q else None
+    # Without status or date filters the total is known up front. Unless the
+    # walk has to count, it starts at the cursor and stops once the page is full.
+    known_total: Optional[int] = None
+    if not (status or date_from or date_to):
+        known_total = len(hits) if hits is not None else len(by_start.entries)
+    counting = count and known_total is None
+    seek = None if counting else after
+    candidates: Iterable[Dict[str, Any]]
+    if hits is not None:
+        lo, hi = by_start.bounds(date_from, date_to, seek)
+        if len(hits) * 4 < hi - lo:
+            # Text hits are a small part of the date window: order the hits
+            # and check their dates instead of walking the window. Sorting is
+            # the costlier step, so broad queries walk the window instead.
+            found = (by_start.match(mid, date_from, date_to) for mid in by_start.ordered(hits, seek))
+            candidates = (m for m in found if m is not None)
+        else:
+            candidates = (m for m in by_start.range(date_from, date_to, seek) if m.get("id") in hits)
+    else:
+        candidates = by_start.range(date_from, date_to, seek)
+    page: List[Dict[str, Any]] = []
+    total = 0
+    n = 0
+    for m in candidates:
+        if status and m.get("status") != status:
+            continue
+        total += 1
+        if counting and after is not None and by_start.key(m.get("id")) <= after:
+            continue
+        if offset <= n < offset + limit:
+            page.append(m)
+        n += 1
+        if not counting and n >= offset + limit:
+            break
+    if not count:
+        return page, None
+    return page, total if counting else known_total
+
+def query_users(
+    q: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 10,
+    after: Optional[int] = None,
+    count: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Users that are not soft-deleted, optionally with a username starting with q (any case), by id.
+
+    after is the id of the last user already seen; total ignores it and is
+    None when count is false.
+    """
+    src = _source("users")
+    if isinstance(src, SqliteStore):
+        return src.query_users(q, offset, limit, after, count)
+    # Writers update the index in place, so the ids and their records are read together.
+    with _lock:
+        idx = src.view("users_by_name", UsernameIndex)
+        ids = idx.prefix(q) if q else idx.ids
+        start = (bisect_right(ids, after) if after is not None else 0) + offset
+        return [idx.users[uid] for uid in ids[start:start + limit]], len(ids) if count else None
+
+def mission_assignments(mid: int) -> List[Dict[str, Any]]:
+    """Assignments of one mission, by id."""
+    src = _source("assignments", "mission_id", mid)
+    if isinstance(src, SqliteStore):
+        return src.mission_assignments(mid)
+    return _view(src, "assignments_by_mission", AssignmentIndex).for_mission(mid)
+
+def count_assignments(mid: int, role_label: str) -> int:
+    src = _source("assignments", "mission_id", mid)
+    if isinstance(src, SqliteStore):
+        return src.count_assignments(mid, role_label)
+    return _view(src, "assignments_by_mission", AssignmentIndex).count(mid, role_label)
+
+def next_assignment_id(count: int = 1) -> int:
+    """First of count new assignment ids (see _reserve)."""
+    src = _source()
+    if isinstance(src, SqliteStore):
+        return _reserve("assignments", lambda: src.next_assignment_id() - 1, count)
+    return _reserve("assignments", lambda: _view(src, "assignments_by_mission", AssignmentIndex).max_id, count)
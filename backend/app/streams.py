@@ -0,0 +1,26 @@
+import codecs
+from typing import AsyncIterator
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line: int = 1 << 20) -> AsyncIterator[str]:
+    """Decode a UTF-8 byte stream and yield its lines without the line ending.
+
+    Only one line is buffered at a time; a line longer than max_line
+    characters raises LineTooLong and invalid UTF-8 raises UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    async for chunk in chunks:
+        buf += decoder.decode(chunk)
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+        if len(buf) > max_line:
+            raise LineTooLong(f"line longer than {max_line} characters")
+    buf += decoder.decode(b"", final=True)
+    if buf:
+        yield buf[:-1] if buf.endswith("\r") else buf
@@ -0,0 +1,78 @@
+import asyncio, json, logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from app import config
+from app.storage import compact_db, transaction
+
+log = logging.getLogger(__name__)
+
+_stats: Dict[str, Any] = {"runs": 0, "reclaimed": 0, "bytes_saved": 0, "last_run": None}
+
+
+def _expired(t: Dict[str, Any], cutoff: datetime) -> bool:
+    try:
+        return datetime.fromisoformat(t.get("created_at")) <= cutoff
+    except (TypeError, ValueError):
+        # _current_user cannot use a token without a valid created_at either.
+        return True
+
+
+def sweep_batch(batch_size: int, now: Optional[datetime] = None) -> Tuple[int, int]:
+    """Delete up to batch_size expired tokens in one write; returns (tokens, bytes) reclaimed."""
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(minutes=config.TOKEN_TTL)
+    return transaction(_sweep, batch_size, cutoff)
+
+
+def _sweep(db: Dict[str, Any], batch_size: int, cutoff: datetime) -> Tuple[int, int]:
+    drop = []
+    for t in db.records("tokens"):
+        if _expired(t, cutoff):
+            drop.append(t)
+            if len(drop) >= batch_size:
+                break
+    saved = 0
+    for t in drop:
+        saved += len(json.dumps(t, ensure_ascii=True))
+        db.delete("tokens", t.get("token"))
+    return len(drop), saved
+
+
+def _record(reclaimed: int, saved: int) -> Dict[str, Any]:
+    _stats["runs"] += 1
+    _stats["reclaimed"] += reclaimed
+    _stats["bytes_saved"] += saved
+    _stats["last_run"] = datetime.now(timezone.utc).isoformat()
+    if reclaimed:
+        # Fold the deletions into the snapshot so data.json actually shrinks.
+        compact_db()
+    return {"reclaimed": reclaimed, "bytes_saved": saved}
+
+
+async def sweep_expired_tokens(batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """Remove every expired token, one write per batch. Batches run in a worker
+    thread and requests get the event loop and the storage lock in between."""
+    batch_size = batch_size or config.TOKEN_SWEEP_BATCH
+    reclaimed = saved = 0
+    while True:
+        n, b = await asyncio.to_thread(sweep_batch, batch_size)
+        reclaimed += n
+        saved += b
+        if n < batch_size:
+            return await asyncio.to_thread(_record, reclaimed, saved)
+        await asyncio.sleep(0)
+
+
+async def run_sweeper(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await sweep_expired_tokens()
+        except Exception:
+            log.exception("token sweep failed")
+            continue
+        if result["reclaimed"]:
+            log.info("token sweep reclaimed %(reclaimed)d tokens (%(bytes_saved)d bytes)", result)
+
+
+def stats() -> Dict[str, Any]:
+    return dict(_stats)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Measure bcrypt logins/sec inline and through the hashing process pool.
+
+Usage:
+  python backend/scripts/bench_hashing.py --rounds 12 --logins 64 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app import config, hashing
+
+
+async def _pool_logins(n: int, hashed: str) -> None:
+    await asyncio.gather(*(hashing.verify_password_async("secret", hashed) for _ in range(n)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="bcrypt login throughput")
+    parser.add_argument("--rounds", type=int, default=config.BCRYPT_ROUNDS, help="bcrypt cost factor")
+    parser.add_argument("--logins", type=int, default=32, help="password checks per run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes")
+    args = parser.parse_args()
+
+    config.HASH_WORKERS = args.workers
+    config.HASH_QUEUE_MAX = args.logins
+    hashed = hashing.hash_password("secret", args.rounds)
+
+    t = time.perf_counter()
+    for _ in range(args.logins):
+        hashing.verify_password("secret", hashed)
+    inline = args.logins / (time.perf_counter() - t)
+    print(f"inline:           {inline:8.1f} logins/s (1 core)")
+
+    asyncio.run(_pool_logins(args.workers, hashed))  # start the workers
+    t = time.perf_counter()
+    asyncio.run(_pool_logins(args.logins, hashed))
+    pooled = args.logins / (time.perf_counter() - t)
+    hashing.shutdown()
+    print(f"pool x{args.workers:<3}         {pooled:8.1f} logins/s ({pooled / args.workers:.1f} per core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Compare GET /missions?q= filtering through the text index with a full scan.
+
+Usage:
+  python backend/scripts/bench_mission_search.py --missions 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.storage import load_db, save_db, query_missions
+
+WORDS = ["concert", "festival", "theatre", "salle", "bal", "opera", "nuit", "jazz", "zenith", "parc", "cirque", "expo"]
+CITIES = ["Lyon", "Paris", "Nantes", "Lille", "Rennes", "Nice", "Brest", "Dijon"]
+
+
+def _scan(missions, q, offset, limit):
+    """The pre-index list_missions filter: lowercase every mission, then sort."""
+    ql = q.lower()
+    hits = [m for m in missions if ql in (m.get("title", "") + " " + (m.get("location") or "")).lower()]
+    hits.sort(key=lambda m: m.get("start"))
+    return hits[offset:offset + limit], len(hits)
+
+
+def _time(fn, repeat):
+    t = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="mission text search benchmark")
+    parser.add_argument("--missions", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench_search_")
+    rnd = random.Random(1)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    db = load_db()
+    for i in range(1, args.missions + 1):
+        start = base + timedelta(minutes=rnd.randrange(525_600))
+        db["missions"].append({
+            "id": i,
+            "title": f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} #{i}",
+            "location": rnd.choice(CITIES),
+            "status": "published",
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=4)).isoformat(),
+        })
+    save_db(db)
+    missions = load_db()["missions"]
+
+    t = time.perf_counter()
+    query_missions(q="warmup")
+    print(f"{args.missions} missions, index build {time.perf_counter() - t:.2f}s")
+    print(f"{'query':<14}{'hits':>8}{'scan ms':>10}{'index ms':>10}{'speedup':>9}")
+    for q in ["#4242", "#99", "jazz nu", "zenith", "lille", "a"]:
+        hits = query_missions(q=q, limit=20)[1]
+        scan = _time(lambda: _scan(missions, q, 0, 20), args.repeat)
+        indexed = _time(lambda: query_missions(q=q, limit=20), args.repeat)
+        print(f"{q:<14}{hits:>8}{scan:>10.2f}{indexed:>10.2f}{scan / indexed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Copy the JSON store (data.json plus any pending journal) into data.sqlite3.
+
+Usage:
+  DATA_DIR=/data python backend/scripts/migrate_to_sqlite.py
+  then run the API with STORAGE_BACKEND=sqlite
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from app.journal import Journal
+from app.sqlite_store import migrate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate data.json to SQLite")
+    parser.add_argument("--data-dir", default=os.environ.get("DATA_DIR", "/data"), help="directory holding data.json")
+    parser.add_argument("--force", action="store_true", help="replace an existing data.sqlite3")
+    args = parser.parse_args()
+
+    src = os.path.join(args.data_dir, "data.json")
+    dst = os.path.join(args.data_dir, "data.sqlite3")
+    if not os.path.exists(src):
+        sys.exit(f"{src} not found")
+    if args.force:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(dst + suffix):
+                os.remove(dst + suffix)
+    db = Journal(src).read()
+    try:
+        counts = migrate(db, dst)
+    except FileExistsError:
+        sys.exit(f"{dst} already exists; pass --force to replace it")
+    print(", ".join(f"{name}: {n}" for name, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
-import os, sys
+import os, sys, gzip, json, threading, tracemalloc
+import pytest
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from fastapi.testclient import TestClient
+from app import config, storage
+from app.backups import COLLECTIONS, BackupReader, Checksum, gzipped, iter_backup
 from app.main import app
-from app.storage import load_db, save_db
+from app.routers import admin_backup
+from app.storage import change_seq, load_db, save_db
 
 
 def _admin_token(c: TestClient) -> str:
@@ -126,3 +130,247 @@ def test_restore_merge_nowipe_upserts_without_tokens(tmp_path, monkeypatch):
     assert a1["status"] == "confirmed"
     assert any(a["id"] == 2 for a in db2["assignments"])
     assert db2.get("tokens", []) == orig_tokens
+
+
+def test_restore_merge_keeps_concurrent_writes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z"}
+    c.post("/missions", json=mission, headers=H)
+    backup = c.get("/admin/backup", headers=H).content
+
+    def insert(db, mid):
+        db["missions"] = db["missions"] + [dict(load_db()["missions"][0], id=mid)]
+
+    def upload():
+        # Committed while the upload is still being read.
+        yield backup[:10]
+        storage.transaction(insert, 98)
+        yield backup[10:]
+
+    merge = admin_backup._merge
+
+    def racing_merge(*args):
+        # Committed from another thread while the merge runs; it must wait for the restore.
+        t = threading.Thread(target=storage.transaction, args=(insert, 99))
+        t.start()
+        t.join(0.2)
+        threads.append(t)
+        return merge(*args)
+
+    threads = []
+    monkeypatch.setattr(admin_backup, "_merge", racing_merge)
+    admin_backup._restore(upload(), wipe=False, verify=True)
+    threads[0].join()
+    assert [m["id"] for m in load_db()["missions"]] == [1, 98, 99]
+
+
+def _records(c: TestClient, H):
+    c.post("/auth/register", json={"username": "u1", "password": "p"})
+    mission = {"title": "Fête", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z"}
+    for _ in range(3):
+        c.post("/missions", json=mission, headers=H)
+
+
+def test_backup_formats_share_checksum_and_gzip(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    _records(c, H)
+    doc = c.get("/admin/backup", headers=H).json()
+    lines = [json.loads(l) for l in c.get("/admin/backup?format=ndjson", headers=H).text.splitlines()]
+    assert lines[0]["version"] == 1 and lines[0]["format"] == "ndjson"
+    assert [l["record"] for l in lines[1:-1] if l["collection"] == "missions"] == doc["payload"]["missions"]
+    assert lines[-1]["counts"] == {k: len(v) for k, v in doc["payload"].items()}
+    assert lines[-1]["checksum"] == doc["checksum"]
+
+    checksum = Checksum()
+    for name in COLLECTIONS:
+        for rec in load_db()[name]:
+            checksum.update(name, rec)
+    assert doc["checksum"] == checksum.trailer()
+
+    r = c.get("/admin/backup?format=ndjson&gzip=true", headers=H)
+    assert r.headers["content-type"] == "application/gzip"
+    assert r.headers["content-disposition"].endswith('.ndjson.gz"')
+    assert [json.loads(l) for l in gzip.decompress(r.content).decode().splitlines()][1:] == lines[1:]
+    r = c.get("/admin/backup?gzip=true", headers=H)
+    assert json.loads(gzip.decompress(r.content))["payload"] == doc["payload"]
+
+
+def test_backup_streams_without_materializing(tmp_path, monkeypatch):
+    db = {"users": [], "tokens": [], "assignments": []}
+    db["missions"] = [{"id": i, "title": "x" * 200, "positions": [{"label": "SON", "count": 1}]} for i in range(20000)]
+    size = len(json.dumps(db))
+    tracemalloc.start()
+    total = sum(len(chunk) for chunk in gzipped(iter_backup(db, "now")))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert total > 0 and peak < size / 4
+
+
+def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_restore_streams_ndjson_and_gzip_uploads(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    _records(c, H)
+    before = load_db()
+    plain = c.get("/admin/backup", headers=H).content
+    ndjson_gz = c.get("/admin/backup?format=ndjson&gzip=true", headers=H).content
+
+    for body, size in [(plain, 5), (ndjson_gz, 3), (gzip.compress(plain), 64)]:
+        c.post("/admin/reset", headers=H)
+        H2 = {"Authorization": f"Bearer {_admin_token(c)}"}
+        r = c.post("/admin/restore?verify=true", content=_chunks(body, size), headers=H2)
+        assert r.status_code == 200, r.text
+        assert r.json()["records"]["missions"] == 3
+        # The restored tokens include H's again.
+        assert load_db() == before
+
+    r = c.post("/admin/restore?wipe=false", content=ndjson_gz, headers=H)
+    assert r.status_code == 200
+    assert [u["username"] for u in load_db()["users"]] == ["admin", "u1"]
+
+
+def test_restore_rejects_bad_uploads_without_writing(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    _records(c, H)
+    before = load_db()
+    ndjson = c.get("/admin/backup?format=ndjson", headers=H).content
+    doc = json.loads(c.get("/admin/backup", headers=H).content)
+    doc["payload"]["missions"][0]["title"] = "tampered"
+    bad = [
+        ndjson[: len(ndjson) // 2],
+        ndjson.rsplit(b"\n", 2)[0] + b"\n",
+        gzip.compress(ndjson)[:-20],
+        b'{"version": 2, "payload": {}}',
+        b'{"version": 1, "payload": {"users": [1], "tokens": [], "missions": [], "assignments": []}}',
+        b"\xff\xfe",
+    ]
+    for body in bad:
+        r = c.post("/admin/restore", content=body, headers=H)
+        assert r.status_code == 422, body[:40]
+    assert c.post("/admin/restore?verify=true", json=doc, headers=H).status_code == 422
+    assert load_db() == before
+    assert c.post("/admin/restore", json=doc, headers=H).status_code == 200
+
+
+def test_restore_reader_keeps_memory_bounded():
+    db = {"users": [], "tokens": [], "assignments": []}
+    db["missions"] = [{"id": i, "title": "x" * 200, "positions": [{"label": "SON", "count": 1}]} for i in range(20000)]
+    data = b"".join(iter_backup(db, "now"))
+    tracemalloc.start()
+    reader = BackupReader(_chunks(data, 1 << 16))
+    n = sum(1 for _ in reader.records())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert n == 20000 and reader.verified() and peak < len(data) / 4
+
+
+def test_restore_inflates_gzip_a_chunk_at_a_time():
+    db = {"users": [], "tokens": [], "missions": [], "assignments": []}
+    data = b"".join(iter_backup(db, "now"))
+    # 64 MiB of padding compresses to one small upload chunk.
+    body = gzip.compress(data[:1] + b" " * (64 << 20) + data[1:])
+    tracemalloc.start()
+    reader = BackupReader([body])
+    assert list(reader.records()) == []
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert reader.verified() and peak < 4 << 20
+
+
+def test_restore_caps_decompressed_size(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    _records(c, H)
+    before = load_db()
+    plain = c.get("/admin/backup", headers=H).content
+    monkeypatch.setattr(config, "RESTORE_MAX_INFLATED", len(plain) - 1)
+    r = c.post("/admin/restore", content=gzip.compress(plain), headers=H)
+    assert r.status_code == 422 and "decompressed" in r.json()["detail"]
+    assert load_db() == before
+    monkeypatch.setattr(config, "RESTORE_MAX_INFLATED", len(plain))
+    assert c.post("/admin/restore", content=gzip.compress(plain), headers=H).status_code == 200
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite", "split"])
+def test_incremental_backups_restore_as_a_chain(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "a"))
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    _records(c, H)
+    full = c.get("/admin/backup?format=ndjson", headers=H).content
+    seq = json.loads(full.splitlines()[0])["seq"]
+
+    mission = {"title": "Bal", "start": "2025-02-01T00:00:00Z", "end": "2025-02-02T00:00:00Z"}
+    assert c.put("/missions/1", json=mission, headers=H).status_code == 200
+    assert c.delete("/missions/2", headers=H).status_code == 204
+    c.post("/missions", json=mission, headers=H)
+    inc1 = c.get(f"/admin/backup?since={seq}", headers=H).json()
+    assert inc1["since"] == seq and inc1["seq"] > seq
+    assert set(inc1["payload"]) == {"users", "missions", "assignments"}
+    assert [m["id"] for m in inc1["payload"]["missions"]] == [1, 4]
+    assert inc1["deleted"] == {"users": [], "missions": [2], "assignments": []}
+
+    c.post("/auth/register", json={"username": "u2", "password": "p"})
+    c.delete("/missions/4", headers=H)
+    inc2 = c.get(f"/admin/backup?since={inc1['seq']}&format=ndjson&gzip=true", headers=H).content
+    lines = [json.loads(l) for l in gzip.decompress(inc2).splitlines()]
+    assert [l.get("deleted") for l in lines[1:-1]] == [None, 4]
+    assert lines[-1]["deleted"] == {"users": 0, "missions": 1, "assignments": 0}
+    expected = {k: v for k, v in load_db().items() if k != "tokens"}
+
+    # A second store: the full backup brings the admin's token along.
+    monkeypatch.setenv("DATA_DIR", str(tmp_path / "b"))
+    c.post("/auth/register", json={"username": "other", "password": "p"})
+    H2 = {"Authorization": f"Bearer {_admin_token(c)}"}
+    assert c.post("/admin/restore?verify=true", content=full, headers=H2).status_code == 200
+    assert change_seq()[1] == seq
+    r = c.post("/admin/restore?wipe=false", content=inc2, headers=H)
+    assert r.status_code == 409
+    r = c.post("/admin/restore", json=inc1, headers=H)
+    assert r.status_code == 422
+    for body in [json.dumps(inc1).encode(), inc2]:
+        r = c.post("/admin/restore?wipe=false&verify=true", content=body, headers=H)
+        assert r.status_code == 200, r.text
+    assert {k: v for k, v in load_db().items() if k != "tokens"} == expected
+
+
+def test_incremental_backup_before_tracked_changes_is_gone(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "CHANGE_LOG_MAX_DELETED", 2)
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z"}
+    ids = [c.post("/missions", json=mission, headers=H).json()["id"] for _ in range(4)]
+    seq = change_seq()[0]
+    assert c.get(f"/admin/backup?since={seq}", headers=H).json()["payload"]["missions"] == []
+    for mid in ids:
+        c.delete(f"/missions/{mid}", headers=H)
+    # Only the two newest deletions are still known.
+    assert c.get(f"/admin/backup?since={seq}", headers=H).status_code == 410
+    r = c.get(f"/admin/backup?since={change_seq()[0] - 1}", headers=H)
+    assert r.json()["deleted"]["missions"] == [ids[-1]]
+
+
+def test_change_log_starts_after_existing_records(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    with open(tmp_path / "data.json", "w") as f:
+        json.dump({"users": [], "tokens": [], "missions": [{"id": 1, "title": "old"}], "assignments": []}, f)
+    c = TestClient(app)
+    H = {"Authorization": f"Bearer {_admin_token(c)}"}
+    assert c.get("/admin/backup?since=0", headers=H).status_code == 410
+    seq = c.get("/admin/backup", headers=H).json()["seq"]
+    assert c.get(f"/admin/backup?since={seq}", headers=H).status_code == 200
+    assert "_changes" not in load_db()
@@ -0,0 +1,69 @@
+import os, sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.storage import load_db, save_db, count_assignments, mission_assignments, next_assignment_id
+
+
+def _seed(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    db = load_db()
+    db["users"] = [{"id": 1, "username": "u", "password_hash": "x"}]
+    db["tokens"] = [{"token": "t", "user_id": 1, "created_at": "2999-01-01T00:00:00+00:00"}]
+    positions = [{"label": "SON", "count": 2, "skills": {}}, {"label": "LUM", "count": 1, "skills": {}}]
+    db["missions"] = [
+        {"id": i, "title": f"m{i}", "start": "2025-08-01T08:00:00+00:00", "end": "2025-08-01T12:00:00+00:00", "positions": positions}
+        for i in (1, 2)
+    ]
+    # Other missions' assignments must not count against mission 1.
+    db["assignments"] = [{"id": i, "mission_id": 2, "user_id": i, "role_label": "SON", "status": "invited"} for i in range(1, 6)]
+    save_db(db)
+    return TestClient(app), {"Authorization": "Bearer t"}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_capacity_counters_follow_creates_and_deletes(tmp_path, monkeypatch, backend):
+    c, H = _seed(tmp_path, monkeypatch, backend)
+    r = c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 7}, headers=H)
+    assert r.json()["id"] == 6
+    assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 8}, headers=H).status_code == 200
+    assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 9}, headers=H).status_code == 422
+    assert c.post("/missions/1/assign", json={"role_label": "LUM", "user_id": 9}, headers=H).status_code == 200
+    assert count_assignments(1, "SON") == 2 and count_assignments(1, "LUM") == 1
+    assert [a["id"] for a in mission_assignments(1)] == [6, 7, 8]
+
+    assert c.delete("/missions/1/assignments/6", headers=H).status_code == 204
+    assert c.delete("/missions/2/assignments/7", headers=H).status_code == 404
+    assert count_assignments(1, "SON") == 1
+    assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 9}, headers=H).status_code == 200
+    assert c.get("/missions/1/assignments").json()["total"] == 3
+    assert c.get("/missions/2/assignments").json()["total"] == 5
+
+
+def test_assignment_index_rebuilds_after_bulk_replace(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch, "json")
+    assert count_assignments(2, "SON") == 5
+    db = load_db()
+    db["assignments"] = [dict(a, role_label="LUM") if a["id"] == 1 else a for a in db["assignments"] if a["id"] != 2]
+    save_db(db)
+    assert count_assignments(2, "SON") == 3 and count_assignments(2, "LUM") == 1
+    db = load_db()
+    db["assignments"] = "corrupt"
+    save_db(db)
+    db["assignments"] = []
+    save_db(db)
+    assert mission_assignments(2) == [] and next_assignment_id() == 1
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_deleting_highest_assignment_frees_its_id(tmp_path, monkeypatch, backend):
+    c, H = _seed(tmp_path, monkeypatch, backend)
+    assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 7}, headers=H).json()["id"] == 6
+    assert c.delete("/missions/1/assignments/6", headers=H).status_code == 204
+    assert next_assignment_id() == 6
+    assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 8}, headers=H).json()["id"] == 6
+    assert c.delete("/missions/2/assignments/3", headers=H).status_code == 204
+    assert next_assignment_id() == 7
@@ -2,6 +2,7 @@ import os, sys
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from fastapi.testclient import TestClient
 from app.main import app
+from app.storage import cache_stats
 
 
 def _token(c: TestClient) -> str:
@@ -65,3 +66,45 @@ def test_delete_assignment_204_and_404(tmp_path, monkeypatch):
 
     r = c.delete(f"/missions/{mid}/assignments/{aid}", headers=H)
     assert r.status_code == 404
+
+
+def test_bulk_assign_single_write_with_per_item_results(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    tok = _token(c)
+    H = {"Authorization": f"Bearer {tok}"}
+    body = {
+        "title": "Festival",
+        "start": "2025-08-16T08:00:00+00:00",
+        "end": "2025-08-16T23:00:00+00:00",
+        "positions": [{"label": "SON", "count": 2, "skills": {}}, {"label": "LUM", "count": 1, "skills": {}}],
+    }
+    mid = c.post("/missions", json=body, headers=H).json()["id"]
+    assert c.post(f"/missions/{mid}/assign", json={"role_label": "SON", "user_id": 1}, headers=H).status_code == 200
+
+    items = [
+        {"role_label": "SON", "user_id": 2},
+        {"role_label": "SON", "user_id": 3},
+        {"role_label": "DRUM", "user_id": 4},
+        {"role_label": "LUM", "user_id": 5, "status": "confirmed"},
+    ]
+    strict = c.post(f"/missions/{mid}/assign/bulk?all_or_nothing=true", json={"items": items}, headers=H)
+    assert strict.status_code == 422
+    assert c.get(f"/missions/{mid}/assignments").json()["total"] == 1
+
+    version = cache_stats()["version"]
+    r = c.post(f"/missions/{mid}/assign/bulk", json={"items": items}, headers=H)
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert (out["created"], out["rejected"]) == (2, 2)
+    assert [(x["ok"], x.get("detail")) for x in out["items"]] == [
+        (True, None), (False, "capacity exceeded"), (False, "invalid role_label"), (True, None)
+    ]
+    assert out["items"][3]["assignment"]["status"] == "confirmed"
+    assert cache_stats()["version"] == version + 1
+    listed = c.get(f"/missions/{mid}/assignments").json()
+    assert [a["user_id"] for a in listed["items"]] == [1, 2, 5]
+    assert len({a["id"] for a in listed["items"]}) == 3
+
+    assert c.post("/missions/999/assign/bulk", json={"items": items}, headers=H).status_code == 404
+    assert c.post(f"/missions/{mid}/assign/bulk", json={"items": []}, headers=H).status_code == 422
@@ -0,0 +1,101 @@
+import os, sys, asyncio
+import anyio.to_thread
+import httpx
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app import astorage, config, storage
+from app.main import app
+from app.storage import load_db, read_db, save_db
+
+
+async def _admin(c: httpx.AsyncClient):
+    await c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = await astorage.read(load_db)
+    db["users"][0]["role"] = "admin"
+    await astorage.write(save_db, db)
+    r = await c.post("/auth/token-json", json={"username": "admin", "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _run(test):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            return await test(c)
+    return asyncio.run(main())
+
+
+def test_handlers_do_not_use_the_threadpool(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    used = []
+    run_sync = anyio.to_thread.run_sync
+    monkeypatch.setattr(anyio.to_thread, "run_sync", lambda *a, **kw: used.append(a[0]) or run_sync(*a, **kw))
+
+    async def test(c):
+        H = await _admin(c)
+        mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z",
+                   "positions": [{"label": "SON", "count": 1}]}
+        r = await c.post("/missions", json=mission, headers=H)
+        mid = r.json()["id"]
+        calls = [
+            c.get("/missions"), c.get(f"/missions/{mid}"), c.get(f"/missions/{mid}/assignments"),
+            c.get("/auth/me", headers=H), c.get("/admin/users", headers=H), c.get("/admin/users/1", headers=H),
+            c.get("/admin/storage/stats", headers=H), c.put(f"/missions/{mid}", json={"title": "n"}, headers=H),
+        ]
+        return [r.status_code for r in await asyncio.gather(*calls)]
+
+    assert _run(test) == [200] * 8
+    assert used == []
+
+
+def test_concurrent_writes_are_serialized(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+
+    async def test(c):
+        H = await _admin(c)
+        mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z",
+                   "positions": [{"label": "SON", "count": 5}]}
+        created = await asyncio.gather(*[c.post("/missions", json=mission, headers=H) for _ in range(20)])
+        item = {"role_label": "SON", "user_id": 1}
+        assigned = await asyncio.gather(*[c.post("/missions/1/assign", json=item, headers=H) for _ in range(20)])
+        return [r.json()["id"] for r in created], [r.status_code for r in assigned]
+
+    ids, statuses = _run(test)
+    assert sorted(ids) == list(range(1, 21))
+    # Each capacity check ran with the previous assignment already stored.
+    assert statuses.count(200) == 5 and statuses.count(422) == 15
+    assert len(load_db()["assignments"]) == 5
+
+
+def test_writes_commit_in_submission_order(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+
+    async def main():
+        db = await astorage.read(load_db)
+        saves = []
+        for i in range(10):
+            db = dict(db, missions=[{"id": 1, "title": str(i)}])
+            saves.append(asyncio.ensure_future(astorage.write(save_db, db)))
+        await asyncio.gather(*saves)
+        return (await astorage.read(read_db))["missions"][0]["title"]
+
+    assert asyncio.run(main()) == "9"
+
+
+def test_transactions_wait_for_group_commit_without_a_thread(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "GROUP_COMMIT_MS", 20)
+
+    async def test(c):
+        H = await _admin(c)
+        mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z",
+                   "positions": [{"label": "SON", "count": 5}]}
+        before = storage.txn_stats()
+        created = await asyncio.gather(*[c.post("/missions", json=mission, headers=H) for _ in range(40)])
+        after = storage.txn_stats()
+        return [r.status_code for r in created], after["flushes"] - before["flushes"]
+
+    statuses, flushes = _run(test)
+    assert statuses == [200] * 40
+    # Far more writes share a flush than there are writer threads.
+    assert flushes <= 40 // (2 * config.STORAGE_WRITE_WORKERS)
+    assert [m["id"] for m in load_db()["missions"]] == list(range(1, 41))
@@ -0,0 +1,101 @@
+import os, sys
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import storage
+from app.main import app
+from app.routers import auth
+from app.storage import load_db, save_db
+
+
+def _login(c: TestClient, username: str) -> dict:
+    c.post("/auth/register", json={"username": username, "password": "pw"})
+    r = c.post("/auth/token-json", json={"username": username, "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _count_token_lookups(monkeypatch) -> list:
+    calls = []
+    real = auth.get_token
+    monkeypatch.setattr(auth, "get_token", lambda t: calls.append(t) or real(t))
+    return calls
+
+
+def test_token_index_tracks_writes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = _login(c, "u")
+    tok = H["Authorization"].split()[1]
+    assert storage.get_token(tok)["user_id"] == 1
+    H2 = _login(c, "u")
+    assert storage.get_token(tok) is None
+    assert storage.get_token(H2["Authorization"].split()[1])["user_id"] == 1
+    assert c.get("/auth/me", headers=H).status_code == 401
+
+
+def test_current_user_is_cached_per_token(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = _login(c, "u")
+    calls = _count_token_lookups(monkeypatch)
+    for _ in range(3):
+        assert c.get("/auth/me", headers=H).status_code == 200
+    assert len(calls) == 1
+
+
+def test_cached_session_still_expires(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = _login(c, "u")
+    assert c.get("/auth/me", headers=H).status_code == 200
+    tok = H["Authorization"].split()[1]
+    with auth._user_cache_lock:
+        until, _, user = auth._user_cache[tok]
+        auth._user_cache[tok] = (until, datetime.now(timezone.utc) - timedelta(seconds=1), user)
+    r = c.get("/auth/me", headers=H)
+    assert r.status_code == 401 and r.json()["detail"] == "Token expired"
+
+
+def test_user_changes_invalidate_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H_admin = _login(c, "admin")
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    auth._invalidate_all()
+    H = _login(c, "u")
+    uid = 2
+
+    c.put("/auth/me/prefs", headers=H, json={"email": "u@example.com"})
+    assert c.post("/auth/me/notify-test", headers=H).json()["channels"] == ["email"]
+    c.put("/auth/me/prefs", headers=H, json={"telegram": True, "telegram_chat_id": "1"})
+    assert c.post("/auth/me/notify-test", headers=H).json()["channels"] == ["telegram"]
+
+    assert c.put(f"/admin/users/{uid}", headers=H_admin, json={"is_active": False}).status_code == 200
+    assert c.get("/auth/me", headers=H).status_code == 401
+    assert c.put(f"/admin/users/{uid}", headers=H_admin, json={"is_active": True}).status_code == 200
+    assert c.get("/auth/me", headers=H).status_code == 200
+    assert c.delete(f"/admin/users/{uid}", headers=H_admin).status_code == 204
+    assert c.get("/auth/me", headers=H).status_code == 401
+
+
+def test_invalidation_during_resolve_is_not_undone(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    H = _login(c, "u")
+    tok = H["Authorization"].split()[1]
+    real = auth.get_user
+
+    def stale_get_user(uid):
+        user = real(uid)
+        # A write lands after the resolve loaded the user.
+        auth._invalidate_user(uid)
+        return user
+
+    monkeypatch.setattr(auth, "get_user", stale_get_user)
+    assert c.get("/auth/me", headers=H).status_code == 200
+    assert tok not in auth._user_cache
+    monkeypatch.setattr(auth, "get_user", real)
+    assert c.get("/auth/me", headers=H).status_code == 200
+    assert tok in auth._user_cache
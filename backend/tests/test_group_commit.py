@@ -0,0 +1,107 @@
+import os, sys, json, threading
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app import config, storage
+from app.storage import load_db, save_db, transaction, write_lock
+
+
+def _setup(tmp_path, monkeypatch, backend="json"):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setattr(config, "GROUP_COMMIT_MS", 5)
+    monkeypatch.setattr(config, "TXN_RETRIES", 1000)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"] = [{"id": 1, "title": "counter", "count": 0}]
+    save_db(db)
+
+
+def _bump(db):
+    db["missions"][0]["count"] += 1
+    return db["missions"][0]["count"]
+
+
+def _run(target, n=8):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite", "split"])
+def test_concurrent_writes_share_flushes(tmp_path, monkeypatch, backend):
+    _setup(tmp_path, monkeypatch, backend)
+    before = storage.txn_stats()
+
+    def work():
+        for i in range(10):
+            transaction(_bump)
+            transaction(lambda db: db.setdefault("tokens", []).append({"token": f"{threading.get_ident()}-{i}"}))
+
+    _run(work)
+    db = load_db()
+    assert db["missions"][0]["count"] == 80 and len(db["tokens"]) == 80
+    after = storage.txn_stats()
+    assert after["flushes"] - before["flushes"] < after["flushed"] - before["flushed"]
+    # Transactions that collided within a batch were run again by the flusher.
+    assert after["conflicts"] == before["conflicts"]
+
+
+def test_rerun_sees_earlier_writes_in_the_batch(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    taken, full = [], []
+
+    def take(db):
+        if db["missions"][0]["count"] >= 3:
+            raise ValueError("capacity exceeded")
+        return _bump(db)
+
+    def work():
+        try:
+            taken.append(transaction(take))
+        except ValueError:
+            full.append(1)
+
+    _run(work)
+    assert sorted(taken) == [1, 2, 3] and len(full) == 5
+    assert load_db()["missions"][0]["count"] == 3
+
+
+def test_acknowledged_writes_are_on_disk(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    seen = []
+
+    def work():
+        for _ in range(5):
+            n = transaction(_bump)
+            with open(tmp_path / "data.json", encoding="utf-8") as f:
+                seen.append((n, json.load(f)["missions"][0]["count"]))
+
+    _run(work, 4)
+    assert all(on_disk >= n for n, on_disk in seen)
+
+
+def test_failed_flush_fails_every_write_in_it(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    errors = []
+
+    def work():
+        try:
+            save_db(dict(load_db(), users=[{"id": 1, "username": "a"}]))
+        except OSError as e:
+            errors.append(e)
+
+    with monkeypatch.context() as m:
+        m.setattr(storage._JsonFile, "write", lambda self, db, ops: (_ for _ in ()).throw(OSError("disk full")))
+        _run(work, 4)
+    assert len(errors) == 4
+    assert load_db()["users"] == []
+
+
+def test_lock_holder_commits_directly(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    with write_lock():
+        db = load_db()
+        db["missions"][0]["count"] = 5
+        save_db(db)
+    assert load_db()["missions"][0]["count"] == 5
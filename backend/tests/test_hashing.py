@@ -0,0 +1,50 @@
+import os, sys, asyncio
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config, hashing
+from app.main import app
+from app.storage import load_db
+
+
+def test_register_uses_configured_cost(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "BCRYPT_ROUNDS", 5)
+    c = TestClient(app)
+    assert c.post("/auth/register", json={"username": "u", "password": "p"}).status_code == 200
+    assert load_db()["users"][0]["password_hash"].startswith("$2b$05$")
+    assert c.post("/auth/token-json", json={"username": "u", "password": "p"}).status_code == 200
+    assert c.post("/auth/token-json", json={"username": "u", "password": "x"}).status_code == 401
+
+
+def test_saturated_pool_rejects_with_503(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "BCRYPT_ROUNDS", 4)
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "u", "password": "p"})
+    monkeypatch.setattr(hashing, "_inflight", hashing._workers() + config.HASH_QUEUE_MAX)
+    r = c.post("/auth/token-json", json={"username": "u", "password": "p"})
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+    assert c.post("/auth/register", json={"username": "v", "password": "p"}).status_code == 503
+    assert len(load_db()["users"]) == 1
+
+
+def test_hashes_run_in_worker_processes(monkeypatch):
+    monkeypatch.setattr(config, "HASH_WORKERS", 2)
+    monkeypatch.setattr(config, "HASH_QUEUE_MAX", 0)
+    hashing.shutdown()
+
+    async def burst():
+        return await asyncio.gather(
+            *(hashing.hash_password_async("pw") for _ in range(3)), return_exceptions=True
+        )
+
+    try:
+        results = asyncio.run(burst())
+        hashes = [r for r in results if isinstance(r, str)]
+        assert len(hashes) == 2
+        assert sum(getattr(r, "status_code", None) == 503 for r in results) == 1
+        assert hashing.verify_password("pw", hashes[0])
+        assert hashing.stats()["inflight"] == 0
+    finally:
+        hashing.shutdown()
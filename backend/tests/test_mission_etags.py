@@ -0,0 +1,73 @@
+import os, sys, json
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.routers import missions
+
+
+def _client(tmp_path, monkeypatch, backend="json"):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "u", "password": "p"})
+    r = c.post("/auth/token-json", json={"username": "u", "password": "p"})
+    return c, {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+M = {"title": "Gig", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z"}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_mission_list_revalidates_with_etag(tmp_path, monkeypatch, backend):
+    c, H = _client(tmp_path, monkeypatch, backend)
+    c.post("/missions", json=M, headers=H)
+    r = c.get("/missions?per_page=5")
+    tag = r.headers["etag"]
+    assert tag.startswith('"') and r.json()["total"] == 1
+
+    calls = []
+    query = missions.query_missions
+    monkeypatch.setattr(missions, "query_missions", lambda **kw: calls.append(kw) or query(**kw))
+    for header in [tag, "W/" + tag, f'"other", {tag}', "*"]:
+        r = c.get("/missions?per_page=5", headers={"If-None-Match": header})
+        assert r.status_code == 304 and r.headers["etag"] == tag and r.content == b""
+    assert calls == []
+
+    # Logins and user changes leave missions alone; mission writes move the tag.
+    c.post("/auth/register", json={"username": "v", "password": "p"})
+    assert c.get("/missions", headers={"If-None-Match": tag}).status_code == 304
+    c.put("/missions/1", json={"title": "Gig 2"}, headers=H)
+    r = c.get("/missions", headers={"If-None-Match": tag})
+    assert r.status_code == 200 and r.headers["etag"] != tag
+    tag = r.headers["etag"]
+    c.delete("/missions/1", headers=H)
+    assert c.get("/missions", headers={"If-None-Match": tag}).status_code == 200
+
+
+def test_mission_read_etag_is_per_record(tmp_path, monkeypatch):
+    c, H = _client(tmp_path, monkeypatch)
+    c.post("/missions", json=M, headers=H)
+    c.post("/missions", json=M, headers=H)
+    tag1 = c.get("/missions/1").headers["etag"]
+    tag2 = c.get("/missions/2").headers["etag"]
+    assert tag1 != tag2
+    c.put("/missions/2", json={"title": "changed"}, headers=H)
+    assert c.get("/missions/1", headers={"If-None-Match": tag1}).status_code == 304
+    r = c.get("/missions/2", headers={"If-None-Match": tag2})
+    assert r.status_code == 200 and r.json()["title"] == "changed"
+    assert c.get("/missions/3").status_code == 404
+    assert c.get("/missions/3", headers={"If-None-Match": "*"}).status_code == 404
+    assert c.get("/missions/1", headers={"If-None-Match": "*"}).status_code == 304
+    assert "etag" not in c.get("/missions/3").headers
+
+
+def test_missions_from_before_change_tracking_get_a_tag(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    with open(tmp_path / "data.json", "w") as f:
+        json.dump({"users": [], "tokens": [], "missions": [dict(M, id=1, status="draft", positions=[])], "assignments": []}, f)
+    c = TestClient(app)
+    tag = c.get("/missions/1").headers["etag"]
+    assert c.get("/missions/1", headers={"If-None-Match": tag}).status_code == 304
+    assert c.get("/missions", headers={"If-None-Match": c.get("/missions").headers["etag"]}).status_code == 304
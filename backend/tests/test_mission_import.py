@@ -0,0 +1,77 @@
+import os, sys, json
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.storage import load_db, save_db
+
+
+def _admin(c: TestClient):
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    r = c.post("/auth/token-json", json={"username": "admin", "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_ndjson_import_streams_validates_and_batches(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "IMPORT_BATCH_SIZE", 2)
+    c = TestClient(app)
+    H = _admin(c)
+    c.post("/missions", json={"title": "Existing", "start": "2025-07-01T08:00:00Z", "end": "2025-07-01T09:00:00Z"}, headers=H)
+    rows = [
+        {"title": "Fête", "start": "2025-08-01T08:00:00+00:00", "end": "2025-08-01T12:00:00+00:00", "positions": [{"label": "SON", "count": 2}]},
+        {"title": "Bad", "start": "2025-08-02T08:00:00+00:00", "end": "2025-08-01T12:00:00+00:00"},
+        {"title": "Two", "start": "2025-08-03T08:00:00+00:00", "end": "2025-08-03T12:00:00+00:00", "status": "published"},
+        {"title": "Three", "start": "2025-08-04T08:00:00+00:00", "end": "2025-08-04T12:00:00+00:00"},
+    ]
+    body = "\n".join(json.dumps(r, ensure_ascii=False) for r in rows) + "\n\n{oops\n[1]\n"
+    # Small chunks split lines and multi-byte characters across reads.
+    r = c.post("/admin/missions/import", content=_chunks(body.encode("utf-8"), 7), headers=H)
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert (out["imported"], out["failed"], out["batches"]) == (3, 3, 2)
+    assert [e["line"] for e in out["errors"]] == [2, 6, 7]
+    assert out["errors"][0]["errors"][0]["loc"] == ["end"]
+    missions = load_db()["missions"]
+    assert [(m["id"], m["title"]) for m in missions] == [(1, "Existing"), (2, "Fête"), (3, "Two"), (4, "Three")]
+    assert missions[1]["positions"] == [{"label": "SON", "count": 2, "skills": {}}]
+    assert c.get("/missions", params={"q": "fête"}).json()["total"] == 1
+
+
+def test_csv_import_with_quoted_multiline_fields(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "IMPORT_MAX_ERRORS", 1)
+    c = TestClient(app)
+    H = _admin(c)
+    body = (
+        "title,start,end,location,positions\r\n"
+        '"Gala, ""Opening""",2025-08-01T08:00:00Z,2025-08-01T12:00:00Z,"Hall\nB","[{""label"": ""LUM"", ""count"": 1}]"\r\n'
+        "Plain,2025-08-02T08:00:00Z,2025-08-02T12:00:00Z,,\r\n"
+        "Short,2025-08-02T08:00:00Z\r\n"
+        "NoEnd,2025-08-02T08:00:00Z,,,\r\n"
+    )
+    r = c.post("/admin/missions/import", content=body.encode(), headers={**H, "Content-Type": "text/csv"})
+    out = r.json()
+    assert (out["imported"], out["failed"], out["batches"]) == (2, 2, 1)
+    assert out["errors"][0]["line"] == 5 and out["errors_truncated"] is True
+    first, second = load_db()["missions"]
+    assert first["title"] == 'Gala, "Opening"' and first["location"] == "Hall\nB"
+    assert first["positions"][0]["label"] == "LUM" and second["location"] is None
+
+
+def test_import_requires_admin(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    _admin(c)
+    c.post("/auth/register", json={"username": "u", "password": "p"})
+    tok = c.post("/auth/token-json", json={"username": "u", "password": "p"}).json()["access_token"]
+    r = c.post("/admin/missions/import", content=b"{}", headers={"Authorization": f"Bearer {tok}"})
+    assert r.status_code == 403
@@ -0,0 +1,73 @@
+import os, sys, random
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import storage
+from app.indexes import MissionTimeIndex
+from app.main import app
+from app.storage import load_db, save_db, query_missions
+
+
+def _brute_force(missions, date_from, date_to):
+    out = []
+    for m in missions:
+        try:
+            if date_from and not datetime.fromisoformat(m["start"]) >= date_from:
+                continue
+            if date_to and not datetime.fromisoformat(m["end"]) <= date_to:
+                continue
+        except Exception:
+            continue
+        out.append(m)
+    return sorted(out, key=lambda m: (datetime.fromisoformat(m["start"]).timestamp(), m["id"]))
+
+
+def test_range_matches_full_scan(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    rnd = random.Random(7)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    db = load_db()
+    for i in range(1, 301):
+        tz = timezone(timedelta(hours=rnd.choice([-5, 0, 4])))
+        start = (base + timedelta(hours=rnd.randrange(24 * 365))).astimezone(tz)
+        end = start + timedelta(hours=rnd.randrange(1, 72))
+        db["missions"].append({"id": i, "title": f"m{i}", "start": start.isoformat(), "end": end.isoformat(), "status": "draft"})
+    save_db(db)
+    missions = load_db()["missions"]
+    for _ in range(30):
+        a = base + timedelta(days=rnd.randrange(365))
+        b = a + timedelta(days=rnd.randrange(1, 60))
+        for date_from, date_to in [(a, b), (a, None), (None, b), (None, None)]:
+            items, total = query_missions(date_from=date_from, date_to=date_to, offset=0, limit=1000)
+            expected = _brute_force(missions, date_from, date_to)
+            assert [m["id"] for m in items] == [m["id"] for m in expected]
+            assert total == len(expected)
+    # Naive bounds never match aware missions, as with the old per-row comparison.
+    assert query_missions(date_from=datetime(2025, 1, 1), limit=1000) == ([], 0)
+
+
+def test_index_updates_incrementally(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "u", "password": "p"})
+    tok = c.post("/auth/token-json", json={"username": "u", "password": "p"}).json()["access_token"]
+    H = {"Authorization": f"Bearer {tok}"}
+
+    def create(day):
+        body = {"title": f"d{day}", "start": f"2025-03-{day:02d}T10:00:00+00:00", "end": f"2025-03-{day:02d}T12:00:00+00:00"}
+        return c.post("/missions", json=body, headers=H).json()["id"]
+
+    ids = [create(d) for d in (5, 1, 3)]
+    r = c.get("/missions", params={"date_from": "2025-03-02T00:00:00Z"})
+    assert [m["title"] for m in r.json()["items"]] == ["d3", "d5"]
+    index = storage._source().views["missions_by_start"]
+    assert isinstance(index, MissionTimeIndex)
+
+    c.put(f"/missions/{ids[0]}", json={"start": "2025-02-27T10:00:00+00:00", "end": "2025-02-27T11:00:00+00:00"}, headers=H)
+    c.delete(f"/missions/{ids[2]}", headers=H)
+    new = create(4)
+    assert storage._source().views["missions_by_start"] is index
+    assert [m["title"] for m in c.get("/missions").json()["items"]] == ["d5", "d1", "d4"]
+    r = c.get("/missions", params={"date_from": "2025-03-02T00:00:00Z", "date_to": "2025-03-31T00:00:00Z"})
+    assert [m["id"] for m in r.json()["items"]] == [new]
+    assert len(index.keys) == len(index.entries) == 3
@@ -0,0 +1,91 @@
+import os, sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.routers import missions
+from app.storage import load_db, mission_pages, save_db
+
+
+def _client(tmp_path, monkeypatch, backend="json"):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    r = c.post("/auth/token-json", json={"username": "admin", "password": "pw"})
+    return c, {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def _count_queries(monkeypatch):
+    calls = []
+    query = missions.query_missions
+    monkeypatch.setattr(missions, "query_missions", lambda **kw: calls.append(kw) or query(**kw))
+    return calls
+
+
+M = {"title": "Concert", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z"}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_mission_pages_are_cached_until_missions_change(tmp_path, monkeypatch, backend):
+    c, H = _client(tmp_path, monkeypatch, backend)
+    c.post("/missions", json=M, headers=H)
+    calls = _count_queries(monkeypatch)
+    before = mission_pages().stats()
+    first = c.get("/missions?q=conc&date_from=2024-12-31T00:00:00Z")
+    assert first.json()["total"] == 1
+    again = c.get("/missions?q=CONC&date_from=2024-12-31T00:00:00%2B00:00")
+    assert again.content == first.content and again.headers["etag"] == first.headers["etag"]
+    assert len(calls) == 1
+    stats = mission_pages().stats()
+    assert stats["hits"] - before["hits"] == 1 and stats["misses"] - before["misses"] == 1
+    assert stats["entries"] == 1 and stats["bytes"] == len(first.content)
+
+    # Other collections do not touch the cached pages.
+    c.post("/auth/register", json={"username": "u2", "password": "p"})
+    c.get("/missions?q=conc&date_from=2024-12-31T00:00:00Z")
+    assert len(calls) == 1
+
+    for write in [
+        lambda: c.post("/missions", json=dict(M, title="Concert 2"), headers=H),
+        lambda: c.put("/missions/1", json={"title": "Opera"}, headers=H),
+        lambda: c.delete("/missions/2", headers=H),
+    ]:
+        write()
+        r = c.get("/missions?q=conc&date_from=2024-12-31T00:00:00Z")
+        assert [m["title"] for m in r.json()["items"]] == [m["title"] for m in load_db()["missions"] if "conc" in m["title"].lower()]
+    assert len(calls) == 4
+    assert mission_pages().stats()["invalidations"] - before["invalidations"] == 3
+
+
+def test_mission_page_cache_is_bounded(tmp_path, monkeypatch):
+    c, H = _client(tmp_path, monkeypatch)
+    c.post("/missions", json=M, headers=H)
+    monkeypatch.setattr(config, "MISSION_PAGE_CACHE_SIZE", 2)
+    before = mission_pages().stats()
+    sizes = [len(c.get(f"/missions?per_page={n}").content) for n in (1, 2, 3)]
+    stats = mission_pages().stats()
+    assert stats["entries"] == 2 and stats["evictions"] - before["evictions"] == 1
+    assert stats["bytes"] == sum(sizes[1:])
+
+    calls = _count_queries(monkeypatch)
+    c.get("/missions?per_page=2")
+    assert calls == []
+    c.get("/missions?per_page=1")
+    assert len(calls) == 1
+
+    monkeypatch.setattr(config, "MISSION_PAGE_CACHE_BYTES", sizes[0] + 1)
+    c.get("/missions?per_page=4")
+    assert mission_pages().stats()["entries"] == 1 and mission_pages().stats()["bytes"] <= sizes[0] + 1
+
+
+def test_mission_page_stats_endpoint(tmp_path, monkeypatch):
+    c, H = _client(tmp_path, monkeypatch)
+    c.get("/missions")
+    c.get("/missions")
+    stats = c.get("/admin/storage/stats", headers=H).json()["mission_pages"]
+    assert stats["entries"] == 1 and 0 < stats["hit_rate"] <= 1
@@ -0,0 +1,65 @@
+import os, sys, random
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app import storage
+from app.indexes import mission_text
+from app.storage import load_db, save_db, query_missions
+
+WORDS = ["Concert", "Festival", "Théâtre", "Salle", "Bal", "Opéra", "Nuit", "Jazz", "Zénith", "Parc"]
+
+
+def _seed(n: int):
+    rnd = random.Random(3)
+    base = datetime(2025, 6, 1, tzinfo=timezone.utc)
+    db = load_db()
+    for i in range(1, n + 1):
+        start = base + timedelta(hours=rnd.randrange(24 * 90))
+        db["missions"].append({
+            "id": i,
+            "title": " ".join(rnd.sample(WORDS, 2)),
+            "location": rnd.choice([None, "Lyon", "Paris 11e", "Le Mans"]),
+            "status": rnd.choice(["draft", "published"]),
+            "start": start.isoformat(),
+            "end": (start + timedelta(hours=3)).isoformat(),
+        })
+    db["missions"].append({"id": n + 1, "title": "", "location": None, "status": "draft",
+                           "start": base.isoformat(), "end": (base + timedelta(hours=1)).isoformat()})
+    save_db(db)
+
+
+def _expected(q, status=None, date_from=None):
+    out = [
+        m for m in load_db()["missions"]
+        if q.lower() in mission_text(m)
+        and (not status or m["status"] == status)
+        and (not date_from or datetime.fromisoformat(m["start"]) >= date_from)
+    ]
+    return [m["id"] for m in sorted(out, key=lambda m: (datetime.fromisoformat(m["start"]), m["id"]))]
+
+
+def test_text_search_matches_substring_scan(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed(400)
+    late = datetime(2025, 8, 15, tzinfo=timezone.utc)
+    for q in ["concert", "CON", "ert fes", "zé", "z", " ", "s 1", "paris 11e", "nope", "théâtre salle"]:
+        for status, date_from in [(None, None), ("published", None), (None, late), ("draft", late)]:
+            items, total = query_missions(q=q, status=status, date_from=date_from, offset=0, limit=1000)
+            expected = _expected(q, status, date_from)
+            assert [m["id"] for m in items] == expected, (q, status, date_from)
+            assert total == len(expected)
+
+
+def test_text_index_follows_writes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed(20)
+    assert query_missions(q="kermesse")[1] == 0
+    index = storage._source().views["missions_text"]
+    db = load_db()
+    db["missions"][0]["title"] = "Kermesse"
+    old_id = db["missions"][1]["id"]
+    db["missions"] = [m for m in db["missions"] if m["id"] != old_id]
+    save_db(db)
+    items, total = query_missions(q="kermes")
+    assert total == 1 and items[0]["id"] == 1
+    assert all(old_id not in ids for ids in index.grams.values())
+    assert storage._source().views["missions_text"] is index
@@ -0,0 +1,89 @@
+import os, sys, json, multiprocessing
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config, storage
+from app.main import app
+from app.storage import load_db, save_db
+
+# Several processes share one DATA_DIR, like uvicorn --workers N. Workers are
+# spawned, not forked, so each builds its own caches and locks from scratch.
+
+PROCS, ROUNDS = 4, 25
+
+
+def _counter_worker(data_dir: str, backend: str, tag: int) -> None:
+    os.environ["DATA_DIR"] = data_dir
+    config.STORAGE_BACKEND = backend
+    config.JOURNAL_COMPACT_EVERY = 7
+    for i in range(ROUNDS):
+        with storage.write_lock():
+            db = load_db()
+            m = db["missions"][0]
+            db["missions"][0] = dict(m, count=m["count"] + 1)
+            db["assignments"].append({"id": tag * 1000 + i, "mission_id": 1})
+            save_db(db)
+
+
+def _reader_worker(data_dir: str, stop) -> None:
+    path = os.path.join(data_dir, "data.json")
+    while not stop.is_set():
+        with open(path, "r", encoding="utf-8") as f:
+            json.load(f)
+
+
+def _spawn(target, *args):
+    p = multiprocessing.get_context("spawn").Process(target=target, args=args)
+    p.start()
+    return p
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite", "split"])
+def test_no_lost_updates_across_processes(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"] = [{"id": 1, "title": "counter", "count": 0}]
+    save_db(db)
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    reader = _spawn(_reader_worker, str(tmp_path), stop) if backend == "json" else None
+    workers = [_spawn(_counter_worker, str(tmp_path), backend, tag) for tag in range(PROCS)]
+    for p in workers:
+        p.join(120)
+        assert p.exitcode == 0
+    if reader is not None:
+        stop.set()
+        reader.join(30)
+        # A torn data.json would have made json.load raise in the reader.
+        assert reader.exitcode == 0
+    storage._caches.clear()
+    db = load_db()
+    assert db["missions"][0]["count"] == PROCS * ROUNDS
+    assert len(db["assignments"]) == PROCS * ROUNDS
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+
+def _api_worker(data_dir: str, headers) -> None:
+    os.environ["DATA_DIR"] = data_dir
+    c = TestClient(app)
+    mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z",
+               "positions": [{"label": "SON", "count": 30}]}
+    for _ in range(ROUNDS // 5):
+        assert c.post("/missions", json=mission, headers=headers).status_code == 200
+        assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 1}, headers=headers).status_code in (200, 422)
+
+
+def test_api_workers_share_one_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "u", "password": "p"})
+    tok = c.post("/auth/token-json", json={"username": "u", "password": "p"}).json()["access_token"]
+    workers = [_spawn(_api_worker, str(tmp_path), {"Authorization": f"Bearer {tok}"}) for _ in range(PROCS)]
+    for p in workers:
+        p.join(120)
+        assert p.exitcode == 0
+    storage._caches.clear()
+    db = load_db()
+    assert sorted(m["id"] for m in db["missions"]) == list(range(1, PROCS * ROUNDS // 5 + 1))
+    assert sorted(a["id"] for a in db["assignments"]) == list(range(1, PROCS * ROUNDS // 5 + 1))
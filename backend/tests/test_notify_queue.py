@@ -0,0 +1,197 @@
+import os, sys
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import json, socketserver, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from fastapi.testclient import TestClient
+from app import config, notify
+from app.main import app
+from app.notify import Message
+from app.storage import load_db, save_db
+
+
+@pytest.fixture(autouse=True)
+def _dispatcher(monkeypatch):
+    monkeypatch.setattr(config, "NOTIFY_RETRY_BACKOFF", 0.01)
+    yield
+    notify.shutdown()
+    notify._channels.pop("fake", None)
+
+
+def _wait(job_id: str, timeout: float = 5) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = notify.job(job_id)
+        if job["status"] == "done" or time.monotonic() > deadline:
+            return job
+        time.sleep(0.01)
+
+
+class _Smtp(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: counts connections and stores messages.
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b"220 fake\r\n")
+        data = None
+        for line in self.rfile:
+            if data is not None:
+                if line == b".\r\n":
+                    self.server.messages.append(b"".join(data))
+                    data = None
+                    self.wfile.write(b"250 queued\r\n")
+                else:
+                    data.append(line)
+                continue
+            cmd = line[:4].upper()
+            if cmd == b"EHLO":
+                self.wfile.write(b"250 fake\r\n")
+            elif cmd == b"DATA":
+                data = []
+                self.wfile.write(b"354 go\r\n")
+            elif cmd == b"QUIT":
+                self.wfile.write(b"221 bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 ok\r\n")
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _Smtp)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(config, "SMTP_PORT", server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class _Telegram(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            fail = self.server.fail > 0
+            self.server.fail -= 1
+            self.server.requests.append((self.path, body))
+            self.server.times.append(time.monotonic())
+            status, reply = self.server.replies.pop(0) if self.server.replies else (500 if fail else 200, {"ok": not fail})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(reply).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Telegram)
+    server.lock = threading.Lock()
+    server.fail = 0
+    server.requests = []
+    server.times = []
+    server.replies = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(config, "TELEGRAM_API_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", "T")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_endpoints_return_a_job_to_poll(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setenv("NOTIFY_DRY_RUN", "1")
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    tok = c.post("/auth/token-json", json={"username": "admin", "password": "pw"}).json()["access_token"]
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    H = {"Authorization": f"Bearer {tok}"}
+    c.put("/auth/me/prefs", headers=H, json={"email": "a@example.com", "telegram": True, "telegram_chat_id": "7"})
+    r = c.post("/auth/me/notify-test", headers=H)
+    assert r.status_code == 200
+    job = _wait(r.json()["job_id"])
+    assert job["status"] == "done" and job["total"] == 2 and job["sent"] == 2
+    r = c.post("/admin/notifications/diagnostic/test", headers=H)
+    assert r.status_code == 200 and r.json()["tested"] == 1
+    _wait(r.json()["job_id"])
+    r = c.get(f"/admin/notifications/jobs/{r.json()['job_id']}", headers=H)
+    assert r.status_code == 200 and r.json()["sent"] == 2
+    assert c.get("/admin/notifications/jobs/nope", headers=H).status_code == 404
+
+
+def test_email_batch_shares_one_connection(smtp, monkeypatch):
+    monkeypatch.setattr(config, "NOTIFY_RATE_EMAIL", 0)
+    job = notify.submit([Message("email", f"u{i}@example.com", "s", "b") for i in range(5)])
+    assert job["status"] == "queued"
+    job = _wait(job["id"])
+    assert job["sent"] == 5 and job["failed"] == 0
+    assert smtp.connections == 1 and len(smtp.messages) == 5
+    assert b"To: u3@example.com" in smtp.messages[3]
+
+
+def test_telegram_failures_are_retried(telegram):
+    telegram.fail = 2
+    job = _wait(notify.submit([Message("telegram", "42", "s", "hello")])["id"])
+    assert job["sent"] == 1 and job["retries"] == 2
+    assert len(telegram.requests) == 3
+    path, body = telegram.requests[-1]
+    assert path == "/botT/sendMessage" and body["chat_id"] == "42" and "hello" in body["text"]
+
+
+def test_telegram_client_errors_fail_without_retry_or_token(telegram, monkeypatch):
+    monkeypatch.setattr(config, "TELEGRAM_BOT_TOKEN", "123:SECRET")
+    telegram.replies = [(403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"})]
+    job = _wait(notify.submit([Message("telegram", "42", "s", "b")])["id"])
+    assert job["failed"] == 1 and job["retries"] == 0 and len(telegram.requests) == 1
+    assert job["errors"][0]["error"] == "HTTP 403: Forbidden: bot was blocked by the user"
+    telegram.fail = 100
+    job = _wait(notify.submit([Message("telegram", "42", "s", "b")])["id"])
+    assert job["failed"] == 1 and job["errors"][0]["error"] == "HTTP 500"
+    assert "SECRET" not in json.dumps(job)
+
+
+def test_telegram_429_waits_retry_after(telegram):
+    telegram.replies = [(429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                               "parameters": {"retry_after": 1}})]
+    job = _wait(notify.submit([Message("telegram", "42", "s", "b")])["id"])
+    assert job["sent"] == 1 and job["retries"] == 1
+    assert telegram.times[1] - telegram.times[0] >= 0.9
+
+
+def test_gives_up_after_retries(telegram, monkeypatch):
+    monkeypatch.setattr(config, "NOTIFY_RETRIES", 1)
+    telegram.fail = 100
+    job = _wait(notify.submit([Message("telegram", "42", "s", "b"), Message("telegram", "43", "s", "b")])["id"])
+    assert job["failed"] == 2 and job["sent"] == 0 and job["retries"] == 2
+    assert {e["to"] for e in job["errors"]} == {"42", "43"}
+
+
+def test_custom_channel_is_rate_limited():
+    sent = []
+
+    class Fake:
+        batch_size = 1
+        rate = 20.0
+
+        async def send(self, messages):
+            sent.append(time.monotonic())
+            return [None] * len(messages)
+
+    notify.register_channel("fake", Fake)
+    job = _wait(notify.submit([Message("fake", str(i), "s", "b") for i in range(6)])["id"])
+    assert job["sent"] == 6
+    # One message of burst, then one every 1/20 s.
+    assert sent[-1] - sent[0] >= 0.2
+
+
+def test_unknown_channel_fails_without_retry():
+    job = _wait(notify.submit([Message("pigeon", "x", "s", "b")])["id"])
+    assert job["failed"] == 1 and job["retries"] == 0
+    assert "pigeon" in job["errors"][0]["error"]
@@ -0,0 +1,124 @@
+import os, sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config
+from app.main import app
+from app.indexes import mission_order_key
+from app.storage import load_db, save_db, query_missions
+
+
+def _seed(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    db = load_db()
+    db["users"] = [{"id": i, "username": f"user{i}", "password_hash": "x", "role": "intermittent"} for i in range(1, 31)]
+    db["users"][0]["role"] = "admin"
+    db["users"][4]["deleted_at"] = "2025-01-01T00:00:00+00:00"
+    db["tokens"] = [{"token": "t_admin", "user_id": 1, "created_at": "2999-01-01T00:00:00+00:00"}]
+    db["missions"] = [
+        {
+            "id": i,
+            # Shared start times exercise the id tiebreak.
+            "title": f"Show {i}",
+            "start": f"2025-08-{10 + i % 7:02d}T08:00:00+00:00",
+            "end": f"2025-08-{10 + i % 7:02d}T12:00:00+00:00",
+            "status": "published" if i % 2 else "draft",
+        }
+        for i in range(1, 41)
+    ]
+    save_db(db)
+    return TestClient(app), {"Authorization": "Bearer t_admin"}
+
+
+def _walk(c, url, headers=None):
+    items, cursor, pages = [], None, 0
+    while True:
+        r = c.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        assert r.status_code == 200
+        body = r.json()
+        items += body["items"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return items, pages, body
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_mission_cursor_walk_matches_offset_pages(tmp_path, monkeypatch, backend):
+    c, _ = _seed(tmp_path, monkeypatch, backend)
+    full = c.get("/missions?per_page=100").json()
+    assert full["total"] == 40 and full["next_cursor"] is None
+    assert [m["id"] for m in full["items"][:3]] == [7, 14, 21]
+
+    items, pages, last = _walk(c, "/missions?per_page=7")
+    assert [m["id"] for m in items] == [m["id"] for m in full["items"]]
+    assert pages == 6 and last["total"] == 40
+
+    published, _, _ = _walk(c, "/missions?per_page=4&status=published&with_total=false")
+    assert [m["id"] for m in published] == [m["id"] for m in full["items"] if m["status"] == "published"]
+
+    filtered = c.get("/missions?per_page=3&q=show 1&date_from=2025-08-11T00:00:00Z").json()
+    second = c.get(f"/missions?per_page=3&q=show 1&date_from=2025-08-11T00:00:00Z&cursor={filtered['next_cursor']}").json()
+    assert second["total"] == filtered["total"]
+    expected = c.get("/missions?per_page=6&q=show 1&date_from=2025-08-11T00:00:00Z").json()["items"]
+    assert [m["id"] for m in filtered["items"] + second["items"]] == [m["id"] for m in expected]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_cursor_is_stable_across_inserts(tmp_path, monkeypatch, backend):
+    c, _ = _seed(tmp_path, monkeypatch, backend)
+    first = c.get("/missions?per_page=10&with_total=false").json()
+    assert first["total"] is None
+    db = load_db()
+    db["missions"].append({"id": 41, "title": "Early", "start": "2025-08-01T08:00:00+00:00", "end": "2025-08-01T09:00:00+00:00"})
+    save_db(db)
+    second = c.get(f"/missions?per_page=10&cursor={first['next_cursor']}").json()
+    by_offset = c.get("/missions?per_page=10&page=2").json()
+    seen = {m["id"] for m in first["items"]}
+    assert not seen & {m["id"] for m in second["items"]}
+    # The offset page shifted by the new early mission; the cursor page did not.
+    assert by_offset["items"][0]["id"] == first["items"][-1]["id"]
+    assert second["items"][0]["id"] != first["items"][-1]["id"]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_admin_users_cursor(tmp_path, monkeypatch, backend):
+    c, H = _seed(tmp_path, monkeypatch, backend)
+    items, pages, last = _walk(c, "/admin/users?per_page=8", H)
+    assert [u["id"] for u in items] == [i for i in range(1, 31) if i != 5]
+    assert pages == 4 and last["total"] == 29
+    items, _, last = _walk(c, "/admin/users?per_page=2&q=user2&with_total=false", H)
+    assert [u["username"] for u in items] == ["user2"] + [f"user{i}" for i in range(20, 30)]
+    assert last["total"] is None
+
+
+def test_invalid_cursor_is_rejected(tmp_path, monkeypatch):
+    c, H = _seed(tmp_path, monkeypatch, "json")
+    assert c.get("/missions?cursor=not-a-cursor").status_code == 400
+    user_cursor = c.get("/admin/users?per_page=2", headers=H).json()["next_cursor"]
+    assert c.get(f"/missions?cursor={user_cursor}").status_code == 400
+
+
+def test_admin_users_rejects_bad_page_params(tmp_path, monkeypatch):
+    c, H = _seed(tmp_path, monkeypatch, "json")
+    for params in ["per_page=-5", "per_page=0", "per_page=101", "page=0"]:
+        assert c.get(f"/admin/users?{params}", headers=H).status_code == 422, params
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_storage_cursor_covers_unparsable_starts(tmp_path, monkeypatch, backend):
+    _seed(tmp_path, monkeypatch, backend)
+    db = load_db()
+    db["missions"] += [{"id": 50, "title": "Later", "start": "soon"}, {"id": 51, "title": "Later", "start": None}]
+    save_db(db)
+    seen, after = [], None
+    while True:
+        page, total = query_missions(limit=3, after=after, count=False)
+        if not page:
+            break
+        seen += [m["id"] for m in page]
+        after = mission_order_key(page[-1])
+    assert seen[:2] == [50, 51] and len(seen) == 42 == len(set(seen))
+    page, total = query_missions(q="later", limit=1, after=mission_order_key({"id": 50, "start": "soon"}))
+    assert [m["id"] for m in page] == [51] and total == 2
@@ -0,0 +1,131 @@
+import os, sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from app import config, serialize
+from app.main import app
+from app.routers import missions
+from app.schemas import AssignmentOut, MissionOut, UserOut
+from app.serialize import render_assignment, render_mission, render_user
+from app.storage import load_db, save_db
+
+# Each renderer must write the bytes the endpoints produced with the output
+# models: JSONResponse(jsonable_encoder(Model(**rec).model_dump())).
+
+
+def _reference(model, rec) -> bytes:
+    return JSONResponse(jsonable_encoder(model(**rec).model_dump())).body
+
+
+START, END = "2025-01-01T10:00:00+00:00", "2025-01-01T12:30:00+00:00"
+MISSIONS = [
+    {"id": 1, "title": "Concert", "start": START, "end": END, "location": "Lyon", "status": "published",
+     "positions": [{"label": "SON", "count": 2, "skills": {"console": "expert"}}]},
+    {"id": 2, "title": "Fête été   \"quoted\" \\ \x01 🎸", "start": START, "end": END},
+    {"id": 3, "title": "naive", "start": "2025-01-01T10:00:00", "end": "2025-01-01T10:00:00.250000", "extra": 1},
+    {"id": 4, "title": "offset", "start": "2025-06-01T10:00:00+02:00", "end": "2025-06-01T09:00:00+00:00", "positions": [{"label": "LUM", "count": 1}]},
+    # Not in the stored shape: these go through the model.
+    {"id": 5, "title": "zulu", "start": "2025-01-01T10:00:00Z", "end": "2025-01-01T11:00:00Z"},
+    {"id": 6, "title": "space", "start": "2025-01-01 10:00:00", "end": "2025-01-02"},
+    {"id": "7", "title": "coerced", "start": START, "end": END, "positions": [{"label": "SON", "count": "3"}]},
+]
+ASSIGNMENTS = [
+    {"id": 1, "mission_id": 1, "user_id": 2, "role_label": "SON", "status": "invited"},
+    {"id": 2, "mission_id": 1, "user_id": 3, "role_label": "LUM é", "status": "confirmed", "note": "x"},
+    {"id": "3", "mission_id": 1, "user_id": 3, "role_label": "SON", "status": "tentative"},
+]
+USERS = [
+    {"id": 1, "username": "admin", "role": "admin", "is_active": True, "password_hash": "x"},
+    {"id": 2, "username": "béa"},
+    {"id": 3, "username": "c", "role": "intermittent", "is_active": False, "prefs": {"email": "c@x"}},
+]
+
+
+def _user_model(u):
+    return UserOut(id=u["id"], username=u["username"], role=u.get("role", "intermittent"), is_active=u.get("is_active", True))
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(serialize, "orjson", None)
+    elif serialize.orjson is None:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_renderers_match_the_output_models(encoder):
+    for m in MISSIONS:
+        assert render_mission(m) == _reference(MissionOut, m), m["id"]
+    for a in ASSIGNMENTS:
+        assert render_assignment(a) == _reference(AssignmentOut, a), a["id"]
+    for u in USERS:
+        assert render_user(u) == JSONResponse(jsonable_encoder(_user_model(u).model_dump())).body
+
+
+def test_invalid_records_still_fail_like_the_models():
+    with pytest.raises(ValidationError):
+        render_assignment(dict(ASSIGNMENTS[0], status="pending"))
+    with pytest.raises(ValidationError):
+        render_mission(dict(MISSIONS[0], end=START))
+    with pytest.raises(ValidationError):
+        render_mission(dict(MISSIONS[0], positions=[{"label": "SON", "count": 0}]))
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_list_endpoints_keep_their_schema(tmp_path, monkeypatch, backend, encoder):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = load_db()
+    admin = dict(db["users"][0], role="admin")
+    db["users"] = [admin] + [dict(u, id=u["id"] + 1) for u in USERS[1:]]
+    db["missions"] = [m for m in MISSIONS if m["id"] != "7"]
+    db["assignments"] = ASSIGNMENTS[:2]
+    save_db(db)
+    tok = c.post("/auth/token-json", json={"username": "admin", "password": "pw"}).json()["access_token"]
+    H = {"Authorization": f"Bearer {tok}"}
+
+    r = c.get("/missions?per_page=4")
+    body = r.json()
+    assert r.headers["content-type"] == "application/json"
+    assert list(body) == ["items", "page", "per_page", "total", "next_cursor"] and body["next_cursor"]
+    assert r.content == JSONResponse(jsonable_encoder(dict(body, items=[
+        MissionOut(**m).model_dump() for m in _listed(db, body)
+    ]))).body
+
+    r = c.get("/missions/1/assignments")
+    assert r.content == JSONResponse({"items": [jsonable_encoder(AssignmentOut(**a).model_dump()) for a in ASSIGNMENTS[:2]], "total": 2}).body
+
+    r = c.get("/admin/users?per_page=2", headers=H)
+    users = [jsonable_encoder(_user_model(u).model_dump()) for u in load_db()["users"][:2]]
+    assert r.content == JSONResponse({"items": users, "page": 1, "per_page": 2, "total": 3, "next_cursor": r.json()["next_cursor"]}).body
+
+
+def _listed(db, body):
+    by_id = {m["id"]: m for m in db["missions"]}
+    return [by_id[item["id"]] for item in body["items"]]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_fragments_are_reused_until_the_record_changes(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"] = MISSIONS[:2]
+    save_db(db)
+    rendered = []
+    monkeypatch.setattr(missions, "render_mission", lambda m: rendered.append(m["id"]) or render_mission(m))
+    c = TestClient(app)
+    first = c.get("/missions").content
+    c.get("/missions?per_page=19")
+    assert rendered == [1, 2]
+    db = load_db()
+    db["missions"][1]["title"] = "renamed"
+    save_db(db)
+    assert b"renamed" in c.get("/missions").content and b"renamed" not in first
+    assert rendered == [1, 2, 2]
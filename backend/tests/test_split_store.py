@@ -0,0 +1,76 @@
+import os, sys, json, time
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config, storage
+from app.main import app
+from app.storage import load_db, save_db, read_db
+
+
+def _setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", "split")
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+
+
+def _files(tmp_path):
+    d = tmp_path / "collections"
+    return {f: os.stat(d / f).st_ino for f in os.listdir(d)}
+
+
+def _changed(before, after):
+    return sorted(f for f in after if before.get(f) != after[f])
+
+
+def test_writes_only_rewrite_changed_collections(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "u", "password": "p"})
+    tok = c.post("/auth/token-json", json={"username": "u", "password": "p"}).json()["access_token"]
+    H = {"Authorization": f"Bearer {tok}"}
+    mission = {"title": "m", "start": "2025-01-01T00:00:00Z", "end": "2025-01-02T00:00:00Z",
+               "positions": [{"label": "SON", "count": 2}]}
+    assert c.post("/missions", json=mission, headers=H).status_code == 200
+
+    before = _files(tmp_path)
+    tok = c.post("/auth/token-json", json={"username": "u", "password": "p"}).json()["access_token"]
+    H = {"Authorization": f"Bearer {tok}"}
+    after = _files(tmp_path)
+    assert _changed(before, after) == ["tokens.json"]
+
+    assert c.post("/missions/1/assign", json={"role_label": "SON", "user_id": 1}, headers=H).status_code == 200
+    assert _changed(after, _files(tmp_path)) == ["_changes.assignments.json", "assignments.json"]
+
+
+def test_migrates_an_existing_data_json(tmp_path, monkeypatch):
+    db = {"users": [{"id": 1, "username": "a"}], "tokens": [], "missions": [{"id": 3, "title": "x"}], "assignments": []}
+    (tmp_path / "data.json").write_text(json.dumps(db))
+    _setup(tmp_path, monkeypatch)
+    assert load_db() == db
+    assert sorted(os.listdir(tmp_path / "collections")) == ["assignments.json", "missions.json", "tokens.json", "users.json"]
+
+
+def test_load_db_with_collections(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    db = load_db()
+    db["users"] = [{"id": 1, "username": "a"}]
+    save_db(db)
+    part = load_db(["missions"])
+    assert list(part) == ["missions"]
+    part["missions"].append({"id": 1, "title": "m"})
+    save_db(part)
+    db = load_db()
+    assert db["users"] == [{"id": 1, "username": "a"}] and db["missions"] == [{"id": 1, "title": "m"}]
+
+
+def test_reload_only_parses_changed_files(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    db = load_db()
+    db["users"] = [{"id": 1, "username": "a"}]
+    save_db(db)
+    time.sleep(0.06)  # past the window in which an unchanged signature is not trusted
+    users = read_db()["users"]
+    # Another process rewrites missions.json.
+    (tmp_path / "collections" / "missions.json").write_text(json.dumps([{"id": 9, "title": "n"}]))
+    storage._caches[("split", str(tmp_path / "collections"))].sig = None
+    fresh = read_db()
+    assert fresh["missions"] == [{"id": 9, "title": "n"}]
+    assert fresh["users"] is users
@@ -0,0 +1,112 @@
+import os, sys, json, sqlite3, subprocess
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config, storage
+from app.main import app
+from app.storage import load_db, save_db
+
+
+def _sqlite_mode(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_BACKEND", "sqlite")
+
+
+def _admin(c: TestClient):
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    r = c.post("/auth/token-json", json={"username": "admin", "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def test_sqlite_backend_end_to_end(tmp_path, monkeypatch):
+    _sqlite_mode(tmp_path, monkeypatch)
+    c = TestClient(app)
+    H = _admin(c)
+    assert not (tmp_path / "data.json").exists()
+    assert c.get("/auth/me", headers=H).json()["username"] == "admin"
+
+    for i, (title, day, status) in enumerate([("Concert", 3, "published"), ("Setup", 1, "draft"), ("Concert B", 2, "published")]):
+        body = {
+            "title": title,
+            "start": f"2025-08-0{day}T08:00:00+00:00",
+            "end": f"2025-08-0{day}T12:00:00+00:00",
+            "status": status,
+            "location": "Hall" if i == 1 else None,
+            "positions": [{"label": "SON", "count": 1, "skills": {}}],
+        }
+        assert c.post("/missions", json=body, headers=H).status_code == 200
+
+    r = c.get("/missions", params={"q": "concert", "per_page": 1})
+    assert r.json()["total"] == 2
+    assert [m["title"] for m in r.json()["items"]] == ["Concert B"]
+    r = c.get("/missions", params={"q": "hall"})
+    assert [m["title"] for m in r.json()["items"]] == ["Setup"]
+    r = c.get("/missions", params={"status": "published", "date_from": "2025-08-03T00:00:00Z"})
+    assert [m["title"] for m in r.json()["items"]] == ["Concert"]
+    r = c.get("/missions", params={"date_to": "2025-08-02T12:00:00Z"})
+    assert [m["title"] for m in r.json()["items"]] == ["Setup", "Concert B"]
+    r = c.get("/missions", params={"date_from": "2025-08-01T00:00:00"})
+    assert r.json()["total"] == 0
+
+    assert c.put("/missions/2", json={"positions": [{"label": "LUM", "count": 2}]}, headers=H).status_code == 200
+    assert c.post("/missions/2/assign", json={"role_label": "LUM", "user_id": 1}, headers=H).status_code == 200
+    assert c.post("/missions/2/assign", json={"role_label": "LUM", "user_id": 2}, headers=H).status_code == 200
+    assert c.post("/missions/2/assign", json={"role_label": "LUM", "user_id": 3}, headers=H).status_code == 422
+    assert c.post("/missions/2/assign", json={"role_label": "SON", "user_id": 3}, headers=H).status_code == 422
+    assert c.get("/missions/2/assignments").json()["total"] == 2
+    assert c.delete("/missions/2/assignments/1", headers=H).status_code == 204
+    assert c.delete("/missions/3", headers=H).status_code == 204
+    assert c.get("/missions/3").status_code == 404
+
+    c.post("/auth/register", json={"username": "Bob", "password": "p"})
+    c.post("/auth/register", json={"username": "bobby", "password": "p"})
+    r = c.get("/admin/users", params={"q": "BOB"}, headers=H)
+    assert [u["username"] for u in r.json()["items"]] == ["Bob", "bobby"]
+    assert c.delete("/admin/users/2", headers=H).status_code == 204
+    r = c.get("/admin/users", params={"q": "bob"}, headers=H)
+    assert r.json()["total"] == 1
+
+    conn = sqlite3.connect(tmp_path / "data.sqlite3")
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("SELECT label, count FROM positions WHERE mission_id = 2").fetchall() == [("LUM", 2)]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT data FROM tokens WHERE token = 'x'").fetchall()
+    assert "USING" in plan[0][-1]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT COUNT(*) FROM assignments WHERE mission_id = 1 AND role_label = 'a'").fetchall()
+    assert "assignments_mission" in plan[0][-1]
+
+
+def test_sqlite_reset_and_roundtrip(tmp_path, monkeypatch):
+    _sqlite_mode(tmp_path, monkeypatch)
+    db = load_db()
+    assert db == {"users": [], "tokens": [], "missions": [], "assignments": []}
+    db["missions"].append({"id": 1, "title": "m", "start": "bad", "end": "bad", "positions": []})
+    db["extra"] = {"k": 1}
+    save_db(db)
+    storage._caches.clear()
+    assert load_db()["extra"] == {"k": 1}
+    assert load_db()["missions"][0]["title"] == "m"
+    save_db({"users": [], "tokens": [], "missions": [], "assignments": []})
+    storage._caches.clear()
+    assert load_db() == {"users": [], "tokens": [], "missions": [], "assignments": []}
+
+
+def test_migrate_script_copies_json_store(tmp_path, monkeypatch):
+    data = {
+        "users": [{"id": 1, "username": "a", "password_hash": "x", "role": "admin", "is_active": True}],
+        "tokens": [{"token": "tok_1_x", "user_id": 1, "created_at": "2025-01-01T00:00:00+00:00"}],
+        "missions": [{"id": 4, "title": "m", "start": "2025-01-01T00:00:00+00:00", "end": "2025-01-02T00:00:00+00:00",
+                      "status": "draft", "location": None, "positions": [{"label": "r", "count": 1, "skills": {}}]}],
+        "assignments": [{"id": 1, "mission_id": 4, "user_id": 1, "role_label": "r", "status": "invited"}],
+    }
+    (tmp_path / "data.json").write_text(json.dumps(data))
+    script = os.path.join(os.path.dirname(__file__), "..", "scripts", "migrate_to_sqlite.py")
+    out = subprocess.run([sys.executable, script, "--data-dir", str(tmp_path)], capture_output=True, text=True, check=True)
+    assert "missions: 1" in out.stdout
+    again = subprocess.run([sys.executable, script, "--data-dir", str(tmp_path)], capture_output=True, text=True)
+    assert again.returncode != 0
+
+    _sqlite_mode(tmp_path, monkeypatch)
+    assert load_db() == data
+    assert storage.count_assignments(4, "r") == 1
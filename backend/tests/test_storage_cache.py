@@ -0,0 +1,55 @@
+import os, sys, json
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app.main import app
+from app.storage import load_db, read_db, save_db, cache_stats
+
+
+def test_load_db_serves_cached_copies(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"].append({"id": 1, "title": "m"})
+    save_db(db)
+    before = cache_stats()
+    a = load_db()
+    b = load_db()
+    after = cache_stats()
+    assert after["hits"] - before["hits"] == 2
+    assert after["misses"] == before["misses"]
+    a["missions"][0]["title"] = "changed"
+    a["missions"].append({"id": 2})
+    assert b["missions"] == [{"id": 1, "title": "m"}]
+    assert read_db()["missions"] == [{"id": 1, "title": "m"}]
+
+
+def test_external_write_invalidates_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["users"].append({"id": 1, "username": "a"})
+    save_db(db)
+    assert read_db()["users"][0]["username"] == "a"
+    # Same size, written right away: only the mtime can tell the versions apart.
+    with open(tmp_path / "data.json", "r", encoding="utf-8") as f:
+        raw = f.read()
+    with open(tmp_path / "data.json", "w", encoding="utf-8") as f:
+        f.write(raw.replace('"a"', '"b"'))
+    version = cache_stats()["version"]
+    assert read_db()["users"][0]["username"] == "b"
+    assert cache_stats()["version"] == version + 1
+
+
+def test_storage_stats_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    c = TestClient(app)
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    tok = c.post("/auth/token-json", json={"username": "admin", "password": "pw"}).json()["access_token"]
+    H = {"Authorization": f"Bearer {tok}"}
+    c.get("/missions")
+    r = c.get("/admin/storage/stats", headers=H)
+    assert r.status_code == 200
+    stats = r.json()["cache"]
+    assert stats["backend"] == "json"
+    assert stats["hits"] > 0 and stats["version"] >= 1
@@ -0,0 +1,57 @@
+import os, sys, asyncio, time
+from datetime import datetime, timedelta, timezone
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config, sweeper
+from app.main import app
+from app.storage import load_db, save_db
+
+
+def _seed_tokens(fresh: int, stale: int):
+    now = datetime.now(timezone.utc)
+    db = load_db()
+    for i in range(fresh):
+        db["tokens"].append({"token": f"fresh{i}", "user_id": i, "created_at": now.isoformat()})
+    for i in range(stale):
+        old = now - timedelta(minutes=config.TOKEN_TTL + 1)
+        db["tokens"].append({"token": f"stale{i}", "user_id": i, "created_at": old.isoformat()})
+    db["tokens"].append({"token": "broken", "user_id": 0, "created_at": None})
+    save_db(db)
+
+
+def test_sweep_removes_expired_tokens_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed_tokens(fresh=3, stale=5)
+    size_before = os.path.getsize(tmp_path / "data.json")
+    writes = []
+    real = sweeper.sweep_batch
+    monkeypatch.setattr(sweeper, "sweep_batch", lambda n: writes.append(n) or real(n))
+    result = asyncio.run(sweeper.sweep_expired_tokens(batch_size=2))
+    assert result["reclaimed"] == 6
+    assert result["bytes_saved"] > 0
+    assert len(writes) == 4
+    assert sorted(t["token"] for t in load_db()["tokens"]) == ["fresh0", "fresh1", "fresh2"]
+    assert os.path.getsize(tmp_path / "data.json") < size_before
+    assert asyncio.run(sweeper.sweep_expired_tokens())["reclaimed"] == 0
+
+
+def test_sweep_endpoint_reports_and_lifespan_runs_sweeper(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "TOKEN_SWEEP_INTERVAL", 0.05)
+    with TestClient(app) as c:
+        c.post("/auth/register", json={"username": "admin", "password": "pw"})
+        db = load_db()
+        db["users"][0]["role"] = "admin"
+        save_db(db)
+        r = c.post("/auth/token-json", json={"username": "admin", "password": "pw"})
+        H = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        _seed_tokens(fresh=0, stale=2)
+        deadline = time.time() + 5
+        while len(load_db()["tokens"]) > 1 and time.time() < deadline:
+            time.sleep(0.05)
+        assert [t["user_id"] for t in load_db()["tokens"]] == [1]
+        _seed_tokens(fresh=0, stale=1)
+        r = c.post("/admin/tokens/sweep", headers=H)
+        assert r.status_code == 200
+        stats = c.get("/admin/storage/stats", headers=H).json()["token_sweeper"]
+        assert stats["runs"] >= 2 and stats["reclaimed"] >= 5
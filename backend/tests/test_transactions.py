@@ -0,0 +1,233 @@
+import os, sys, threading
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from app import config, storage
+from app.storage import load_db, save_db, transaction, count_assignments
+
+
+def _seed(count=0):
+    db = load_db()
+    db["missions"] = [{"id": 1, "title": "counter", "count": count}]
+    save_db(db)
+
+
+def _bump(db, n=1):
+    m = db["missions"][0]
+    m["count"] += n
+    return m["count"]
+
+
+def _write_elsewhere(name, rec):
+    db = load_db()
+    db.setdefault(name, []).append(rec)
+    save_db(db)
+
+
+def test_conflicting_write_reruns_the_transaction(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+    runs = []
+
+    def fn(db):
+        runs.append(db["missions"][0]["count"])
+        if len(runs) == 1:
+            # Another writer commits the same collection before we do.
+            other = load_db()
+            other["missions"][0]["count"] = 10
+            save_db(other)
+        return _bump(db)
+
+    assert transaction(fn) == 11
+    assert runs == [0, 10]
+    assert load_db()["missions"][0]["count"] == 11
+
+
+def test_unrelated_write_does_not_conflict(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+    runs = []
+
+    def fn(db):
+        runs.append(1)
+        if len(runs) == 1:
+            _write_elsewhere("tokens", {"token": "t", "user_id": 1, "created_at": "2025-01-01T00:00:00+00:00"})
+        return _bump(db)
+
+    before = storage.txn_stats()
+    assert transaction(fn) == 1
+    assert runs == [1]
+    db = load_db()
+    # Only the transaction's own changes were applied; the token survives.
+    assert db["missions"][0]["count"] == 1 and [t["token"] for t in db["tokens"]] == ["t"]
+    assert storage.txn_stats()["conflicts"] == before["conflicts"]
+
+
+def test_query_reads_are_checked(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+    seen = []
+
+    def fn(db):
+        seen.append(count_assignments(1, "SON"))
+        if len(seen) == 1:
+            _write_elsewhere("assignments", {"id": 1, "mission_id": 1, "user_id": 1, "role_label": "SON", "status": "invited"})
+        return _bump(db)
+
+    transaction(fn)
+    assert seen == [0, 1]
+
+
+def test_runs_under_the_write_lock_after_retries(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "TXN_RETRIES", 2)
+    monkeypatch.setattr(config, "GROUP_COMMIT_MS", 0)
+    _seed()
+    runs = []
+
+    def fn(db):
+        runs.append(storage.write_lock().held())
+        if not runs[-1]:
+            other = load_db()
+            other["missions"][0]["count"] += 100
+            save_db(other)
+        return _bump(db)
+
+    before = storage.txn_stats()
+    assert transaction(fn) == 301
+    assert runs == [False, False, False, True]
+    assert load_db()["missions"][0]["count"] == 301
+    assert storage.txn_stats()["locked"] == before["locked"] + 1
+
+
+def test_error_aborts_without_writing(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+
+    def fn(db):
+        _bump(db)
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        transaction(fn)
+    assert load_db()["missions"][0]["count"] == 0
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite", "split"])
+def test_no_lost_updates_across_threads(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setattr(config, "TXN_RETRIES", 1000)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+    threads = [threading.Thread(target=lambda: [transaction(_bump) for _ in range(20)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert load_db()["missions"][0]["count"] == 80
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite"])
+def test_put_and_delete_write_only_the_changed_records(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"] = [{"id": i, "title": str(i)} for i in range(1, 6)]
+    save_db(db)
+    shared = storage.read_db()["missions"]
+
+    def fn(db):
+        db.put("missions", {"id": 2, "title": "two"})
+        db.delete("missions", 4)
+        db.put("missions", {"id": 6, "title": "six"})
+        db.delete("missions", 6)
+        db.put("missions", {"id": 7, "title": "seven"})
+        # Nothing was copied to get here.
+        assert dict.__getitem__(db, "missions") is shared
+        return storage.next_mission_id()
+
+    assert transaction(fn) == 6
+    assert [m["title"] for m in load_db()["missions"]] == ["1", "two", "3", "5", "seven"]
+    assert storage.get_mission(2)["title"] == "two" and storage.get_mission(4) is None
+    assert storage.next_mission_id() == 8
+
+
+def test_put_then_reading_the_collection_sees_the_put(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+
+    def fn(db):
+        db.put("missions", {"id": 2, "title": "two", "count": 0})
+        ids = [m["id"] for m in db["missions"]]
+        db.delete("missions", 1)
+        return ids
+
+    assert transaction(fn) == [1, 2]
+    assert load_db()["missions"] == [{"id": 2, "title": "two", "count": 0}]
+
+
+def _assign(db, mid):
+    aid = storage.next_assignment_id()
+    db.put("assignments", {"id": aid, "mission_id": mid, "user_id": 1, "role_label": "SON", "status": "invited"})
+    return aid
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_writes_to_different_records_do_not_conflict(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"] = [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}]
+    save_db(db)
+    runs = []
+
+    def fn(db):
+        runs.append(count_assignments(1, "SON"))
+        aid = _assign(db, 1)
+        if len(runs) == 1:
+            # Another request assigns to mission 2 while this one is in flight.
+            other = threading.Thread(target=lambda: runs.append(transaction(_assign, 2)))
+            other.start()
+            other.join()
+        db.put("missions", dict(storage.get_mission(1), title="a2"))
+        return aid
+
+    before = storage.txn_stats()
+    assert transaction(fn) == 1
+    # The two inserts reserved different ids, so they did not collide either.
+    assert runs == [0, 2]
+    assert storage.txn_stats()["conflicts"] == before["conflicts"]
+    assert [(a["id"], a["mission_id"]) for a in storage.mission_assignments(1) + storage.mission_assignments(2)] == [(1, 1), (2, 2)]
+    assert storage.get_mission(1)["title"] == "a2"
+
+
+def test_writes_to_the_same_group_conflict(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["missions"] = [{"id": 1, "title": "a"}]
+    save_db(db)
+    runs = []
+
+    def fn(db):
+        runs.append(count_assignments(1, "SON"))
+        if len(runs) == 1:
+            other = threading.Thread(target=transaction, args=(_assign, 1))
+            other.start()
+            other.join()
+        return _assign(db, 1)
+
+    assert transaction(fn) == 2
+    assert runs == [0, 1]
+
+
+def test_reserved_ids_are_released(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    _seed()
+
+    def fn(db):
+        storage.next_mission_id(3)
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        transaction(fn)
+    assert transaction(lambda db: storage.next_mission_id()) == 2
+    assert transaction(lambda db: [storage.next_mission_id(2), storage.next_mission_id()]) == [2, 4]
@@ -0,0 +1,99 @@
+import os, sys, threading
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from fastapi.testclient import TestClient
+from app import config, storage
+from app.indexes import UsernameIndex
+from app.main import app
+from app.storage import load_db, save_db, find_user, query_users, transaction, username_taken
+
+
+def _admin(c: TestClient):
+    c.post("/auth/register", json={"username": "admin", "password": "pw"})
+    db = load_db()
+    db["users"][0]["role"] = "admin"
+    save_db(db)
+    r = c.post("/auth/token-json", json={"username": "admin", "password": "pw"})
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_usernames_stay_taken_and_deleted_users_cannot_log_in(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    c = TestClient(app)
+    H = _admin(c)
+    assert c.post("/auth/register", json={"username": "Marie", "password": "p"}).json()["id"] == 2
+    assert c.post("/auth/register", json={"username": "Marie", "password": "p"}).status_code == 409
+    # Only the exact name is taken, as before the index.
+    assert c.post("/auth/register", json={"username": "marie", "password": "p"}).json()["id"] == 3
+    assert c.post("/auth/token-json", json={"username": "Marie", "password": "p"}).status_code == 200
+    assert find_user("MARIE") is None and username_taken("Marie") and not username_taken("MARIE")
+
+    assert c.delete("/admin/users/2", headers=H).status_code == 204
+    assert find_user("Marie") is None
+    assert c.post("/auth/token-json", json={"username": "Marie", "password": "p"}).status_code == 401
+    # A soft-deleted user's name is not reused.
+    assert username_taken("Marie")
+    assert c.post("/auth/register", json={"username": "Marie", "password": "p2"}).status_code == 409
+    db = load_db()
+    db["users"] = [u for u in db["users"] if u["id"] != 2]
+    save_db(db)
+    assert not username_taken("Marie")
+    assert c.post("/auth/register", json={"username": "Marie", "password": "p2"}).json()["id"] == 4
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_admin_user_search_is_a_prefix_search(tmp_path, monkeypatch, backend):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "STORAGE_BACKEND", backend)
+    c = TestClient(app)
+    H = _admin(c)
+    for name in ["bob", "Bobby", "jacob", "bo", "alice"]:
+        c.post("/auth/register", json={"username": name, "password": "p"})
+
+    r = c.get("/admin/users", params={"q": "BO"}, headers=H).json()
+    assert [u["username"] for u in r["items"]] == ["bob", "Bobby", "bo"]
+    assert r["total"] == 3
+    r = c.get("/admin/users", params={"q": "bob", "per_page": 1}, headers=H).json()
+    assert [u["username"] for u in r["items"]] == ["bob"] and r["next_cursor"]
+    r = c.get("/admin/users", params={"q": "bob", "cursor": r["next_cursor"]}, headers=H).json()
+    assert [u["username"] for u in r["items"]] == ["Bobby"] and r["next_cursor"] is None
+
+    bobby = find_user("Bobby")["id"]
+    assert c.put(f"/admin/users/{bobby}", json={"role": "admin"}, headers=H).status_code == 200
+    assert c.get(f"/admin/users/{bobby}", headers=H).json()["role"] == "admin"
+    assert c.delete(f"/admin/users/{bobby}", headers=H).status_code == 204
+    r = c.get("/admin/users", params={"q": "bo"}, headers=H).json()
+    assert [u["username"] for u in r["items"]] == ["bob", "bo"]
+    assert c.get("/admin/users", params={"q": "z"}, headers=H).json() == {
+        "items": [], "page": 1, "per_page": 10, "total": 0, "next_cursor": None
+    }
+
+
+def test_user_search_is_consistent_with_concurrent_deletes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    db = load_db()
+    db["users"] = [{"id": i, "username": f"u{i}", "password_hash": "x"} for i in range(1, 11)]
+    save_db(db)
+
+    def soft_delete(db, uid):
+        db["users"] = [dict(u, deleted_at="now") if u["id"] == uid else u for u in db["users"]]
+
+    writers = []
+
+    class Users(dict):
+        def __getitem__(self, uid):
+            if not writers:
+                # Another thread soft-deletes the last user of the page mid-search.
+                writers.append(threading.Thread(target=transaction, args=(soft_delete, 10)))
+                writers[0].start()
+                writers[0].join(0.2)
+            return super().__getitem__(uid)
+
+    idx = storage._view(storage._source("users"), "users_by_name", UsernameIndex)
+    idx.users = Users(idx.users)
+    page, total = query_users(limit=10)
+    writers[0].join()
+    assert [u["id"] for u in page] == list(range(1, 11)) and total == 10
+    assert [u["id"] for u in query_users(limit=10)[0]] == list(range(1, 10))